@@ -1,9 +1,14 @@
 # apps/api/main.py
 import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Optional, Literal, List
 
-from fastapi import FastAPI, Request, Response, HTTPException, status
+from fastapi import FastAPI, Request, Response, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -26,9 +31,84 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
+# ---- Long-poll job claiming ----
+# /next-queued-job?wait=N holds the request open until a job is enqueued. Waiters are
+# woken by Postgres LISTEN/NOTIFY on 'job_queued' when DATABASE_URL (a direct Postgres
+# connection string) is set and asyncpg is installed, and always by enqueues made
+# through this API; otherwise they re-check every LONG_POLL_RECHECK_SEC.
+DATABASE_URL = os.getenv("DATABASE_URL")
+LONG_POLL_MAX_SEC = float(os.getenv("LONG_POLL_MAX_SEC", "30"))
+LONG_POLL_RECHECK_SEC = float(os.getenv("LONG_POLL_RECHECK_SEC", "5"))
+JOB_QUEUED_CHANNEL = "job_queued"
+CLAIM_BATCH_MAX = int(os.getenv("CLAIM_BATCH_MAX", "64"))
+
+# ---- Job leases ----
+# A worker that claims with ?worker=<id> gets a LEASE_SEC lease on each job and renews it
+# through POST /heartbeat while the job runs. Every REAPER_INTERVAL_SEC the reaper puts
+# running jobs whose lease expired back in the queue, and fails them once they have been
+# claimed MAX_JOB_ATTEMPTS times (see supabase/migrations/20251025_job_leases.sql).
+# Claims without a worker id take no lease and are never reaped.
+LEASE_SEC           = int(os.getenv("LEASE_SEC", "120"))
+REAPER_INTERVAL_SEC = float(os.getenv("REAPER_INTERVAL_SEC", "30"))
+MAX_JOB_ATTEMPTS    = int(os.getenv("MAX_JOB_ATTEMPTS", "3"))
+
+# ---- Submission dedup ----
+# /start-optimization hashes the canonical spec (normalised Verilog, targets, budgets,
+# options) and hands back an identical job instead of enqueuing a new one: one that
+# finished within DEDUP_TTL_SEC (0 = only attach to queued/running jobs), else one
+# still in flight (see supabase/migrations/20251027_spec_hash_dedup.sql). The job is
+# owned by the caller, identified by their Supabase access token (Authorization: Bearer),
+# and only the caller's own jobs are reused. A spec with "dedup": false is always
+# enqueued; SPEC_DEDUP=0 turns dedup off.
+SPEC_DEDUP    = os.getenv("SPEC_DEDUP", "1") == "1"
+DEDUP_TTL_SEC = int(os.getenv("DEDUP_TTL_SEC", "86400"))
+
+# ---- Tracing ----
+# Every request is recorded as a span in TRACE_FILE (JSON lines, same record format as
+# the workers' tracing.py) under the caller's W3C `traceparent`, if any. Claimed jobs
+# carry a "trace_id" that workers use for all of the job's spans and forward to the
+# orchestrator, so API, worker and orchestrator spans of one job share a trace.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+def job_trace_id(job_id) -> str:
+    try:
+        return uuid.UUID(str(job_id)).hex
+    except ValueError:
+        return hashlib.sha256(str(job_id).encode()).hexdigest()[:32]
+
+def _parse_traceparent(value: Optional[str]):
+    parts = (value or "").strip().lower().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None
+
+def _write_span(record: dict):
+    if not TRACE_FILE:
+        return
+    try:
+        with open(TRACE_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print("trace write error:", repr(e))
+
 # ---- FastAPI app & CORS ----
 app = FastAPI()
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace_id, parent_id = _parse_traceparent(request.headers.get("traceparent")) or (uuid.uuid4().hex, None)
+    span_id = uuid.uuid4().hex[:16]
+    start, t0 = time.time(), time.perf_counter()
+    response = await call_next(request)
+    _write_span({
+        "trace_id": trace_id, "span_id": span_id, "parent_id": parent_id,
+        "name": f"api {request.method} {request.url.path}", "start_us": int(start * 1e6),
+        "dur_us": int((time.perf_counter() - t0) * 1e6), "pid": os.getpid(), "task": "api",
+        "attrs": {"status": response.status_code},
+    })
+    response.headers["traceparent"] = f"00-{trace_id}-{span_id}-01"
+    return response
+
 ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
     "http://localhost:5173",
@@ -43,6 +123,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------- Queue notifications ----------
+_job_queued = asyncio.Event()
+
+def wake_job_waiters():
+    """Wake every long-poll waiter. Each waiter grabs the current event *before* trying to
+    claim, so a job enqueued between its claim attempt and its wait is never missed."""
+    global _job_queued
+    ev, _job_queued = _job_queued, asyncio.Event()
+    ev.set()
+
+async def _listen_job_queued():
+    try:
+        import asyncpg
+    except Exception:
+        print("asyncpg not installed; long-poll falls back to periodic re-checks")
+        return
+    delay = 1.0
+    while True:
+        try:
+            conn = await asyncpg.connect(DATABASE_URL)
+            closed = asyncio.Event()
+            conn.add_termination_listener(lambda _c: closed.set())
+            await conn.add_listener(JOB_QUEUED_CHANNEL, lambda *_args: wake_job_waiters())
+            delay = 1.0
+            wake_job_waiters()  # re-check anything enqueued while we were disconnected
+            await closed.wait()
+        except Exception as e:
+            print("job_queued listener error:", repr(e))
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+
+async def _reap_expired_leases():
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL_SEC)
+        try:
+            res = await asyncio.to_thread(
+                lambda: supabase.rpc("reap_expired_jobs", {"p_max_attempts": MAX_JOB_ATTEMPTS}).execute())
+            reaped = getattr(res, "data", None) or []
+        except Exception as e:
+            print("lease reaper error:", repr(e))
+            continue
+        for row in reaped:
+            print(f"lease expired: job {row['job_id']} -> {row['state']} (attempt {row['attempts']})")
+        if any(row["state"] == "queued" for row in reaped):
+            wake_job_waiters()
+
+@app.on_event("startup")
+async def start_queue_listener():
+    if DATABASE_URL:
+        asyncio.create_task(_listen_job_queued())
+    if REAPER_INTERVAL_SEC > 0:
+        asyncio.create_task(_reap_expired_leases())
+
 # ---------- Health ----------
 @app.get("/healthz")
 def healthz():
@@ -52,11 +185,47 @@ def healthz():
 class StartOptPayload(BaseModel):
     spec: dict
 
+def _caller_user_id(request: Request) -> str:
+    """Supabase user id of the caller's access token; 401 without a valid one."""
+    token = request.headers.get("authorization", "").replace("Bearer ", "")
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing authorization header")
+    try:
+        user = supabase.auth.get_user(token).user
+    except Exception as e:
+        print("auth.get_user error:", repr(e))
+        user = None
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return user.id
+
+def _queue_estimate(job_id) -> dict:
+    """Claim position of a queued job and a rough wait: queued jobs start as running ones
+    finish, i.e. at `running` jobs per mean run time."""
+    res = supabase.rpc("queue_position", {"p_job_id": job_id}).execute()
+    rows = getattr(res, "data", None) or []
+    if not rows:
+        return {"queue_position": None, "estimated_wait_s": None}
+    pos, running, mean_run = rows[0]["queue_position"], rows[0]["running"], rows[0]["mean_run_s"]
+    if not running:
+        wait = 0.0       # idle workers pick it up on their next long-poll
+    elif mean_run is None:
+        wait = None      # no finished jobs to estimate from yet
+    else:
+        wait = pos * mean_run / running
+    return {"queue_position": pos, "estimated_wait_s": None if wait is None else round(wait, 1)}
+
 @app.post("/start-optimization", status_code=status.HTTP_201_CREATED)
-async def start_optimization(payload: StartOptPayload):
+async def start_optimization(payload: StartOptPayload, request: Request):
     """
-    Inserts a queued job using the RPC (returns uuid).
-    Requires SQL:
+    Inserts a queued job using the RPC, or returns an identical job of the caller
+    (SPEC_DEDUP; needs the caller's access token, see _caller_user_id()).
+    spec.priority is "interactive" (default) or "batch"; interactive jobs are claimed
+    first and users share workers fairly, see
+    supabase/migrations/20251026_job_priority_fair_share.sql. Returns the job id, its
+    state, whether it is an identical earlier submission ("deduplicated"), and for
+    queued jobs the queue position and an estimated wait in seconds (null while there
+    is no history). Uses enqueue_job_dedup(); with SPEC_DEDUP=0 it requires SQL:
 
       create or replace function public.enqueue_job(p_spec jsonb)
       returns uuid language plpgsql security definer as $$
@@ -69,15 +238,34 @@ async def start_optimization(payload: StartOptPayload):
       end; $$;
     """
     try:
-        res = supabase.rpc("enqueue_job", {"p_spec": payload.spec}).execute()
-        if getattr(res, "error", None):
-            raise HTTPException(status_code=500, detail=str(res.error))
-
-        job_id = res.data
+        if SPEC_DEDUP:
+            user_id = await asyncio.to_thread(_caller_user_id, request)
+            res = await asyncio.to_thread(lambda: supabase.rpc("enqueue_job_dedup", {
+                "p_spec": payload.spec,
+                "p_ttl_seconds": DEDUP_TTL_SEC,
+                "p_user_id": user_id,
+            }).execute())
+            if getattr(res, "error", None):
+                raise HTTPException(status_code=500, detail=str(res.error))
+            row = (res.data or [{}])[0]
+            job_id, state, dedup = row.get("id"), row.get("state"), row.get("deduplicated", False)
+        else:
+            res = supabase.rpc("enqueue_job", {"p_spec": payload.spec}).execute()
+            if getattr(res, "error", None):
+                raise HTTPException(status_code=500, detail=str(res.error))
+            job_id, state, dedup = res.data, "queued", False
         if not job_id:
-            raise HTTPException(status_code=500, detail="enqueue_job returned no id")
+            raise HTTPException(status_code=500, detail="enqueue returned no id")
 
-        return {"job_id": job_id}
+        if not dedup:
+            wake_job_waiters()
+        queue = {"queue_position": None, "estimated_wait_s": None}
+        if state == "queued":
+            try:
+                queue = await asyncio.to_thread(_queue_estimate, job_id)
+            except Exception as e:
+                print("queue_position error:", repr(e))
+        return {"job_id": job_id, "state": state, "deduplicated": dedup, **queue}
     except HTTPException:
         raise
     except Exception as e:
@@ -85,45 +273,114 @@ async def start_optimization(payload: StartOptPayload):
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------- Worker: claim exactly one next queued job ----------
+def _lease_params(worker_id: str) -> dict:
+    return {"p_worker_id": worker_id, "p_lease_seconds": LEASE_SEC} if worker_id else {}
+
+def _claimed(row: dict, worker_id: str) -> dict:
+    row = {**row, "trace_id": job_trace_id(row["job_id"])}
+    if worker_id:
+        row["lease_sec"] = LEASE_SEC
+    return row
+
+async def _long_poll_claim(request: Request, wait: float, claim) -> list:
+    """Call claim() until it returns rows or `wait` seconds (capped) pass."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(0.0, min(wait, LONG_POLL_MAX_SEC))
+    while True:
+        woken = _job_queued
+        data = await asyncio.to_thread(claim)
+        if data:
+            return data
+        remaining = deadline - loop.time()
+        if remaining <= 0 or await request.is_disconnected():
+            return []
+        try:
+            await asyncio.wait_for(woken.wait(), timeout=min(remaining, LONG_POLL_RECHECK_SEC))
+        except asyncio.TimeoutError:
+            pass
+
 @app.get("/next-queued-job")
-async def next_queued_job(request: Request):
+async def next_queued_job(request: Request, wait: float = 0, worker_id: str = Query("", alias="worker")):
     """
     Atomically selects one 'queued' row and flips it to 'running'.
-    Requires SQL:
+    With ?wait=<seconds> (capped at LONG_POLL_MAX_SEC) the request is held open until
+    a job is enqueued or the wait expires, then answers 204 as usual.
+    With ?worker=<id> the job is leased to that worker for "lease_sec" seconds and must
+    be renewed through /heartbeat; claim_next_queued_job(p_worker_id, p_lease_seconds)
+    is defined in supabase/migrations/20251025_job_leases.sql.
+    """
+    token = request.headers.get("authorization", "").replace("Bearer ", "")
+    if token != WORKER_TOKEN:
+        return Response(content="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
 
-      create or replace function public.claim_next_queued_job()
-      returns table (job_id uuid, spec jsonb) language plpgsql security definer as $$
-      declare r record; begin
-        select id, spec into r
-          from public.optimization_jobs
-         where state = 'queued'
-         order by created_at
-         limit 1
-         for update skip locked;
+    def claim():
+        res = supabase.rpc("claim_next_queued_job", _lease_params(worker_id)).execute()
+        if getattr(res, "error", None):
+            raise HTTPException(status_code=500, detail=str(res.error))
+        return getattr(res, "data", None) or []
 
-        if not found then return; end if;
+    data = await _long_poll_claim(request, wait, claim)
+    if not data:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-        update public.optimization_jobs
-           set state='running', updated_at=now()
-         where id = r.id;
+    # shape: { "job_id": "<uuid>", "spec": {...}, "checkpoint": ..., "attempts": 1,
+    #          "trace_id": "<32 hex>", "lease_sec": 120 (leased claims only) }
+    return _claimed(data[0], worker_id)
 
-        job_id := r.id; spec := r.spec; return next;
-      end; $$;
+# ---------- Worker: claim up to N queued jobs in one round trip ----------
+@app.get("/next-queued-jobs")
+async def next_queued_jobs(request: Request, max_jobs: int = Query(1, alias="max"), wait: float = 0,
+                           worker_id: str = Query("", alias="worker")):
+    """
+    Claims up to ?max=N (capped at CLAIM_BATCH_MAX) queued jobs with a single RPC; same
+    long-poll and ?worker= lease semantics as /next-queued-job. Returns a JSON list, or
+    204 when empty.
+    Requires claim_next_queued_jobs(p_max) from
+    supabase/migrations/20251020_batch_claim_finish.sql
+    (FOR UPDATE SKIP LOCKED LIMIT p_max).
     """
     token = request.headers.get("authorization", "").replace("Bearer ", "")
     if token != WORKER_TOKEN:
         return Response(content="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
 
-    res = supabase.rpc("claim_next_queued_job").execute()
-    if getattr(res, "error", None):
-        return Response(content=str(res.error), status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    n = min(CLAIM_BATCH_MAX, max(1, max_jobs))
 
-    data = getattr(res, "data", None) or []
-    if len(data) == 0:
+    def claim():
+        res = supabase.rpc("claim_next_queued_jobs", {"p_max": n, **_lease_params(worker_id)}).execute()
+        if getattr(res, "error", None):
+            raise HTTPException(status_code=500, detail=str(res.error))
+        return getattr(res, "data", None) or []
+
+    data = await _long_poll_claim(request, wait, claim)
+    if not data:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return [_claimed(row, worker_id) for row in data]
+
+# ---------- Worker: renew job leases ----------
+class HeartbeatPayload(BaseModel):
+    worker_id: str
+    job_ids: List[str]
+
+@app.post("/heartbeat")
+async def heartbeat(payload: HeartbeatPayload, request: Request):
+    """
+    Renews the leases `worker_id` holds on `job_ids` (one call covers all of a worker's
+    jobs) for another LEASE_SEC seconds. Returns {"lease_sec", "lost": [...]}: jobs in
+    "lost" were reaped, finished or claimed elsewhere and should be abandoned.
+    """
+    token = request.headers.get("authorization", "").replace("Bearer ", "")
+    if token != WORKER_TOKEN:
+        return Response(content="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
 
-    # shape: [{ "job_id": "<uuid>", "spec": {...} }]
-    return data[0]
+    if not payload.job_ids:
+        return {"lease_sec": LEASE_SEC, "lost": []}
+    res = await asyncio.to_thread(lambda: supabase.rpc("heartbeat_jobs", {
+        "p_worker_id": payload.worker_id, "p_job_ids": payload.job_ids,
+        "p_lease_seconds": LEASE_SEC}).execute())
+    if getattr(res, "error", None):
+        raise HTTPException(status_code=500, detail=str(res.error))
+    held = {str(row["job_id"]) for row in getattr(res, "data", None) or []}
+    return {"lease_sec": LEASE_SEC, "lost": [j for j in payload.job_ids if j not in held]}
 
 # ---------- Worker: finish a job (completed/failed) ----------
 class FinishJobPayload(BaseModel):
@@ -135,6 +392,7 @@ class FinishJobPayload(BaseModel):
 async def finish_job(payload: FinishJobPayload, request: Request):
     """
     Worker calls this to finalize a job with result (optimized Verilog, metrics, or error).
+    The result's "timings" holds the worker's per-stage span summary for the job.
     """
     token = request.headers.get("authorization", "").replace("Bearer ", "")
     if token != WORKER_TOKEN:
@@ -144,12 +402,34 @@ async def finish_job(payload: FinishJobPayload, request: Request):
     # Supabase Python client treats "now()" as string; just rely on trigger if you set one.
     update_doc.pop("updated_at", None)
 
-    res = (
+    res = await asyncio.to_thread(lambda: (
         supabase.table("optimization_jobs")
         .update(update_doc)
         .eq("id", payload.job_id)
         .execute()
-    )
+    ))
+    if getattr(res, "error", None):
+        raise HTTPException(status_code=500, detail=str(res.error))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+# ---------- Worker: finish many jobs in one statement ----------
+class FinishJobsPayload(BaseModel):
+    jobs: List[FinishJobPayload]
+
+@app.post("/finish-jobs", status_code=status.HTTP_204_NO_CONTENT)
+async def finish_jobs(payload: FinishJobsPayload, request: Request):
+    """
+    Bulk variant of /finish-job: one finish_jobs(p_items) RPC updates every row with a
+    single UPDATE ... FROM jsonb_to_recordset (see 20251020_batch_claim_finish.sql).
+    """
+    token = request.headers.get("authorization", "").replace("Bearer ", "")
+    if token != WORKER_TOKEN:
+        return Response(content="Unauthorized", status_code=status.HTTP_401_UNAUTHORIZED)
+
+    if not payload.jobs:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    items = [j.model_dump() for j in payload.jobs]
+    res = await asyncio.to_thread(lambda: supabase.rpc("finish_jobs", {"p_items": items}).execute())
     if getattr(res, "error", None):
         raise HTTPException(status_code=500, detail=str(res.error))
     return Response(status_code=status.HTTP_204_NO_CONTENT)
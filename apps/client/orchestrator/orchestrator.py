@@ -13,14 +13,18 @@ Talks to any **OpenAI-compatible** /chat/completions server:
   LLM_BASE_URL, LLM_API_KEY, *_MODEL envs control behavior.
 
 Set MOCK_ORCH=1 to return deterministic, no-LLM responses (for quick demos).
+
+Requests carrying a W3C `traceparent` (sent by the worker) are recorded as spans, with
+one child span per LLM call, in TRACE_FILE (JSON lines) when it is set.
 """
 
 from __future__ import annotations
-import os, re, json, textwrap
+import os, re, json, time, uuid, textwrap
+from contextvars import ContextVar
 from typing import Any, Dict, List, Optional
 
 import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel, Field, ValidationError
 
 # ----------------- Config -----------------
@@ -33,6 +37,7 @@ LLM_BASE_URL     = os.getenv("LLM_BASE_URL", "http://localhost:8000/v1").rstrip(
 LLM_API_KEY      = os.getenv("LLM_API_KEY", "no-key")
 TIMEOUT_S        = int(os.getenv("ORCH_TIMEOUT_S", "120"))
 MOCK_ORCH        = os.getenv("MOCK_ORCH", "0") == "1"
+TRACE_FILE       = os.getenv("TRACE_FILE", "")
 
 ALLOWED_TRANSFORMS = ["pipeline_depth","unroll_factor","fsm_encoding","abc_script","resource_sharing","clock_period_ns"]
 
@@ -60,6 +65,21 @@ class EvaluatorOut(BaseModel):
     next_hints: Optional[List[str]] = None
     best: Optional[Dict[str, Any]] = None
 
+# ----------------- Tracing -----------------
+_trace_ctx: ContextVar[Optional[tuple]] = ContextVar("trace_ctx", default=None)  # (trace_id, span_id)
+
+def write_span(name: str, parent: Optional[tuple], span_id: str, start: float, dur_s: float, **attrs):
+    if not TRACE_FILE or parent is None:
+        return
+    rec = {"trace_id": parent[0], "span_id": span_id, "parent_id": parent[1], "name": name,
+           "start_us": int(start * 1e6), "dur_us": int(dur_s * 1e6), "pid": os.getpid(),
+           "task": "orchestrator", "attrs": attrs}
+    try:
+        with open(TRACE_FILE, "a") as f:
+            f.write(json.dumps(rec) + "\n")
+    except OSError as e:
+        print("trace write error:", repr(e))
+
 # ----------------- Helpers -----------------
 def extract_json_block(text: str) -> str:
     """Grab first {...} JSON block (robust to extra prose)."""
@@ -75,19 +95,29 @@ async def openai_chat(model: str, system: str, user: str,
         "temperature": temperature,
         "max_tokens": max_tokens,
     }
-    async with httpx.AsyncClient(timeout=TIMEOUT_S) as client:
-        r = await client.post(f"{LLM_BASE_URL}/chat/completions", headers=headers, json=payload)
-        if not r.is_success:
-            raise HTTPException(r.status_code, f"LLM error: {r.text[:200]}")
-        data = r.json()
-        return data["choices"][0]["message"]["content"]
+    start, t0 = time.time(), time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=TIMEOUT_S) as client:
+            r = await client.post(f"{LLM_BASE_URL}/chat/completions", headers=headers, json=payload)
+            if not r.is_success:
+                raise HTTPException(r.status_code, f"LLM error: {r.text[:200]}")
+            data = r.json()
+            return data["choices"][0]["message"]["content"]
+    finally:
+        write_span("llm", _trace_ctx.get(), uuid.uuid4().hex[:16], start, time.perf_counter() - t0, model=model)
 
 # ----------------- Prompts -----------------
-def planner_prompt(targets: Dict[str,Any], last_result: Dict[str,Any]) -> tuple[str,str]:
+def planner_prompt(targets: Dict[str,Any], last_result: Dict[str,Any],
+                   timing: Dict[str,Any] | None = None, max_candidates: int | None = None) -> tuple[str,str]:
+    # Workers screen candidates cheaply before full evaluation, so they may ask for more
+    count = f"up to {max_candidates}" if max_candidates and max_candidates > 3 else "2–3"
     sys = ("You are the Planner for an RTL PPA optimizer. "
-           f"Propose 2–3 SAFE, interface-preserving candidates using only {ALLOWED_TRANSFORMS}. "
+           f"Propose {count} SAFE, interface-preserving candidates using only {ALLOWED_TRANSFORMS}. "
+           "When TIMING is given, target its worst paths and slowest cells. "
            'Return STRICT JSON only as {"candidates":[{"transform":"...","params":{...},"rationale":"..."}]}')
     usr = f"TARGETS={json.dumps(targets)}\nLAST_RESULT={json.dumps(last_result)}"
+    if timing:
+        usr += f"\nTIMING={json.dumps(timing)}"
     return sys, usr
 
 def programmer_prompt(files: Dict[str,str], candidate: Dict[str,Any]) -> tuple[str,str]:
@@ -116,6 +146,21 @@ def evaluator_prompt(targets: Dict[str,Any], batch_results: List[Dict[str,Any]],
 # ----------------- FastAPI -----------------
 app = FastAPI(title="VeriRL LLM Orchestrator")
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    parts = request.headers.get("traceparent", "").strip().lower().split("-")
+    parent = (parts[1], parts[2]) if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 else None
+    span_id = uuid.uuid4().hex[:16]
+    token = _trace_ctx.set((parent[0], span_id) if parent else None)
+    start, t0 = time.time(), time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _trace_ctx.reset(token)
+    write_span(f"orch {request.url.path}", parent, span_id, start, time.perf_counter() - t0,
+               status=response.status_code)
+    return response
+
 @app.get("/healthz")
 async def healthz():
     return {"ok": True}
@@ -127,12 +172,14 @@ async def planner(body: Dict[str, Any]):
             PlannerCandidate(transform="abc_script", params={"script":"resyn2"}, rationale="standard mapping"),
             PlannerCandidate(transform="pipeline_depth", params={"depth":1}, rationale="reduce comb depth"),
         ])
-    sys, usr = planner_prompt(body["targets"], body["last_result"])
-    text = await openai_chat(PLANNER_MODEL, sys, usr, temperature=0.2, max_tokens=600)
+    sys, usr = planner_prompt(body["targets"], body["last_result"], body.get("timing"),
+                              body.get("max_candidates"))
+    max_tokens = 200 * max(3, int(body.get("max_candidates") or 3))
+    text = await openai_chat(PLANNER_MODEL, sys, usr, temperature=0.2, max_tokens=max_tokens)
     js = extract_json_block(text)
     if not js:
         # retry with stricter instruction
-        text = await openai_chat(PLANNER_MODEL, sys + "\nReturn ONLY JSON.", usr, 0.15, 600)
+        text = await openai_chat(PLANNER_MODEL, sys + "\nReturn ONLY JSON.", usr, 0.15, max_tokens)
         js = extract_json_block(text)
     try:
         return PlannerOut.model_validate_json(js)
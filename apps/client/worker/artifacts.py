@@ -0,0 +1,243 @@
+from __future__ import annotations
+import os, io, gzip, shutil, hashlib, tempfile, zipfile, importlib
+from pathlib import Path
+from typing import Dict, Any, BinaryIO, Iterable
+
+import httpx
+
+try:
+    import zstandard
+except ImportError:  # optional; blobs fall back to gzip
+    zstandard = None
+
+# Persistent artifact store. Job workspaces live in a TemporaryDirectory, so netlists,
+# reports and VCDs are copied out as content-addressed blobs while the job runs:
+# a blob's id is "sha256:<hex of the uncompressed bytes>", it is stored once under
+# sha256/<hex[:2]>/<hex> (zstd or gzip, detected from the magic bytes when read), and
+# identical artifacts from other candidates or jobs are never uploaded twice.
+# ARTIFACT_STORE is "local" (ARTIFACT_DIR), "supabase" (the optimization-artifacts
+# Storage bucket) or "package.module:factory" returning an ObjectStore.
+ARTIFACTS       = os.getenv("ARTIFACTS", "1") == "1"
+ARTIFACT_STORE  = os.getenv("ARTIFACT_STORE", "local")
+ARTIFACT_DIR    = Path(os.getenv("ARTIFACT_DIR", "/data/artifacts"))
+ARTIFACT_CODEC  = os.getenv("ARTIFACT_CODEC", "zstd" if zstandard else "gzip")
+ARTIFACT_BUCKET = os.getenv("ARTIFACT_BUCKET", "optimization-artifacts")
+SUPABASE_URL    = os.getenv("SUPABASE_URL", "")
+SUPABASE_KEY    = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+
+CHUNK = 1 << 20
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# Workspace files published for a result (the VCD path comes from the simulation)
+NETLIST = "synth/netlist.v"
+REPORTS = {"yosys_stat": "reports/yosys_stat.txt", "opensta": "reports/sta_summary.txt",
+           "sta_checks": "reports/sta_checks.txt"}
+BUNDLE_DIRS = ("rtl", "scripts", "synth", "reports")
+BUNDLE_FILES = ("synth.ys",)
+
+class ObjectStore:
+    """Minimal blob interface; keys are relative paths such as sha256/ab/abcd..."""
+    name = "object"
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def put_file(self, key: str, path: Path):
+        """Upload the (already compressed) file at `path`; may consume it."""
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def staging_dir(self) -> Path | None:
+        """Where put_file() sources are compressed (None: the system temp dir)."""
+        return None
+
+class LocalStore(ObjectStore):
+    name = "local"
+
+    def __init__(self, root: Path = ARTIFACT_DIR):
+        self.root = root
+
+    def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    def put_file(self, key: str, path: Path):
+        dest = self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(path, dest)  # same filesystem: staging happens under root
+        except OSError:
+            shutil.copyfile(path, dest)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.root / key, "rb")
+
+    def staging_dir(self) -> Path:
+        d = self.root / "tmp"
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+
+class SupabaseStore(ObjectStore):
+    """Supabase Storage REST API (the bucket created by the initial migration)."""
+    name = "supabase"
+
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_KEY, bucket: str = ARTIFACT_BUCKET):
+        if not url or not key:
+            raise RuntimeError("ARTIFACT_STORE=supabase needs SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+        self.base = f"{url.rstrip('/')}/storage/v1/object"
+        self.bucket = bucket
+        self.http = httpx.Client(headers={"Authorization": f"Bearer {key}", "apikey": key}, timeout=120)
+
+    def exists(self, key: str) -> bool:
+        r = self.http.head(f"{self.base}/{self.bucket}/{key}")
+        return r.status_code == 200
+
+    def put_file(self, key: str, path: Path):
+        with open(path, "rb") as f:
+            r = self.http.post(f"{self.base}/{self.bucket}/{key}", content=f,
+                               headers={"Content-Type": "application/octet-stream", "x-upsert": "true"})
+        r.raise_for_status()
+
+    def open(self, key: str) -> BinaryIO:
+        r = self.http.get(f"{self.base}/{self.bucket}/{key}")
+        r.raise_for_status()
+        return io.BytesIO(r.content)
+
+_store: ObjectStore | None = None
+
+def store() -> ObjectStore:
+    global _store
+    if _store is None:
+        if ARTIFACT_STORE == "local":
+            _store = LocalStore()
+        elif ARTIFACT_STORE == "supabase":
+            _store = SupabaseStore()
+        else:
+            mod, _, attr = ARTIFACT_STORE.partition(":")
+            _store = getattr(importlib.import_module(mod), attr or "store")()
+    return _store
+
+def blob_key(digest: str) -> str:
+    return f"sha256/{digest[:2]}/{digest}"
+
+def _hash_file(path: Path) -> tuple[str, int]:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+def _compress(src: Path, dst: BinaryIO):
+    with open(src, "rb") as f:
+        if ARTIFACT_CODEC == "zstd" and zstandard:
+            zstandard.ZstdCompressor(level=6, threads=-1).copy_stream(f, dst, read_size=CHUNK)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6, mtime=0) as gz:
+                shutil.copyfileobj(f, gz, CHUNK)
+
+def put_file(path: Path, name: str | None = None) -> Dict[str, Any]:
+    """Store one file; returns {"id", "name", "bytes", "stored_bytes", "dedup"}.
+    The file is hashed first, so an artifact already in the store is not compressed again."""
+    digest, size = _hash_file(path)
+    key = blob_key(digest)
+    st = store()
+    info = {"id": f"sha256:{digest}", "name": name or path.name, "bytes": size}
+    if st.exists(key):
+        return {**info, "stored_bytes": None, "dedup": True}
+    fd, tmp = tempfile.mkstemp(prefix=".blob-", dir=st.staging_dir())
+    try:
+        with os.fdopen(fd, "wb") as out:
+            _compress(path, out)
+        stored = os.path.getsize(tmp)
+        st.put_file(key, Path(tmp))
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return {**info, "stored_bytes": stored, "dedup": False}
+
+def open_blob(artifact_id: str) -> BinaryIO:
+    """Decompressed stream of a stored artifact."""
+    f = store().open(blob_key(artifact_id.split(":", 1)[-1]))
+    magic = f.read(4)
+    f.seek(0)
+    if magic == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError(f"{artifact_id} is zstd-compressed; install zstandard to read it")
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+    if magic[:2] == _GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    return f
+
+def _bundle_members(work: Path, dirs: Iterable[str] = BUNDLE_DIRS) -> Iterable[Path]:
+    for d in dirs:
+        if (work / d).is_dir():
+            yield from sorted(p for p in (work / d).rglob("*")
+                              if p.is_file() and p.suffix not in (".vcd", ".pyc"))
+    for f in BUNDLE_FILES:
+        if (work / f).is_file():
+            yield work / f
+
+def _bundle(work: Path, dest: Path, dirs: Iterable[str] = BUNDLE_DIRS):
+    """Deterministic zip of a workspace (fixed timestamps, stored members) so identical
+    workspaces produce identical bundles; the blob codec does the compressing."""
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_STORED) as z:
+        for p in _bundle_members(work, dirs):
+            zi = zipfile.ZipInfo(str(p.relative_to(work)), date_time=(1980, 1, 1, 0, 0, 0))
+            zi.external_attr = 0o644 << 16
+            with open(p, "rb") as src, z.open(zi, "w") as out:
+                shutil.copyfileobj(src, out, CHUNK)
+
+def bundle_workspace(work: Path, name: str = "bundle.zip",
+                     dirs: Iterable[str] = BUNDLE_DIRS) -> Dict[str, Any]:
+    """Store a bundle zip of `dirs` (plus BUNDLE_FILES) of `work`; returns put_file()'s info."""
+    fd, tmp = tempfile.mkstemp(suffix=".zip", dir=work)
+    os.close(fd)
+    try:
+        _bundle(work, Path(tmp), dirs)
+        return put_file(Path(tmp), name)
+    finally:
+        os.unlink(tmp)
+
+def collect(work: Path, vcd: str | None) -> Dict[str, Any]:
+    """Store a workspace's netlist, reports, VCD and a bundle zip. Returns the result's
+    "artifacts" object: the usual keys carry artifact ids ("" when absent) and "blobs"
+    describes each stored id."""
+    blobs: Dict[str, Dict[str, Any]] = {}
+
+    def put(path: Path | None, name: str) -> str:
+        if path is None or not path.is_file():
+            return ""
+        try:
+            info = put_file(path, name)
+        except Exception as e:
+            print(f"artifact store: {name} not stored: {e}")
+            return ""
+        blobs[info["id"]] = {k: v for k, v in info.items() if k != "id"}
+        return info["id"]
+
+    out: Dict[str, Any] = {
+        "netlist_path": put(work / NETLIST, "netlist.v"),
+        "reports": {k: put(work / rel, Path(rel).name) for k, rel in REPORTS.items()},
+        "wave_vcd": put(Path(vcd) if vcd else None, Path(vcd).name if vcd else "wave.vcd"),
+    }
+    try:
+        info = bundle_workspace(work)
+        blobs[info["id"]] = {k: v for k, v in info.items() if k != "id"}
+        out["bundle_zip"] = info["id"]
+    except Exception as e:
+        print(f"artifact store: bundle.zip not stored: {e}")
+        out["bundle_zip"] = ""
+    out["store"] = store().name
+    out["blobs"] = blobs
+    return out
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        sys.exit("usage: python artifacts.py sha256:<hex> OUTPUT")
+    with open_blob(sys.argv[1]) as src, open(sys.argv[2], "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK)
@@ -0,0 +1,90 @@
+"""Benchmark the in-process patch engine (patcher.py) against the GNU `patch` binary.
+
+Usage: python bench/bench_patch.py [--sizes 200,2000,20000] [--hunks 4] [--reps 50]
+
+For each RTL size a synthetic module and an LLM-style diff are generated; both engines
+apply it to a fresh copy of the file `reps` times. Reports per-apply latency (mean/p95)
+and checks that both produce identical output.
+"""
+from __future__ import annotations
+import sys, time, json, random, shutil, difflib, argparse, subprocess, tempfile, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from patcher import apply_patches
+
+def make_case(n_lines: int, n_hunks: int, seed: int = 0) -> tuple[str, str]:
+    rnd = random.Random(seed)
+    body = [f"  assign w{i} = a{i % 64} ^ (b{i % 32} & c{i % 16});" for i in range(n_lines)]
+    old = ["module bench(input [63:0] a, b, c, output [%d:0] w);" % (n_lines - 1)] + body + ["endmodule"]
+    new = list(old)
+    for k in sorted(rnd.sample(range(1, n_lines), n_hunks), reverse=True):
+        new[k] = new[k].replace("^", "|")
+        new.insert(k, "  // retimed")
+    diff = "\n".join(difflib.unified_diff(old, new, "a/rtl/bench.v", "b/rtl/bench.v", lineterm="")) + "\n"
+    return "\n".join(old) + "\n", diff
+
+def _p95(xs: list[float]) -> float:
+    return sorted(xs)[max(0, int(len(xs) * 0.95) - 1)]
+
+def bench(n_lines: int, n_hunks: int, reps: int, patch_bin: str | None) -> dict:
+    src, diff = make_case(n_lines, n_hunks)
+    root = Path(tempfile.mkdtemp(prefix="bench_patch_"))
+    res = {"lines": n_lines, "hunks": n_hunks, "reps": reps}
+    try:
+        outputs = {}
+        timings = {"inproc": [], "gnu_patch": []}
+        for r in range(reps):
+            d = root / f"py{r}"
+            (d / "rtl").mkdir(parents=True)
+            (d / "rtl/bench.v").write_text(src)
+            t0 = time.perf_counter()
+            out = apply_patches(d, [{"path": "rtl/bench.v", "unified_diff": diff}])
+            timings["inproc"].append(time.perf_counter() - t0)
+            assert out["ok"], out["log"]
+            outputs["inproc"] = (d / "rtl/bench.v").read_text()
+
+            if patch_bin:
+                d = root / f"gnu{r}"
+                (d / "rtl").mkdir(parents=True)
+                (d / "rtl/bench.v").write_text(src)
+                t0 = time.perf_counter()
+                # Same sequence the worker used to run: dry-run, then apply
+                for extra in (["--dry-run"], []):
+                    p = subprocess.run([patch_bin, "-p1", "--forward", *extra], cwd=d, input=diff,
+                                       capture_output=True, text=True)
+                    assert p.returncode == 0, p.stdout + p.stderr
+                timings["gnu_patch"].append(time.perf_counter() - t0)
+                outputs["gnu_patch"] = (d / "rtl/bench.v").read_text()
+        for name, xs in timings.items():
+            if xs:
+                res[name] = {"mean_ms": round(statistics.mean(xs) * 1e3, 3), "p95_ms": round(_p95(xs) * 1e3, 3)}
+        if "gnu_patch" in outputs:
+            res["identical_output"] = outputs["inproc"] == outputs["gnu_patch"]
+            res["speedup"] = round(res["gnu_patch"]["mean_ms"] / res["inproc"]["mean_ms"], 2)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="200,2000,20000")
+    ap.add_argument("--hunks", type=int, default=4)
+    ap.add_argument("--reps", type=int, default=50)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+    patch_bin = shutil.which("patch")
+    if not patch_bin:
+        print("[bench] 'patch' not found; timing the in-process engine only", file=sys.stderr)
+    results = [bench(int(n), args.hunks, args.reps, patch_bin) for n in args.sizes.split(",")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        gnu = r.get("gnu_patch", {})
+        print(f"{r['lines']:>7} lines  in-proc {r['inproc']['mean_ms']:8.3f} ms (p95 {r['inproc']['p95_ms']:.3f})"
+              + (f"  patch {gnu['mean_ms']:8.3f} ms (p95 {gnu['p95_ms']:.3f})  x{r['speedup']}"
+                 f"  identical={r['identical_output']}" if gnu else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""End-to-end throughput benchmark for the EDA worker (worker.run_job/process_job) and the
+HF worker (hf_worker.process_once) over the Verilog corpus in bench/corpus.
+
+Both workers run against in-process stand-ins: the orchestrator app with MOCK_ORCH=1,
+MOCK_HF=1 for the HF worker, and a small job API serving the corpus as queued jobs.
+EDA tools run for real when installed; a missing tool fails fast, which still exercises
+the worker loop (the result records which tools were found).
+
+Usage:
+  python bench/bench_throughput.py [--worker eda|hf|both] [--repeat 2] [--slots 2]
+        [--sizes small,medium,large] [--iters 2] [--out results.json]
+        [--baseline previous.json] [--max-regression 10]
+
+Reports jobs/hour, per-job and per-stage p50/p95 latencies (from tracing spans), peak
+RSS and subprocess counts. With --baseline, prints the change against an earlier
+result file and exits non-zero when jobs/hour drops by more than --max-regression %.
+"""
+from __future__ import annotations
+import os, sys, gzip, json, math, time, uuid, shutil, asyncio, argparse, platform, resource, subprocess, tempfile
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Any, List
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+BENCH_DIR  = Path(__file__).resolve().parent
+WORKER_DIR = BENCH_DIR.parent
+ORCH_DIR   = WORKER_DIR.parent / "orchestrator"
+CORPUS_DIR = BENCH_DIR / "corpus"
+
+def load_corpus(sizes: List[str]) -> List[Dict[str, Any]]:
+    manifest = json.loads((CORPUS_DIR / "manifest.json").read_text())
+    out = []
+    for d in manifest["designs"]:
+        if d["size"] in sizes:
+            out.append({**d, "verilog": (CORPUS_DIR / d["path"]).read_text()})
+    return out
+
+def pct(xs: List[float], q: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return xs[min(len(xs), max(1, math.ceil(q / 100.0 * len(xs)))) - 1]
+
+def _ms(x: float | None) -> float | None:
+    return None if x is None else round(x * 1e3, 2)
+
+# ---------------- Stand-in job API ----------------
+def make_job_api(jobs: List[Dict[str, Any]]):
+    """Minimal /next-queued-job(s), /finish-job(s) and callback endpoints over a queue."""
+    app = FastAPI()
+    queue = deque(jobs)
+    app.state.finished = {}
+    app.state.callbacks = Counter()
+    app.state.last_state = {}
+
+    @app.get("/next-queued-job")
+    async def next_job():
+        if not queue:
+            return Response(status_code=204)
+        return queue.popleft()
+
+    @app.get("/next-queued-jobs")
+    async def next_jobs(max: int = 1):
+        if not queue:
+            return Response(status_code=204)
+        return [queue.popleft() for _ in range(min(max, len(queue)))]
+
+    @app.post("/finish-job", status_code=204)
+    async def finish_job(request: Request):
+        body = await request.json()
+        app.state.finished[body["job_id"]] = body["status"]
+        return Response(status_code=204)
+
+    @app.post("/finish-jobs", status_code=204)
+    async def finish_jobs(request: Request):
+        for it in (await request.json())["jobs"]:
+            app.state.finished[it["job_id"]] = it["status"]
+        return Response(status_code=204)
+
+    @app.post("/callback")
+    async def callback(request: Request):
+        raw = await request.body()
+        if request.headers.get("content-encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        body = json.loads(raw)
+        app.state.callbacks[body["job_id"]] += 1
+        if body.get("state"):
+            app.state.last_state[body["job_id"]] = body["state"]
+        return {"ok": True}
+
+    return app
+
+# ---------------- Subprocess accounting ----------------
+def count_subprocesses() -> Dict[str, Any]:
+    """Count tool launches by wrapping asyncio.create_subprocess_exec (used by runners.run)."""
+    stats = {"total": 0, "by_tool": Counter(), "missing": Counter()}
+    real = asyncio.create_subprocess_exec
+
+    async def counting(*argv, **kw):
+        tool = os.path.basename(str(argv[0]))
+        try:
+            p = await real(*argv, **kw)
+        except FileNotFoundError:
+            stats["missing"][tool] += 1
+            raise
+        stats["total"] += 1
+        stats["by_tool"][tool] += 1
+        return p
+
+    asyncio.create_subprocess_exec = counting
+    return stats
+
+# ---------------- Runs ----------------
+def make_jobs(corpus: List[Dict[str, Any]], repeat: int, iters: int, parallel: int) -> tuple[list, dict]:
+    jobs, sizes = [], {}
+    for r in range(repeat):
+        for d in corpus:
+            job_id = str(uuid.uuid4())
+            sizes[job_id] = d["size"]
+            jobs.append({"job_id": job_id, "spec": {
+                "top_module": d["top"],
+                "targets": {"frequency_mhz": 500},
+                "budgets": {"max_iters": iters, "max_parallel": parallel},
+                "original_verilog": d["verilog"],
+                # hf_worker reads source/options
+                "source": d["verilog"],
+                "options": {"power": True, "timing": True},
+            }})
+    return jobs, sizes
+
+def make_client(api_app, orch_app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(mounts={
+        "http://api": httpx.ASGITransport(app=api_app),
+        "http://orch": httpx.ASGITransport(app=orch_app),
+    }, timeout=httpx.Timeout(600.0))
+
+async def run_eda(jobs: List[Dict[str, Any]], slots: int, api_app, orch_app) -> Dict[str, Any]:
+    import worker
+    await asyncio.to_thread(worker.workspace.warm_pool)
+    async with make_client(api_app, orch_app) as client:
+        running: set[asyncio.Task] = set()
+        while True:
+            free = slots - len(running)
+            if free > 0:
+                started, claim_start = time.monotonic(), time.time()
+                claimed = await worker.get_queued_jobs(client, free, wait=0)
+                for job in claimed:
+                    running.add(asyncio.create_task(
+                        worker.run_job(client, job, (claim_start, time.monotonic() - started))))
+                if not claimed and not running:
+                    break
+            if running:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        await worker.workspace.drain()
+    states = api_app.state.last_state
+    return {"status": dict(Counter(states.get(j["job_id"], "unknown") for j in jobs)),
+            "callbacks": sum(api_app.state.callbacks.values()),
+            "workspace_pool": worker.workspace.pool_stats()}
+
+async def run_hf(jobs: List[Dict[str, Any]], api_app, orch_app) -> Dict[str, Any]:
+    import hf_worker
+    async with make_client(api_app, orch_app) as client:
+        while await hf_worker.process_once(client):
+            pass
+    return {"status": dict(Counter(api_app.state.finished.get(j["job_id"], "unknown") for j in jobs))}
+
+def summarise(spans_file: Path, sizes: Dict[str, str], wall_s: float, n_jobs: int) -> Dict[str, Any]:
+    spans = [json.loads(l) for l in spans_file.read_text().splitlines() if l.strip()] if spans_file.exists() else []
+    by_name: Dict[str, List[float]] = {}
+    per_size: Dict[str, List[float]] = {}
+    for s in spans:
+        if s["name"] == "job":
+            job_id = s["attrs"].get("job_id")
+            per_size.setdefault(sizes.get(job_id, "?"), []).append(s["dur_us"] / 1e6)
+        by_name.setdefault(s["name"], []).append(s["dur_us"] / 1e6)
+    return {
+        "jobs": n_jobs,
+        "wall_s": round(wall_s, 3),
+        "jobs_per_hour": round(n_jobs / wall_s * 3600, 1) if wall_s > 0 else None,
+        "job_latency": {size: {"jobs": len(xs), "p50_ms": _ms(pct(xs, 50)), "p95_ms": _ms(pct(xs, 95))}
+                        for size, xs in sorted(per_size.items())},
+        "stages": {name: {"count": len(xs), "p50_ms": _ms(pct(xs, 50)), "p95_ms": _ms(pct(xs, 95)),
+                          "total_s": round(sum(xs), 3)}
+                   for name, xs in sorted(by_name.items())},
+    }
+
+def run_one(kind: str, args) -> Dict[str, Any]:
+    """Benchmark one worker kind in this process (env must be set before importing it)."""
+    tmp = Path(tempfile.mkdtemp(prefix=f"bench_{kind}_"))
+    spans_file = tmp / "spans.jsonl"
+    env = {
+        "MOCK_ORCH": "1", "MOCK_HF": "1", "TRACING": "1", "TRACE_FILE": str(spans_file),
+        "ORCH_BASE_URL": "http://orch", "API_BASE": "http://api", "WORKER_TOKEN": "bench",
+        "LOVABLE_NEXT_JOB_URL": "http://api/next-queued-job",
+        "LOVABLE_NEXT_JOBS_URL": "http://api/next-queued-jobs",
+        "LOVABLE_CALLBACK_URL": "http://api/callback",
+        "LONG_POLL_SECONDS": "0", "CLAIM_BATCH": str(args.slots),
+        "DATA_ROOT": str(tmp / "jobs"), "EDA_CACHE": "1" if args.cache else "0",
+        "EDA_CACHE_DIR": str(tmp / "cache"), "SYNTH_CACHE_DIR": str(tmp / "modules"),
+        "ARTIFACT_DIR": str(tmp / "artifacts"), "SURROGATE_HISTORY": str(tmp / "surrogate.jsonl"),
+        "SMOKE_MODE": "0",
+    }
+    os.environ.update(env)
+    (tmp / "jobs").mkdir()
+    for p in (str(WORKER_DIR), str(ORCH_DIR)):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    import orchestrator
+
+    corpus = load_corpus(args.sizes.split(","))
+    jobs, sizes = make_jobs(corpus, args.repeat, args.iters, args.parallel)
+    api_app = make_job_api(list(jobs))
+    procs = count_subprocesses()
+    t0 = time.perf_counter()
+    try:
+        if kind == "eda":
+            extra = asyncio.run(run_eda(jobs, args.slots, api_app, orchestrator.app))
+        else:
+            extra = asyncio.run(run_hf(jobs, api_app, orchestrator.app))
+        wall = time.perf_counter() - t0
+        res = summarise(spans_file, sizes, wall, len(jobs))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    res.update(extra)
+    res["peak_rss_mb"] = {
+        "worker": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "tools": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+    res["subprocesses"] = {"total": procs["total"], "by_tool": dict(procs["by_tool"]),
+                           "missing": dict(procs["missing"])}
+    return res
+
+def meta(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "tools": {t: bool(shutil.which(t)) for t in ("yosys", "sta", "verilator", "pytest")},
+        "args": vars(args),
+    }
+
+def compare(cur: Dict[str, Any], base: Dict[str, Any], max_regression: float) -> bool:
+    """Print deltas against a baseline result; False if jobs/hour regressed too much."""
+    ok = True
+    for kind in ("eda", "hf"):
+        a, b = cur.get(kind), base.get(kind)
+        if not a or not b or not a.get("jobs_per_hour") or not b.get("jobs_per_hour"):
+            continue
+        d = (a["jobs_per_hour"] - b["jobs_per_hour"]) / b["jobs_per_hour"] * 100
+        print(f"[bench] {kind}: jobs/hour {b['jobs_per_hour']} -> {a['jobs_per_hour']} ({d:+.1f}%)")
+        if d < -max_regression:
+            ok = False
+        for name, st in a["stages"].items():
+            old = b["stages"].get(name)
+            if old and old.get("p95_ms") and st.get("p95_ms"):
+                sd = (st["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+                if abs(sd) >= 10:
+                    print(f"[bench]   {name:<12} p95 {old['p95_ms']} -> {st['p95_ms']} ms ({sd:+.1f}%)")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--worker", choices=("eda", "hf", "both"), default="both")
+    ap.add_argument("--sizes", default="small,medium,large")
+    ap.add_argument("--repeat", type=int, default=2, help="copies of each corpus design to queue")
+    ap.add_argument("--slots", type=int, default=2, help="concurrent jobs (EDA) / claim batch (HF)")
+    ap.add_argument("--iters", type=int, default=2, help="max_iters per EDA job")
+    ap.add_argument("--parallel", type=int, default=2, help="max_parallel candidates per EDA job")
+    ap.add_argument("--cache", action="store_true", help="keep the EDA result cache enabled")
+    ap.add_argument("--out", default="", help="write the JSON result here")
+    ap.add_argument("--baseline", default="", help="earlier result JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=10.0, help="allowed jobs/hour drop in %%")
+    ap.add_argument("--_child", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args._child:
+        # One worker kind per process so peak RSS and subprocess counts aren't mixed
+        print(json.dumps(run_one(args._child, args)))
+        return
+
+    result = {"meta": meta(args)}
+    kinds = ("eda", "hf") if args.worker == "both" else (args.worker,)
+    for kind in kinds:
+        argv = [sys.executable, __file__, "--_child", kind] + [a for a in sys.argv[1:]]
+        p = subprocess.run(argv, capture_output=True, text=True)
+        if p.returncode != 0:
+            sys.exit(f"[bench] {kind} run failed:\n{p.stderr[-2000:]}")
+        result[kind] = json.loads(p.stdout.strip().splitlines()[-1])
+        r = result[kind]
+        print(f"[bench] {kind}: {r['jobs']} jobs in {r['wall_s']}s = {r['jobs_per_hour']} jobs/h, "
+              f"status={r['status']}, subprocesses={r['subprocesses']['total']}, "
+              f"peak RSS {r['peak_rss_mb']['worker']} MB", file=sys.stderr)
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        if not compare(result, json.loads(Path(args.baseline).read_text()), args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark the streaming VCD activity parser (vcd.py) on large synthetic traces.
+
+    python bench/bench_vcd.py --size-gb 2 [--signals 2000] [--keep /tmp/big.vcd]
+    python bench/bench_vcd.py --vcd path/to/real.vcd
+
+Generates a trace with a clock, scalar nets and vectors of up to 64 bits (same line
+format as Icarus/Verilator), then reports parse throughput, peak RSS growth and the
+resulting activity. --check also runs a pure-Python line parser on the same file and
+compares per-signal toggle counts (slow; use small sizes).
+"""
+from __future__ import annotations
+import sys, json, time, random, argparse, resource, tempfile
+from pathlib import Path
+from typing import Dict, Any
+
+WORKER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(WORKER_DIR))
+
+def _ident(i: int) -> str:
+    s = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 94)
+        s += chr(33 + r)
+    return s
+
+def generate(path: Path, size_bytes: int, signals: int, seed: int = 1) -> Dict[str, Any]:
+    rnd = random.Random(seed)
+    widths = [1] + [rnd.choice((1, 1, 1, 4, 8, 16, 32, 64)) for _ in range(signals - 1)]
+    ids = [_ident(i) for i in range(signals)]
+    with open(path, "w") as f:
+        f.write("$timescale 1ps $end\n$scope module tb $end\n")
+        f.write(f"$var wire 1 {ids[0]} clk $end\n$scope module dut $end\n")
+        for i in range(1, signals):
+            f.write(f"$var wire {widths[i]} {ids[i]} n{i} $end\n")
+        f.write("$upscope $end\n$upscope $end\n$enddefinitions $end\n#0\n$dumpvars\n")
+        for i in range(signals):
+            f.write(f"0{ids[i]}\n" if widths[i] == 1 else f"b0 {ids[i]}\n")
+        f.write("$end\n")
+        # A handful of pre-rendered change blocks, replayed with increasing timestamps
+        blocks = []
+        for _ in range(16):
+            lines = []
+            for i in rnd.sample(range(1, signals), max(1, signals // 10)):
+                w = widths[i]
+                lines.append(f"{rnd.getrandbits(1)}{ids[i]}" if w == 1
+                             else f"b{rnd.getrandbits(w):b} {ids[i]}")
+            blocks.append("\n".join(lines) + "\n")
+        t, written, steps = 0, f.tell(), 0
+        while written < size_bytes:
+            chunk = []
+            for k in range(256):
+                t += 500
+                chunk.append(f"#{t}\n{'1' if steps % 2 == 0 else '0'}{ids[0]}\n{blocks[(steps * 7 + k) % 16]}")
+                steps += 1
+            s = "".join(chunk)
+            f.write(s)
+            written += len(s)
+    return {"bytes": path.stat().st_size, "signals": signals, "steps": steps}
+
+def reference_toggles(path: Path) -> Dict[str, int]:
+    """Straightforward line-by-line parser used to check the vectorised one."""
+    ids: Dict[str, str] = {}
+    last: Dict[str, int] = {}
+    counts: Dict[str, int] = {}
+    body = False
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not body:
+                parts = line.split()
+                if parts[:1] == ["$var"]:
+                    ids.setdefault(parts[3], parts[4])
+                body = line.startswith("$enddefinitions")
+                continue
+            if not line or line[0] in "#$":
+                continue
+            if line[0] in "bB":
+                bits, ident = line[1:].split()
+                val = int(bits.replace("x", "0").replace("z", "0"), 2)
+            elif line[0] in "01xzXZ":
+                ident, val = line[1:], int(line[0] == "1")
+            else:
+                continue
+            if ident in last:
+                counts[ident] = counts.get(ident, 0) + bin(last[ident] ^ val).count("1")
+            last[ident] = val
+    return {ids[k]: v for k, v in counts.items() if k in ids}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-gb", type=float, default=1.0)
+    ap.add_argument("--signals", type=int, default=2000)
+    ap.add_argument("--vcd", help="benchmark an existing VCD/SAIF instead of generating one")
+    ap.add_argument("--keep", help="write the generated trace here and keep it")
+    ap.add_argument("--check", action="store_true", help="compare with the pure-Python parser")
+    args = ap.parse_args()
+
+    import vcd
+    out: Dict[str, Any] = {"chunk_mb": vcd.VCD_CHUNK_MB}
+    tmp = None
+    if args.vcd:
+        path = Path(args.vcd)
+    else:
+        path = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix="bench_vcd_")) / "trace.vcd"
+        tmp = None if args.keep else path
+        t0 = time.perf_counter()
+        out["generated"] = generate(path, int(args.size_gb * (1 << 30)), args.signals)
+        out["generate_s"] = round(time.perf_counter() - t0, 2)
+    try:
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        act = vcd.activity(path)
+        dt = time.perf_counter() - t0
+        size = path.stat().st_size
+        out.update({
+            "file_mb": round(size / 2**20, 1),
+            "parse_s": round(dt, 3),
+            "mb_per_s": round(size / 2**20 / dt, 1),
+            "peak_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024, 1),
+            "activity": {k: v for k, v in act.items() if k not in ("windows", "top")},
+            "windows": len(act["windows"]),
+        })
+        if args.check:
+            t0 = time.perf_counter()
+            ref = reference_toggles(path)
+            out["reference_s"] = round(time.perf_counter() - t0, 3)
+            got = vcd.vcd_activity(path)
+            mine = {t["signal"].rsplit(".", 1)[-1]: t["toggles"] for t in got["top"]}
+            total_ref = sum(ref.values())
+            out["check"] = {"reference_toggles": total_ref,
+                            "vectorised_toggles": got["toggles"] + (got["cycles"] * 2),
+                            "top_match": all(ref.get(k) == v for k, v in mine.items())}
+    finally:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+            tmp.parent.rmdir()
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+// 8-lane pipelined multiply-accumulate array with a coefficient register file,
+// a registered adder tree and a saturating output stage.
+
+module coef_rf(
+    input             clk,
+    input             we,
+    input      [2:0]  waddr,
+    input      [15:0] wdata,
+    output     [127:0] coefs
+);
+    reg [15:0] mem0, mem1, mem2, mem3, mem4, mem5, mem6, mem7;
+
+    always @(posedge clk) begin
+        if (we) begin
+            case (waddr)
+                3'd0: mem0 <= wdata;
+                3'd1: mem1 <= wdata;
+                3'd2: mem2 <= wdata;
+                3'd3: mem3 <= wdata;
+                3'd4: mem4 <= wdata;
+                3'd5: mem5 <= wdata;
+                3'd6: mem6 <= wdata;
+                default: mem7 <= wdata;
+            endcase
+        end
+    end
+
+    assign coefs = {mem7, mem6, mem5, mem4, mem3, mem2, mem1, mem0};
+endmodule
+
+module mac_lane(
+    input                    clk,
+    input                    rst,
+    input                    en,
+    input                    clear,
+    input  signed [15:0]     a,
+    input  signed [15:0]     b,
+    output reg signed [39:0] acc
+);
+    reg signed [15:0] a_q, b_q;
+    reg signed [31:0] prod;
+    reg               en_q, en_qq, clear_q, clear_qq;
+
+    always @(posedge clk) begin
+        if (rst) begin
+            a_q <= 16'sd0; b_q <= 16'sd0; prod <= 32'sd0; acc <= 40'sd0;
+            en_q <= 1'b0; en_qq <= 1'b0; clear_q <= 1'b0; clear_qq <= 1'b0;
+        end else begin
+            // stage 1: register operands
+            a_q <= a; b_q <= b;
+            en_q <= en; clear_q <= clear;
+            // stage 2: multiply
+            prod <= a_q * b_q;
+            en_qq <= en_q; clear_qq <= clear_q;
+            // stage 3: accumulate
+            if (clear_qq)
+                acc <= en_qq ? {{8{prod[31]}}, prod} : 40'sd0;
+            else if (en_qq)
+                acc <= acc + {{8{prod[31]}}, prod};
+        end
+    end
+endmodule
+
+module add_pair(
+    input                    clk,
+    input  signed [42:0]     x,
+    input  signed [42:0]     y,
+    output reg signed [42:0] s
+);
+    always @(posedge clk)
+        s <= x + y;
+endmodule
+
+module saturate16(
+    input  signed [42:0] x,
+    output signed [15:0] y
+);
+    wire pos_ovf = ~x[42] & (|x[41:15]);
+    wire neg_ovf =  x[42] & ~(&x[41:15]);
+    assign y = pos_ovf ? 16'sh7fff : neg_ovf ? 16'sh8000 : x[15:0];
+endmodule
+
+module mac_array(
+    input                clk,
+    input                rst,
+    input                coef_we,
+    input        [2:0]   coef_addr,
+    input        [15:0]  coef_data,
+    input                in_valid,
+    input                frame_start,
+    input        [127:0] samples,
+    output               out_valid,
+    output signed [15:0] result,
+    output signed [42:0] result_full
+);
+    wire [127:0] coefs;
+    coef_rf u_rf(.clk(clk), .we(coef_we), .waddr(coef_addr), .wdata(coef_data), .coefs(coefs));
+
+    wire signed [39:0] acc0, acc1, acc2, acc3, acc4, acc5, acc6, acc7;
+    mac_lane u_l0(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[15:0]),    .b(coefs[15:0]),    .acc(acc0));
+    mac_lane u_l1(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[31:16]),   .b(coefs[31:16]),   .acc(acc1));
+    mac_lane u_l2(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[47:32]),   .b(coefs[47:32]),   .acc(acc2));
+    mac_lane u_l3(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[63:48]),   .b(coefs[63:48]),   .acc(acc3));
+    mac_lane u_l4(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[79:64]),   .b(coefs[79:64]),   .acc(acc4));
+    mac_lane u_l5(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[95:80]),   .b(coefs[95:80]),   .acc(acc5));
+    mac_lane u_l6(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[111:96]),  .b(coefs[111:96]),  .acc(acc6));
+    mac_lane u_l7(.clk(clk), .rst(rst), .en(in_valid), .clear(frame_start), .a(samples[127:112]), .b(coefs[127:112]), .acc(acc7));
+
+    // Registered adder tree (3 levels)
+    wire signed [42:0] s01, s23, s45, s67, s0123, s4567, total;
+    add_pair u_a01(.clk(clk), .x({{3{acc0[39]}}, acc0}), .y({{3{acc1[39]}}, acc1}), .s(s01));
+    add_pair u_a23(.clk(clk), .x({{3{acc2[39]}}, acc2}), .y({{3{acc3[39]}}, acc3}), .s(s23));
+    add_pair u_a45(.clk(clk), .x({{3{acc4[39]}}, acc4}), .y({{3{acc5[39]}}, acc5}), .s(s45));
+    add_pair u_a67(.clk(clk), .x({{3{acc6[39]}}, acc6}), .y({{3{acc7[39]}}, acc7}), .s(s67));
+    add_pair u_b0(.clk(clk), .x(s01), .y(s23), .s(s0123));
+    add_pair u_b1(.clk(clk), .x(s45), .y(s67), .s(s4567));
+    add_pair u_c0(.clk(clk), .x(s0123), .y(s4567), .s(total));
+
+    saturate16 u_sat(.x(total), .y(result));
+    assign result_full = total;
+
+    // valid follows the 3 lane stages plus 3 adder levels
+    reg [5:0] vpipe;
+    always @(posedge clk) begin
+        if (rst)
+            vpipe <= 6'd0;
+        else
+            vpipe <= {vpipe[4:0], in_valid};
+    end
+    assign out_valid = vpipe[5];
+endmodule
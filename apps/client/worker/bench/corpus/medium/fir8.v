@@ -0,0 +1,44 @@
+// 8-tap, 16-bit transposed-form FIR filter with fixed coefficients
+module fir8(
+    input                    clk,
+    input                    rst,
+    input                    in_valid,
+    input  signed [15:0]     x,
+    output reg               out_valid,
+    output reg signed [35:0] y
+);
+    localparam signed [15:0] C0 = 16'sd112,  C1 = -16'sd415, C2 = 16'sd1210, C3 = 16'sd3650;
+    localparam signed [15:0] C4 = 16'sd3650, C5 = 16'sd1210, C6 = -16'sd415, C7 = 16'sd112;
+
+    reg signed [35:0] acc0, acc1, acc2, acc3, acc4, acc5, acc6;
+
+    wire signed [31:0] p0 = x * C0;
+    wire signed [31:0] p1 = x * C1;
+    wire signed [31:0] p2 = x * C2;
+    wire signed [31:0] p3 = x * C3;
+    wire signed [31:0] p4 = x * C4;
+    wire signed [31:0] p5 = x * C5;
+    wire signed [31:0] p6 = x * C6;
+    wire signed [31:0] p7 = x * C7;
+
+    always @(posedge clk) begin
+        if (rst) begin
+            acc0 <= 36'sd0; acc1 <= 36'sd0; acc2 <= 36'sd0; acc3 <= 36'sd0;
+            acc4 <= 36'sd0; acc5 <= 36'sd0; acc6 <= 36'sd0;
+            y <= 36'sd0;
+            out_valid <= 1'b0;
+        end else begin
+            out_valid <= in_valid;
+            if (in_valid) begin
+                acc6 <= p7;
+                acc5 <= acc6 + p6;
+                acc4 <= acc5 + p5;
+                acc3 <= acc4 + p4;
+                acc2 <= acc3 + p3;
+                acc1 <= acc2 + p2;
+                acc0 <= acc1 + p1;
+                y    <= acc0 + p0;
+            end
+        end
+    end
+endmodule
@@ -0,0 +1,59 @@
+// UART transmitter: 8N1, baud rate set by a clock divider
+module uart_tx #(
+    parameter CLKS_PER_BIT = 868
+)(
+    input        clk,
+    input        rst,
+    input        start,
+    input  [7:0] data,
+    output reg   tx,
+    output       busy
+);
+    localparam IDLE = 2'd0, START = 2'd1, DATA = 2'd2, STOP = 2'd3;
+
+    reg [1:0]  state;
+    reg [15:0] clk_cnt;
+    reg [2:0]  bit_idx;
+    reg [7:0]  shreg;
+
+    assign busy = (state != IDLE);
+
+    wire bit_done = (clk_cnt == CLKS_PER_BIT - 1);
+
+    always @(posedge clk) begin
+        if (rst) begin
+            state   <= IDLE;
+            clk_cnt <= 16'd0;
+            bit_idx <= 3'd0;
+            shreg   <= 8'd0;
+            tx      <= 1'b1;
+        end else begin
+            clk_cnt <= bit_done || state == IDLE ? 16'd0 : clk_cnt + 16'd1;
+            case (state)
+                IDLE: begin
+                    tx <= 1'b1;
+                    if (start) begin
+                        shreg <= data;
+                        state <= START;
+                    end
+                end
+                START: begin
+                    tx <= 1'b0;
+                    if (bit_done) state <= DATA;
+                end
+                DATA: begin
+                    tx <= shreg[0];
+                    if (bit_done) begin
+                        shreg   <= {1'b0, shreg[7:1]};
+                        bit_idx <= bit_idx + 3'd1;
+                        if (bit_idx == 3'd7) state <= STOP;
+                    end
+                end
+                STOP: begin
+                    tx <= 1'b1;
+                    if (bit_done) state <= IDLE;
+                end
+            endcase
+        end
+    end
+endmodule
@@ -0,0 +1,31 @@
+// 8-bit ALU with registered result and flags
+module alu8(
+    input            clk,
+    input      [2:0] op,
+    input      [7:0] a,
+    input      [7:0] b,
+    output reg [7:0] y,
+    output reg       zero,
+    output reg       carry
+);
+    reg [8:0] r;
+
+    always @(*) begin
+        case (op)
+            3'd0: r = {1'b0, a} + {1'b0, b};
+            3'd1: r = {1'b0, a} - {1'b0, b};
+            3'd2: r = {1'b0, a & b};
+            3'd3: r = {1'b0, a | b};
+            3'd4: r = {1'b0, a ^ b};
+            3'd5: r = {a, 1'b0};
+            3'd6: r = {1'b0, 1'b0, a[7:1]};
+            default: r = {1'b0, ~a};
+        endcase
+    end
+
+    always @(posedge clk) begin
+        y     <= r[7:0];
+        carry <= r[8];
+        zero  <= (r[7:0] == 8'd0);
+    end
+endmodule
@@ -0,0 +1,18 @@
+// 8-bit up counter with synchronous clear and enable
+module counter8(
+    input            clk,
+    input            rst,
+    input            en,
+    input            clr,
+    output reg [7:0] count,
+    output           wrap
+);
+    assign wrap = en & (count == 8'hff);
+
+    always @(posedge clk) begin
+        if (rst | clr)
+            count <= 8'd0;
+        else if (en)
+            count <= count + 8'd1;
+    end
+endmodule
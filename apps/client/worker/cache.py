@@ -0,0 +1,209 @@
+from __future__ import annotations
+import os, re, json, time, fcntl, asyncio, hashlib, shutil, subprocess
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator
+
+# Content-addressed cache of EDA evaluations (pytest/yosys/opensta + parsed results).
+# Entries live under CACHE_DIR/<key[:2]>/<key>/ and are evicted least-recently-used
+# once the cache grows past CACHE_MAX_MB (down to CACHE_EVICT_TO of it, so the scan
+# that picks victims runs once per batch of evictions, not per write). Each process
+# tracks the cache size from one scan plus its own writes; entries other processes
+# add are picked up by the next scan. A per-key flock deduplicates identical
+# evaluations that are in flight at the same time, across candidates and jobs
+# (and across worker processes sharing CACHE_DIR).
+CACHE_DIR     = Path(os.getenv("EDA_CACHE_DIR", "/data/cache/eda"))
+CACHE_MAX_MB  = int(os.getenv("EDA_CACHE_MAX_MB", "2048"))
+CACHE_ENABLED = os.getenv("EDA_CACHE", "1") == "1"
+CACHE_EVICT_TO = 0.9
+
+# Workspace files restored on a hit so artifact paths in callbacks stay valid
+CACHED_FILES = ("synth/netlist.v", "reports/yosys_stat.txt", "reports/yosys_stat.json",
+                "reports/sta_checks.txt", "reports/sta_summary.txt",
+                "reports/sta_wns.txt", "reports/sta_tns.txt")
+
+# Bumped when cached entries from earlier versions must not be served (v2: results of
+# timed-out or missing tools are no longer cached)
+KEY_VERSION = b"v2"
+
+_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_WS_RE      = re.compile(r"\s+")
+
+def strip_comments(text: str) -> str:
+    """Replace every // and /* */ comment with a space."""
+    return _COMMENT_RE.sub(" ", text)
+
+def canonical_rtl(text: str) -> str:
+    """Strip comments and normalise whitespace so cosmetic edits hash identically."""
+    return _WS_RE.sub(" ", strip_comments(text)).strip()
+
+@lru_cache(maxsize=None)
+def tool_versions() -> str:
+    out = []
+    for cmd in (["yosys", "-V"], ["sta", "-version"], ["verilator", "--version"]):
+        try:
+            p = subprocess.run(cmd, capture_output=True, text=True, timeout=20)
+            out.append((p.stdout or p.stderr).strip())
+        except Exception:
+            out.append(f"{cmd[0]}:missing")
+    return "\n".join(out)
+
+@lru_cache(maxsize=32)
+def _file_digest(path: str, size: int, mtime_ns: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_digest(path: Path) -> str:
+    if not path.exists():
+        return "none"
+    st = path.stat()
+    return _file_digest(str(path), st.st_size, st.st_mtime_ns)
+
+def evaluation_key(work: Path, lib_path: Path) -> str:
+    """Hash of everything that determines an evaluation's outcome."""
+    h = hashlib.sha256(KEY_VERSION + b"\0")
+    for p in sorted((work / "rtl").glob("*.v")):
+        h.update(p.name.encode() + b"\0" + canonical_rtl(p.read_text()).encode() + b"\0")
+    for p in sorted((work / "tb").glob("*.py")):
+        h.update(p.name.encode() + b"\0" + p.read_bytes() + b"\0")
+    for p in (work / "synth.ys", work / "scripts" / "sta.tcl"):
+        if p.exists():
+            # sta.tcl embeds the absolute netlist path of this particular clone
+            h.update(p.read_text().replace(str(work), "$WORK").encode() + b"\0")
+    h.update(file_digest(lib_path).encode() + b"\0")
+    h.update(tool_versions().encode())
+    return h.hexdigest()
+
+def _entry(key: str) -> Path:
+    return CACHE_DIR / key[:2] / key
+
+def _lock_path(key: str) -> Path:
+    return _entry(key).with_suffix(".lock")
+
+_total: int | None = None  # bytes in CACHE_DIR as far as this process knows
+
+_inflight: Dict[str, list] = {}  # key -> [asyncio.Lock, refcount]
+
+@asynccontextmanager
+async def claim(key: str) -> AsyncIterator[None]:
+    """Hold an exclusive lock on `key` while it is being evaluated; a concurrent
+    evaluation of the same key waits here and then finds the finished entry."""
+    if not CACHE_ENABLED:
+        yield
+        return
+    slot = _inflight.setdefault(key, [asyncio.Lock(), 0])
+    slot[1] += 1
+    try:
+        async with slot[0]:
+            lock_path = _lock_path(key)
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(lock_path, "w") as lf:
+                # Other worker processes: poll the flock rather than park a thread on it
+                while True:
+                    try:
+                        fcntl.flock(lf, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(0.2)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+    finally:
+        slot[1] -= 1
+        if slot[1] == 0:
+            _inflight.pop(key, None)
+
+def get(key: str, work: Path) -> Dict[str, Any] | None:
+    """Return the cached result for `key` and restore its report files into `work`."""
+    if not CACHE_ENABLED:
+        return None
+    entry = _entry(key)
+    meta = entry / "result.json"
+    if not meta.exists():
+        return None
+    try:
+        result = json.loads(meta.read_text())
+    except Exception:
+        return None
+    for rel in CACHED_FILES:
+        src = entry / rel
+        if src.exists():
+            dst = work / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, dst)
+    now = time.time()
+    os.utime(meta, (now, now))  # LRU recency
+    return result
+
+def put(key: str, work: Path, result: Dict[str, Any], with_files: bool = True):
+    if not CACHE_ENABLED:
+        return
+    entry = _entry(key)
+    tmp = entry.with_name(entry.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    size = 0
+    for rel in CACHED_FILES if with_files else ():
+        src = work / rel
+        if src.exists():
+            dst = tmp / rel
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, dst)
+            size += dst.stat().st_size
+    tmp.mkdir(parents=True, exist_ok=True)
+    text = json.dumps({**result, "_size": size})
+    (tmp / "result.json").write_text(text)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+    _account(size + len(text.encode()))
+
+def _account(added: int):
+    """Add a write to the running total; evict once it crosses CACHE_MAX_MB."""
+    global _total
+    max_bytes = CACHE_MAX_MB * 1024 * 1024
+    if _total is None or _total + added > max_bytes:
+        evict(int(max_bytes * CACHE_EVICT_TO), trigger=max_bytes)
+    else:
+        _total += added
+
+def _remove_lock(path: Path):
+    """Unlink an evicted entry's lock file unless an evaluation of it holds the lock."""
+    try:
+        with open(path, "r") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            path.unlink()
+    except (OSError, BlockingIOError):
+        pass
+
+def evict(max_bytes: int | None = None, trigger: int | None = None):
+    """Scan the cache and drop least-recently-used entries until it fits in max_bytes
+    (only if it exceeds `trigger`, default max_bytes). Resets the running total."""
+    global _total
+    max_bytes = CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    trigger = max_bytes if trigger is None else trigger
+    entries = []
+    total = 0
+    for meta in CACHE_DIR.glob("??/*/result.json"):
+        try:
+            st = meta.stat()
+            size = json.loads(meta.read_text()).get("_size", 0) + st.st_size
+        except Exception:
+            continue
+        entries.append((st.st_mtime, size, meta.parent))
+        total += size
+    if total > trigger:
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            _remove_lock(path.with_suffix(".lock"))
+            total -= size
+        # Locks of evaluations that were never cached (e.g. timed out)
+        for lock in CACHE_DIR.glob("??/*.lock"):
+            if not lock.with_suffix("").exists():
+                _remove_lock(lock)
+    _total = total
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import os, json, time, shutil, zipfile, tempfile
+from pathlib import Path
+from typing import Dict, Any, List
+
+import artifacts
+
+# Job checkpoints. After the baseline and after every iteration that changes the result
+# the worker stores the current workspace (rtl, tb, scripts, synth, reports) as an
+# artifact bundle and records the loop state next to its id: iteration, best, charts,
+# Pareto front, screening baseline. The checkpoint goes to the job row (so any worker
+# that claims the job again can resume) and to CHECKPOINT_DIR/<job_id>.json, which a
+# restarted worker on the same volume scans to pick its interrupted jobs back up.
+# The bundle lives in the artifact store, so ARTIFACTS=0 turns checkpoints off too.
+CHECKPOINTS    = os.getenv("CHECKPOINTS", "1") == "1" and artifacts.ARTIFACTS
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR",
+                                os.path.join(os.getenv("DATA_ROOT", "/data/jobs"), "checkpoints")))
+
+VERSION = 1
+WORKSPACE_DIRS = ("rtl", "tb", "scripts", "synth", "reports")
+
+def _local(job_id: str) -> Path:
+    return CHECKPOINT_DIR / f"{job_id}.json"
+
+def save(job: Dict[str, Any], work: Path, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Store `work` and `state` (must include "iteration"); returns the checkpoint."""
+    blob = artifacts.bundle_workspace(work, "checkpoint.zip", WORKSPACE_DIRS)
+    ck = {"version": VERSION, "saved_at": time.time(), "workspace": blob["id"], **state}
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    dest = _local(job["job_id"])
+    part = dest.with_suffix(".part")
+    part.write_text(json.dumps({"job": {"job_id": job["job_id"], "spec": job.get("spec", {})},
+                                "checkpoint": ck}, default=str))
+    os.replace(part, dest)
+    return ck
+
+def load(job: Dict[str, Any]) -> Dict[str, Any] | None:
+    """The newest usable checkpoint for a job: from the claimed row or the local file."""
+    found = [job.get("checkpoint")]
+    try:
+        found.append(json.loads(_local(job["job_id"]).read_text())["checkpoint"])
+    except (OSError, ValueError, KeyError):
+        pass
+    found = [c for c in found if isinstance(c, dict) and c.get("version") == VERSION and c.get("workspace")]
+    return max(found, key=lambda c: (c.get("iteration", 0), c.get("saved_at", 0))) if found else None
+
+def restore(ck: Dict[str, Any], work: Path):
+    """Unpack a checkpoint's workspace bundle into an empty workspace."""
+    with tempfile.TemporaryFile(dir=work) as f:
+        with artifacts.open_blob(ck["workspace"]) as src:
+            shutil.copyfileobj(src, f, artifacts.CHUNK)
+        f.seek(0)
+        with zipfile.ZipFile(f) as z:
+            for name in z.namelist():
+                if name.startswith("/") or ".." in Path(name).parts:
+                    raise ValueError(f"unsafe path in checkpoint bundle: {name}")
+            z.extractall(work)
+
+def discard(job_id: str):
+    _local(job_id).unlink(missing_ok=True)
+
+def pending() -> List[Dict[str, Any]]:
+    """Jobs with a local checkpoint, i.e. interrupted on this volume; oldest first."""
+    if not CHECKPOINTS or not CHECKPOINT_DIR.is_dir():
+        return []
+    jobs = []
+    for p in sorted(CHECKPOINT_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime):
+        try:
+            data = json.loads(p.read_text())
+        except (OSError, ValueError):
+            continue
+        jobs.append({**data["job"], "checkpoint": data["checkpoint"]})
+    return jobs
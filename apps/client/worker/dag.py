@@ -0,0 +1,80 @@
+from __future__ import annotations
+import asyncio, time
+from typing import Dict, Any, List, Callable, Awaitable, Iterable
+
+import tracing
+
+# Minimal async task DAG for the per-candidate evaluation pipeline. Each stage declares
+# the context keys it needs and provides; a stage starts as soon as everything it needs
+# exists, so independent stages (simulation, synthesis) overlap. A stage whose
+# `abort_if` predicate holds on its outputs cancels every other running stage and
+# skips the ones not yet started.
+
+class Stage:
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 needs: Iterable[str] = (), provides: Iterable[str] = (),
+                 abort_if: Callable[[Dict[str, Any]], bool] | None = None):
+        self.name = name
+        self.run = run
+        self.needs = tuple(needs)
+        self.provides = tuple(provides)
+        self.abort_if = abort_if
+
+def _check(stages: List[Stage], ctx: Dict[str, Any]):
+    known = set(ctx)
+    names = set()
+    for st in stages:
+        if st.name in names:
+            raise ValueError(f"duplicate stage {st.name!r}")
+        names.add(st.name)
+        known.update(st.provides)
+    for st in stages:
+        missing = [k for k in st.needs if k not in known]
+        if missing:
+            raise ValueError(f"stage {st.name!r} needs {missing}, which no stage provides")
+
+async def run_dag(stages: List[Stage], ctx: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """Run `stages` over a shared context dict and return it. Adds:
+      ctx["aborted_by"]: name of the stage that aborted the run, or None
+      ctx["stage_s"]:    {stage name: wall seconds} for stages that finished
+    Exceptions from a stage cancel the rest and propagate.
+    """
+    ctx = dict(ctx or {})
+    _check(stages, ctx)
+    pending = list(stages)
+    running: Dict[asyncio.Task, Stage] = {}
+    timings: Dict[str, float] = {}
+    aborted_by = None
+
+    async def _timed(st: Stage) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with tracing.span(st.name):
+            out = await st.run(ctx)
+        timings[st.name] = round(time.perf_counter() - t0, 3)
+        return out or {}
+
+    try:
+        while pending or running:
+            for st in [s for s in pending if all(k in ctx for k in s.needs)]:
+                pending.remove(st)
+                running[asyncio.create_task(_timed(st), name=f"stage:{st.name}")] = st
+            if not running:
+                raise RuntimeError(f"stages {[s.name for s in pending]} can never start")
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                st = running.pop(t)
+                out = t.result()
+                ctx.update({k: out.get(k) for k in st.provides})
+                if aborted_by is None and st.abort_if and st.abort_if(out):
+                    aborted_by = st.name
+            if aborted_by:
+                pending.clear()
+                break
+    finally:
+        for t in running:
+            t.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    ctx["aborted_by"] = aborted_by
+    ctx["stage_s"] = timings
+    return ctx
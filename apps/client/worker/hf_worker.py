@@ -2,12 +2,16 @@ import os
 import asyncio
 import re
 import math
+import random
+import time
 from typing import Optional
 
 import httpx
 from httpx import HTTPStatusError
 from dotenv import load_dotenv
 
+import tracing
+
 # Load env (template first, then .env overrides)
 BASE_DIR = os.path.dirname(__file__)
 load_dotenv(os.path.join(BASE_DIR, "config.env"), override=False)
@@ -19,6 +23,10 @@ WORKER_TOKEN   = os.getenv("WORKER_TOKEN", "local-worker-secret")
 # You may use composed URLs or explicit NEXT_JOB_URL/FINISH_JOB_URL
 NEXT_JOB_URL   = os.getenv("NEXT_JOB_URL", f"{API_BASE}/next-queued-job")
 FINISH_JOB_URL = os.getenv("FINISH_JOB_URL", f"{API_BASE}/finish-job")
+# Batch variants: claim up to CLAIM_BATCH jobs per round trip and finish them in one call
+NEXT_JOBS_URL   = os.getenv("NEXT_JOBS_URL", f"{API_BASE}/next-queued-jobs")
+FINISH_JOBS_URL = os.getenv("FINISH_JOBS_URL", f"{API_BASE}/finish-jobs")
+CLAIM_BATCH     = int(os.getenv("CLAIM_BATCH", "4"))
 
 HF_API_TOKEN     = os.getenv("HF_API_TOKEN", "")
 HF_MODEL_DEEPSEEK = os.getenv("HF_MODEL_DEEPSEEK", "").strip()
@@ -28,7 +36,10 @@ HF_MAX_NEW_TOKENS = int(os.getenv("HF_MAX_NEW_TOKENS", "512"))
 MOCK_HF = os.getenv("MOCK_HF", "0") == "1"
 
 REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120"))
-IDLE_SLEEP      = float(os.getenv("IDLE_SLEEP_SECONDS", "1.2"))
+IDLE_SLEEP      = float(os.getenv("IDLE_SLEEP_SECONDS", "1.2"))  # only if the server can't long-poll
+LONG_POLL_SEC   = float(os.getenv("LONG_POLL_SECONDS", "25"))
+BACKOFF_MAX_SEC = float(os.getenv("BACKOFF_MAX_SECONDS", "30"))
+FINISH_RETRIES  = int(os.getenv("FINISH_RETRIES", "4"))  # per finish call, with backoff
 
 AUTH_HEADERS = {"Authorization": f"Bearer {WORKER_TOKEN}"}
 
@@ -89,9 +100,10 @@ async def hf_generate(client: httpx.AsyncClient, model_name: str, prompt: str) -
             "return_full_text": False,
         },
     }
-    r = await client.post(url, headers=headers, json=body, timeout=REQUEST_TIMEOUT)
-    r.raise_for_status()
-    data = r.json()
+    with tracing.span("hf_generate", model=model_name):
+        r = await client.post(url, headers=headers, json=body, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        data = r.json()
     # common HF responses
     if isinstance(data, list) and data and "generated_text" in data[0]:
         return data[0]["generated_text"]
@@ -101,7 +113,9 @@ async def hf_generate(client: httpx.AsyncClient, model_name: str, prompt: str) -
 
 
 async def claim_job(client: httpx.AsyncClient) -> Optional[dict]:
-    r = await client.get(NEXT_JOB_URL, headers=AUTH_HEADERS, timeout=REQUEST_TIMEOUT)
+    # Long-poll: the API holds the request until a job is queued or LONG_POLL_SEC passes
+    r = await client.get(NEXT_JOB_URL, headers=AUTH_HEADERS, params={"wait": LONG_POLL_SEC},
+                         timeout=REQUEST_TIMEOUT + LONG_POLL_SEC)
     # If there are no queued jobs
     if r.status_code == 204:
         return None
@@ -114,17 +128,112 @@ async def claim_job(client: httpx.AsyncClient) -> Optional[dict]:
     return r.json()  # { job_id, spec }
 
 
+async def claim_jobs(client: httpx.AsyncClient, max_jobs: int) -> list[dict]:
+    """Claim up to max_jobs in one round trip; falls back to the single-job endpoint."""
+    if max_jobs <= 1:
+        job = await claim_job(client)
+        return [job] if job else []
+    r = await client.get(NEXT_JOBS_URL, headers=AUTH_HEADERS,
+                         params={"max": max_jobs, "wait": LONG_POLL_SEC},
+                         timeout=REQUEST_TIMEOUT + LONG_POLL_SEC)
+    if r.status_code == 204:
+        return []
+    if r.status_code == 404:
+        # older API without the batch route
+        job = await claim_job(client)
+        return [job] if job else []
+    r.raise_for_status()
+    return r.json()  # [{ job_id, spec }, ...]
+
+
 async def finish_job(client: httpx.AsyncClient, job_id: str, status: str, result: Optional[dict]):
     payload = {"job_id": job_id, "status": status, "result": result}
-    r = await client.post(FINISH_JOB_URL, headers=AUTH_HEADERS, json=payload, timeout=REQUEST_TIMEOUT)
+    r = await client.post(FINISH_JOB_URL, headers={**AUTH_HEADERS, **tracing.headers()}, json=payload,
+                          timeout=REQUEST_TIMEOUT)
+    r.raise_for_status()
+
+
+async def finish_jobs(client: httpx.AsyncClient, items: list[dict]):
+    """Finalize many jobs ({job_id, status, result} each) with one request."""
+    if len(items) == 1:
+        it = items[0]
+        return await finish_job(client, it["job_id"], it["status"], it["result"])
+    r = await client.post(FINISH_JOBS_URL, headers=AUTH_HEADERS, json={"jobs": items}, timeout=REQUEST_TIMEOUT)
+    if r.status_code == 404:
+        for it in items:
+            await finish_job(client, it["job_id"], it["status"], it["result"])
+        return
     r.raise_for_status()
 
 
+async def _with_retries(what: str, call):
+    for attempt in range(FINISH_RETRIES + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == FINISH_RETRIES:
+                raise
+            delay = random.uniform(0, min(BACKOFF_MAX_SEC, 2.0 ** attempt))
+            print(f"[hf-worker] {what} failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def deliver_results(client: httpx.AsyncClient, items: list[dict]):
+    """finish_jobs() with retries; if the batch still fails, every job is finished on its
+    own (again with retries), so one bad result or outage never loses the others.
+    Claims carry no lease, so an unfinished job would stay 'running' for good."""
+    try:
+        await _with_retries(f"finish of {len(items)} job(s)", lambda: finish_jobs(client, items))
+        return
+    except Exception as e:
+        if len(items) == 1:
+            print(f"[hf-worker] giving up on finishing job {items[0]['job_id']}: {e}")
+            return
+        print(f"[hf-worker] batch finish failed ({e}); finishing jobs one by one")
+    for it in items:
+        try:
+            await _with_retries(f"finish of {it['job_id']}",
+                                lambda it=it: finish_job(client, it["job_id"], it["status"], it["result"]))
+        except Exception as e:
+            print(f"[hf-worker] giving up on finishing job {it['job_id']}: {e}")
+
+
 async def process_once(client: httpx.AsyncClient) -> bool:
-    job = await claim_job(client)
-    if not job:
+    claim_start, t0 = time.time(), time.perf_counter()
+    jobs = await claim_jobs(client, CLAIM_BATCH)
+    if not jobs:
         return False
+    claim_s = time.perf_counter() - t0
+    traces = {job["job_id"]: job.get("trace_id") or tracing.trace_id_for(job["job_id"]) for job in jobs}
+    for trace_id in traces.values():
+        tracing.add_span("claim", trace_id, claim_start, claim_s, batch=len(jobs))
+    # Jobs are finished as they complete (those completing together in one call), so a
+    # slow job delays no one else's result
+    pending = {asyncio.create_task(optimize_job(client, job)) for job in jobs}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        items = [t.result() for t in done]
+        finish_start, t0 = time.time(), time.perf_counter()
+        await deliver_results(client, items)
+        for it in items:
+            trace_id = traces[it["job_id"]]
+            tracing.add_span("finish", trace_id, finish_start, time.perf_counter() - t0, batch=len(items))
+            await tracing.export(trace_id, client)
+            print(f"[hf-worker] {it['status']} job {it['job_id']}")
+    return True
+
+
+async def optimize_job(client: httpx.AsyncClient, job: dict) -> dict:
+    """Run one job and return its {job_id, status, result} for finish_jobs().
+    The result carries a per-stage "timings" summary of the job's trace."""
+    trace_id = job.get("trace_id") or tracing.trace_id_for(job["job_id"])
+    with tracing.trace("job", trace_id, job_id=job["job_id"]):
+        out = await _optimize_job(client, job)
+    out["result"] = {**(out["result"] or {}), "timings": tracing.summary(trace_id)}
+    return out
 
+
+async def _optimize_job(client: httpx.AsyncClient, job: dict) -> dict:
     job_id = job["job_id"]
     spec   = job.get("spec", {})
     prompt = build_prompt(spec)
@@ -545,7 +654,8 @@ async def process_once(client: httpx.AsyncClient) -> bool:
 
                 return optimized, info
 
-            opt_text, info = demo_optimize(src_before)
+            with tracing.span("mock_optimize"):
+                opt_text, info = demo_optimize(src_before)
             # Return as fenced verilog to match extractor expectations
             raw = "```verilog\n" + opt_text + "\n```"
         else:
@@ -582,8 +692,9 @@ async def process_once(client: httpx.AsyncClient) -> bool:
             return max(0, int(math.ceil(score)))
 
         src_before = (spec or {}).get("source") or (spec or {}).get("original_verilog") or ""
-        orig_count = estimate_gate_count(src_before)
-        new_count = estimate_gate_count(optimized_text)
+        with tracing.span("metrics"):
+            orig_count = estimate_gate_count(src_before)
+            new_count = estimate_gate_count(optimized_text)
 
         # Fractional change: positive if reduced (improvement)
         delta_frac = 0.0
@@ -600,31 +711,36 @@ async def process_once(client: httpx.AsyncClient) -> bool:
             "gate_count": new_count if new_count > 0 else None,
         }
 
-        await finish_job(client, job_id, "completed", {
+        return {"job_id": job_id, "status": "completed", "result": {
             "optimized_source": optimized_text,
             "metrics": metrics,
-        })
-        print(f"[hf-worker] completed job {job_id}")
+        }}
     except Exception as e:
-        await finish_job(client, job_id, "failed", {"error": str(e)})
-        print(f"[hf-worker] failed job {job_id}: {e}")
-    return True
+        print(f"[hf-worker] job {job_id} error: {e}")
+        return {"job_id": job_id, "status": "failed", "result": {"error": str(e)}}
 
 
 async def main():
     async with httpx.AsyncClient() as client:
-        print("[hf-worker] started; polling for jobs…")
+        print("[hf-worker] started; long-polling for jobs…")
+        errors = 0
         while True:
             try:
+                started = time.monotonic()
                 had = await process_once(client)
-                if not had:
+                errors = 0
+                if not had and time.monotonic() - started < 1.0:
+                    # server answered immediately (no long-poll support)
                     await asyncio.sleep(IDLE_SLEEP)
             except KeyboardInterrupt:
                 print("[hf-worker] stopping…")
                 break
             except Exception as e:
-                print(f"[hf-worker] loop error: {e}")
-                await asyncio.sleep(2.0)
+                # full-jitter exponential backoff
+                errors += 1
+                delay = random.uniform(0, min(BACKOFF_MAX_SEC, 2.0 ** errors))
+                print(f"[hf-worker] loop error: {e}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+from __future__ import annotations
+from typing import Dict, Any, List
+
+import numpy as np
+
+# Multi-objective result store. Every functional candidate is offered to a Pareto front
+# over fmax (maximised), area and dynamic/leakage power (minimised); dominance against
+# the whole front is one vectorised comparison. The job's "best" is the front member
+# chosen by the spec's targets and weights:
+#   targets: {"frequency_mhz": 500, "max_power_mw": 80, "max_area": 3000}  (hard limits)
+#   weights: {"fmax": 1, "area": 1, "power": 1}  or per metric ("dyn_power_mw", ...)
+# Points that miss a target rank after all that meet them (ordered by how far they
+# miss); among equals the weighted sum of metrics relative to the baseline wins.
+OBJECTIVES = ("fmax_mhz", "area_ge", "dyn_power_mw", "leak_power_mw")
+_SIGN = np.array([-1.0, 1.0, 1.0, 1.0])   # stored as costs: lower is better everywhere
+DEFAULT_WEIGHTS = {"fmax_mhz": 1.0, "area_ge": 1.0, "dyn_power_mw": 0.5, "leak_power_mw": 0.5}
+_ALIASES = {"fmax": ("fmax_mhz",), "timing": ("fmax_mhz",), "frequency": ("fmax_mhz",),
+            "area": ("area_ge",), "gates": ("area_ge",),
+            "power": ("dyn_power_mw", "leak_power_mw"), "dynamic_power": ("dyn_power_mw",),
+            "leakage": ("leak_power_mw",)}
+
+def parse_weights(spec_weights: Dict[str, Any] | None) -> np.ndarray:
+    """Weights in OBJECTIVES order; unknown keys are ignored, negatives clamp to 0."""
+    w = dict(DEFAULT_WEIGHTS)
+    for k, v in (spec_weights or {}).items():
+        for name in _ALIASES.get(k, (k,)):
+            if name in w:
+                w[name] = max(0.0, float(v))
+    return np.array([w[k] for k in OBJECTIVES])
+
+def _costs(metrics: Dict[str, Any]) -> np.ndarray:
+    return _SIGN * np.array([float(metrics.get(k) or 0.0) for k in OBJECTIVES])
+
+class ParetoFront:
+    def __init__(self, targets: Dict[str, Any], weights: Dict[str, Any] | None = None,
+                 baseline: Dict[str, Any] | None = None):
+        self.targets = targets or {}
+        self.weights = parse_weights(weights)
+        base = np.abs(_costs(baseline or {}))
+        self.scale = np.where(base > 0, base, 1.0)   # objectives compared as ratios to baseline
+        self.costs = np.empty((0, len(OBJECTIVES)))
+        self.entries: List[Dict[str, Any]] = []
+        self.offered = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, metrics: Dict[str, Any], **info) -> bool:
+        """Insert a result unless an existing member weakly dominates it; drops members
+        it dominates. Returns True if the front changed."""
+        self.offered += 1
+        if not metrics.get("functional_pass", True):
+            self.rejected += 1
+            return False
+        c = _costs(metrics)
+        if len(self.entries) and np.any(np.all(self.costs <= c, axis=1)):
+            self.rejected += 1   # dominated, or identical to a member
+            return False
+        keep = ~np.all(c <= self.costs, axis=1)
+        self.costs = np.vstack([self.costs[keep], c])
+        self.entries = [e for e, k in zip(self.entries, keep) if k]
+        self.entries.append({"metrics": metrics, **info})
+        return True
+
+    def violation(self, metrics: Dict[str, Any]) -> float:
+        """Relative amount by which a result misses the hard targets (0 when met)."""
+        t = self.targets
+        v = 0.0
+        if t.get("frequency_mhz"):
+            v += max(0.0, 1.0 - float(metrics.get("fmax_mhz") or 0.0) / float(t["frequency_mhz"]))
+        if t.get("max_area"):
+            v += max(0.0, float(metrics.get("area_ge") or 0.0) / float(t["max_area"]) - 1.0)
+        if t.get("max_power_mw"):
+            power = float(metrics.get("dyn_power_mw") or 0.0) + float(metrics.get("leak_power_mw") or 0.0)
+            v += max(0.0, power / float(t["max_power_mw"]) - 1.0)
+        return v
+
+    def score(self, metrics: Dict[str, Any]) -> float:
+        """Weighted cost relative to the baseline; lower is better."""
+        return float(np.dot(self.weights, _costs(metrics) / self.scale))
+
+    def rank(self, metrics: Dict[str, Any]) -> tuple[float, float]:
+        return (round(self.violation(metrics), 9), self.score(metrics))
+
+    def select(self) -> Dict[str, Any] | None:
+        """The member preferred by the targets and weights."""
+        if not self.entries:
+            return None
+        return min(self.entries, key=lambda e: self.rank(e["metrics"]))
+
+    def state(self) -> Dict[str, Any]:
+        """Members and counters, for job checkpoints (see load_state)."""
+        return {"entries": self.entries, "offered": self.offered, "rejected": self.rejected}
+
+    def load_state(self, state: Dict[str, Any]):
+        self.entries = list(state.get("entries", []))
+        self.costs = np.array([_costs(e["metrics"]) for e in self.entries]).reshape(-1, len(OBJECTIVES))
+        self.offered = int(state.get("offered", len(self.entries)))
+        self.rejected = int(state.get("rejected", 0))
+
+    def summary(self) -> Dict[str, Any]:
+        """Published with the job result: the front (best first) and how it was built."""
+        chosen = self.select()
+        members = sorted(self.entries, key=lambda e: self.rank(e["metrics"]))
+        return {
+            "objectives": {k: ("max" if s < 0 else "min") for k, s in zip(OBJECTIVES, _SIGN)},
+            "weights": dict(zip(OBJECTIVES, self.weights.tolist())),
+            "points": [{**{k: v for k, v in e.items() if k != "metrics"},
+                        **{k: e["metrics"].get(k) for k in OBJECTIVES},
+                        "gate_count": e["metrics"].get("gate_count"),
+                        "meets_targets": self.violation(e["metrics"]) == 0,
+                        "score": round(self.score(e["metrics"]), 4),
+                        "selected": e is chosen} for e in members],
+            "offered": self.offered,
+            "dominated": self.rejected,
+        }
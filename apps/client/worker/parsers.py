@@ -1,8 +1,21 @@
 from __future__ import annotations
+import os
 import json
 import re
+import heapq
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator
+
+from vcd import activity
+
+# Power model constants (sky130-ish defaults)
+POWER_VDD              = float(os.getenv("POWER_VDD", "1.8"))
+POWER_CELL_CAP_FF      = float(os.getenv("POWER_CELL_CAP_FF", "2.0"))   # switched capacitance per cell
+POWER_LEAK_NW_PER_CELL = float(os.getenv("POWER_LEAK_NW_PER_CELL", "1.0"))
+POWER_DEFAULT_ACTIVITY = float(os.getenv("POWER_DEFAULT_ACTIVITY", "0.1"))
+
+# Worst paths kept from report_checks (the STA script reports this many per group)
+STA_TOP_PATHS = int(os.getenv("STA_TOP_PATHS", "10"))
 
 def parse_yosys_stat(json_path: Path, txt_path: Path | None = None) -> Dict[str, Any]:
     """Return cell_count and a crude 'ge' (gate equivalents) proxy."""
@@ -24,6 +37,20 @@ def parse_yosys_stat(json_path: Path, txt_path: Path | None = None) -> Dict[str,
             ge = cell_count
     return {"cell_count": cell_count, "ge": ge}
 
+def parse_screen_reports(reports: Path) -> Dict[str, Any]:
+    """Proxies from the screening pass: generic gate count, longest path in cells and
+    the number of problems `check` reported."""
+    cells = parse_yosys_stat(reports / "screen_stat.json")["cell_count"]
+    depth = lint = None
+    if (reports / "screen_ltp.txt").exists():
+        depths = [int(m) for m in re.findall(r"Longest topological path in \S+ \(length=(\d+)\)",
+                                             (reports / "screen_ltp.txt").read_text())]
+        depth = max(depths) if depths else None
+    if (reports / "screen_check.txt").exists():
+        m = re.search(r"Found and reported (\d+) problems", (reports / "screen_check.txt").read_text())
+        lint = int(m.group(1)) if m else 0
+    return {"cells": cells, "depth": depth, "lint_problems": lint}
+
 def parse_sta_summary(summary_path: Path) -> Dict[str, Any]:
     period_ns = None
     wns_ns = None
@@ -40,26 +67,205 @@ def parse_sta_summary(summary_path: Path) -> Dict[str, Any]:
     fmax_mhz = 1000.0 / period_ns if period_ns and period_ns > 0 else None
     return {"clock_period_ns": period_ns, "wns_ns": wns_ns, "tns_ns": tns_ns, "fmax_mhz": fmax_mhz}
 
+_NUM_RE = re.compile(r"(?<![\w./])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w./])")
+_PIN_RE = re.compile(r"^(?P<pin>\S+) \((?P<cell>[^)]*)\)$")
+_POINT_RE = re.compile(r"^(?P<name>\S+)(?: \((?P<desc>.*)\))?$")
+_COLUMNS = {"fanout": "fanout", "cap": "cap", "slew": "slew", "trans": "slew",
+            "delay": "delay", "incr": "delay", "time": "time", "path": "time"}
+BREAKDOWN_ORDER = ("clock", "input", "clkq", "comb", "wire", "output", "setup")
+
+def _row(line: str, cols: List[tuple[int, str]]) -> tuple[Dict[str, float], str, str]:
+    """Split a report_checks row into ({column: value}, edge, description). Numbers are
+    right-aligned under their header, so each goes to the column ending nearest to it."""
+    vals: Dict[str, float] = {}
+    desc_at = 0
+    for m in _NUM_RE.finditer(line):
+        if m.start() > cols[-1][0] + 2:
+            break
+        col = min(cols, key=lambda c: abs(c[0] - m.end()))[1]
+        vals[col] = float(m.group())
+        desc_at = m.end()
+    rest = line[desc_at:].strip()
+    edge = ""
+    if rest[:2] in ("^ ", "v "):
+        edge, rest = rest[0], rest[2:].strip()
+    return vals, edge, rest
+
+def _point(text: str) -> tuple[str, str]:
+    m = _POINT_RE.match(text.strip())
+    return (m.group("name"), m.group("desc") or "") if m else (text.strip(), "")
+
+def iter_report_checks(checks_path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream path records out of `report_checks -path full [-fields ...]` output, one
+    line at a time: {"startpoint", "start_type", "endpoint", "end_type", "group", "type",
+    "arrival_ns", "required_ns", "slack_ns", "met", "stages": [{"pin", "cell", "edge",
+    "kind", "delay_ns", "time_ns", "slew_ns", "net", "fanout", "cap"}]}.
+    Stage kinds: clock, input, clkq, comb, wire, output, setup."""
+    cur: Dict[str, Any] | None = None
+    cols: List[tuple[int, str]] = [(0, "delay"), (8, "time")]
+    required = False
+    prev_pin: Dict[str, Any] | None = None
+    with open(checks_path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            st = line.strip()
+            if st.startswith("Startpoint:"):
+                if cur is not None:
+                    yield cur
+                name, desc = _point(st[len("Startpoint:"):])
+                cur = {"startpoint": name, "start_type": desc, "endpoint": None, "end_type": "",
+                       "group": None, "type": None, "arrival_ns": None, "required_ns": None,
+                       "slack_ns": None, "met": None, "stages": []}
+                required, prev_pin = False, None
+                continue
+            if cur is None or not st or st.startswith("---"):
+                continue
+            if st.startswith("Endpoint:"):
+                cur["endpoint"], cur["end_type"] = _point(st[len("Endpoint:"):])
+            elif st.startswith("Path Group:"):
+                cur["group"] = st.split(":", 1)[1].strip()
+            elif st.startswith("Path Type:"):
+                cur["type"] = st.split(":", 1)[1].strip()
+            elif "Description" in st and ("Time" in st or "Path" in st):
+                cols = [(m.end(), _COLUMNS[m.group().lower()]) for m in re.finditer(r"\S+", line)
+                        if m.group().lower() in _COLUMNS]
+            else:
+                vals, edge, desc = _row(line, cols)
+                if desc == "data arrival time":
+                    if cur["arrival_ns"] is None:  # the slack summary repeats it negated
+                        cur["arrival_ns"] = vals.get("time")
+                    required = True
+                elif desc == "data required time":
+                    if cur["required_ns"] is None:
+                        cur["required_ns"] = vals.get("time")
+                elif desc.startswith("slack"):
+                    cur["slack_ns"] = vals.get("time")
+                    cur["met"] = "VIOLATED" not in desc
+                elif desc.startswith("library setup time") or desc.startswith("library hold time"):
+                    cur["stages"].append({"pin": None, "cell": None, "edge": "", "kind": "setup",
+                                          "delay_ns": abs(vals.get("delay", 0.0)), "time_ns": vals.get("time")})
+                elif required:
+                    continue  # capture clock path
+                elif desc.startswith("clock network delay"):
+                    cur["stages"].append({"pin": None, "cell": None, "edge": "", "kind": "clock",
+                                          "delay_ns": vals.get("delay", 0.0), "time_ns": vals.get("time")})
+                elif desc in ("input external delay", "output external delay"):
+                    cur["stages"].append({"pin": None, "cell": None, "edge": edge,
+                                          "kind": "input" if desc.startswith("input") else "output",
+                                          "delay_ns": vals.get("delay", 0.0), "time_ns": vals.get("time")})
+                elif desc.endswith("(net)"):
+                    if prev_pin is not None:
+                        prev_pin.update(net=desc[:-5].strip(), fanout=vals.get("fanout"), cap=vals.get("cap"))
+                else:
+                    m = _PIN_RE.match(desc)
+                    if not m or "time" not in vals:
+                        continue
+                    pin, cell = m.group("pin"), m.group("cell")
+                    inst = pin.rsplit("/", 1)[0] if "/" in pin else None
+                    if prev_pin is not None and inst is not None and inst == prev_pin["inst"]:
+                        launch = prev_pin is cur["stages"][-1] and prev_pin["first"] and \
+                            ("flip-flop" in cur["start_type"] or "latch" in cur["start_type"])
+                        kind = "clkq" if launch else "comb"
+                    else:
+                        kind = "wire"
+                    stage = {"pin": pin, "cell": cell, "edge": edge, "kind": kind,
+                             "delay_ns": vals.get("delay", 0.0), "time_ns": vals["time"],
+                             "slew_ns": vals.get("slew"), "net": None, "fanout": None, "cap": None,
+                             "inst": inst, "first": prev_pin is None}
+                    cur["stages"].append(stage)
+                    prev_pin = stage
+    if cur is not None:
+        yield cur
+
+def _breakdown(path: Dict[str, Any]) -> List[Dict[str, Any]]:
+    total: Dict[str, float] = {}
+    for st in path["stages"]:
+        total[st["kind"]] = total.get(st["kind"], 0.0) + (st["delay_ns"] or 0.0)
+    return [{"stage": k, "ns": round(total[k], 4)} for k in BREAKDOWN_ORDER if total.get(k)]
+
+def critical_paths(checks_path: Path, k: int = STA_TOP_PATHS) -> Dict[str, Any]:
+    """Top-k paths by slack (a bounded heap, so the report is never held in memory),
+    the worst path's delay breakdown, and the cells contributing most delay across them:
+    {"paths", "breakdown", "bottlenecks", "paths_seen"}."""
+    heap: List[tuple[float, int, Dict[str, Any]]] = []
+    seen = 0
+    if checks_path.exists():
+        for n, p in enumerate(iter_report_checks(checks_path)):
+            if p["slack_ns"] is None:
+                continue
+            seen += 1
+            for st in p["stages"]:
+                st.pop("inst", None)
+                st.pop("first", None)
+            p["depth"] = sum(1 for st in p["stages"] if st["kind"] in ("comb", "clkq"))
+            heapq.heappush(heap, (-p["slack_ns"], n, p))
+            if len(heap) > k:
+                heapq.heappop(heap)
+    paths = [p for _, _, p in sorted(heap, key=lambda e: (-e[0], e[1]))]
+    cells: Dict[str, Dict[str, Any]] = {}
+    for p in paths:
+        for st in p["stages"]:
+            if st["kind"] in ("comb", "clkq") and st["pin"]:
+                inst = st["pin"].rsplit("/", 1)[0]
+                c = cells.setdefault(inst, {"instance": inst, "cell": st["cell"], "delay_ns": 0.0, "paths": 0})
+                c["delay_ns"] = round(c["delay_ns"] + st["delay_ns"], 4)
+                c["paths"] += 1
+    return {
+        "paths": paths,
+        "breakdown": _breakdown(paths[0]) if paths else [],
+        "bottlenecks": sorted(cells.values(), key=lambda c: -c["delay_ns"])[:10],
+        "paths_seen": seen,
+    }
+
+def timing_summary(cp: Dict[str, Any] | None, k: int = 5) -> Dict[str, Any] | None:
+    """Compact view of critical_paths() for charts and the planner prompt (no stages)."""
+    if not cp or not cp["paths"]:
+        return None
+    worst = cp["paths"][0]
+    return {
+        "worst_slack_ns": worst["slack_ns"],
+        "worst_path": f'{worst["startpoint"]} -> {worst["endpoint"]}',
+        "logic_depth": worst["depth"],
+        "violating_paths": sum(1 for p in cp["paths"] if p["met"] is False),
+        "breakdown": cp["breakdown"],
+        "paths": [{"startpoint": p["startpoint"], "endpoint": p["endpoint"], "slack_ns": p["slack_ns"],
+                   "depth": p["depth"]} for p in cp["paths"][:k]],
+        "bottlenecks": [{"instance": c["instance"], "cell": c["cell"], "delay_ns": c["delay_ns"]}
+                        for c in cp["bottlenecks"][:k]],
+    }
+
 def timing_breakdown_from_checks(checks_path: Path) -> List[Dict[str, Any]]:
-    """
-    Produce a tiny 'breakdown' list from report_checks output.
-    We’ll just return a fixed example if parsing is hard.
-    """
-    if not checks_path.exists():
-        return [{"stage": "comb", "ns": 1.5}, {"stage": "clkq", "ns": 0.12}]
-    # Minimal heuristic: count occurrences of "data arrival time" lines (not robust, but OK for MVP)
-    txt = checks_path.read_text()
-    # This is a placeholder—you can enrich with real STA parsing later.
-    return [{"stage": "comb", "ns": 1.5}, {"stage": "clkq", "ns": 0.12}]
+    """Delay breakdown ({"stage", "ns"}) of the worst path in report_checks output."""
+    return critical_paths(checks_path, k=1)["breakdown"]
 
 def power_proxy_from_vcd(vcd_path: Path, cell_count: int, fmax_mhz: float | None) -> Dict[str, Any]:
     """
-    Lightweight dynamic power proxy:
-      dyn_mw ≈ k * toggles_norm * freq * cells
-    For MVP, we return a dummy series and compute a plausible dyn number.
+    Dynamic power from switching activity (VCD or SAIF, see vcd.py):
+      dyn_mw = 0.5 * activity * C_cell * VDD^2 * f * cells
+    where activity is toggles per data bit per clock cycle and f is fmax (or the
+    simulated clock). Without a dump, POWER_DEFAULT_ACTIVITY is assumed and the
+    series is empty. Leakage is a per-cell constant.
     """
-    # Series for chart (descending line)
-    series = [{"t": i, "mw": 60 - i*3} for i in range(10)]
-    base_dyn = 42.0
-    leak = 2.0
-    return {"dyn_mw": base_dyn, "leak_mw": leak, "series": series}
+    act = None
+    if vcd_path.is_file():
+        try:
+            act = activity(vcd_path)
+        except (OSError, ValueError) as e:
+            print(f"activity from {vcd_path} failed: {e}")
+    alpha = act["activity"] if act and act["activity"] is not None else POWER_DEFAULT_ACTIVITY
+    f_mhz = fmax_mhz or (act or {}).get("clock_mhz") or 0.0
+    per_unit_mw = 0.5 * POWER_CELL_CAP_FF * 1e-15 * POWER_VDD ** 2 * f_mhz * 1e6 * cell_count * 1e3
+    series = []
+    if act and act["bits"] and act["cycles"] and act["windows"]:
+        # Clock cycles per window at the trace's average clock rate
+        cycles = act["cycles"] * act["window_ns"] / (act["duration_s"] * 1e9)
+        series = [{"t": w["t_ns"], "mw": round(per_unit_mw * w["toggles"] / (act["bits"] * cycles), 6)}
+                  for w in act["windows"]]
+    return {
+        "dyn_mw": round(per_unit_mw * alpha, 6),
+        "leak_mw": round(cell_count * POWER_LEAK_NW_PER_CELL * 1e-6, 6),
+        "series": series,
+        "activity": alpha,
+        "source": act["format"] if act else "default",
+        "top_toggling": act["top"] if act else [],
+    }
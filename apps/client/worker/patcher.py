@@ -0,0 +1,275 @@
+from __future__ import annotations
+import os, re
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+# In-process unified-diff engine. Hunks are located like GNU patch does (expected line,
+# then nearest offset, then fuzz that ignores outer context lines), plus a
+# whitespace-insensitive pass for LLM diffs that re-indent context. Every match lowers
+# a per-hunk confidence; a patch set is applied only if all hunks in all files match
+# with confidence >= PATCH_MIN_CONFIDENCE, and then all files are written together.
+PATCH_MAX_FUZZ       = int(os.getenv("PATCH_MAX_FUZZ", "2"))
+PATCH_MIN_CONFIDENCE = float(os.getenv("PATCH_MIN_CONFIDENCE", "0.5"))
+
+_HUNK_RE  = re.compile(r"^@@+\s*(?:-(\d+)(?:,(\d+))?\s+\+(\d+)(?:,(\d+))?)?.*?@@")
+_FENCE_RE = re.compile(r"```[\w+-]*\n(.*?)```", re.S)
+
+OFFSET_PENALTY     = 0.05
+FUZZ_PENALTY       = 0.15
+WHITESPACE_PENALTY = 0.10
+
+class PatchError(Exception):
+    pass
+
+def parse_unified_diff(text: str) -> List[Dict[str, Any]]:
+    """Parse a (possibly multi-file) unified diff into
+    [{"old": path, "new": path, "hunks": [{"old_start", "lines": [(op, text)], "no_newline"}]}].
+    Hunk line counts in the @@ header are not trusted; LLMs routinely get them wrong.
+    """
+    files: List[Dict[str, Any]] = []
+    lines = text.replace("\r\n", "\n").split("\n")
+    cur = hunk = None
+    i = 0
+    while i < len(lines):
+        ln = lines[i]
+        if ln.startswith("--- "):
+            # LLM diffs (and difflib output joined with "\n") may put blank lines between
+            # the ---/+++/@@ headers
+            j = i + 1
+            while j < len(lines) and lines[j] == "":
+                j += 1
+            if j < len(lines) and lines[j].startswith("+++ "):
+                cur = {"old": _diff_path(ln[4:]), "new": _diff_path(lines[j][4:]), "hunks": []}
+                files.append(cur)
+                hunk = None
+                i = j + 1
+                continue
+        m = _HUNK_RE.match(ln)
+        if m and cur is not None:
+            hunk = {"old_start": int(m.group(1)) if m.group(1) else None, "lines": [], "no_newline": False}
+            cur["hunks"].append(hunk)
+        elif hunk is not None:
+            if ln.startswith(("diff ", "index ", "new file mode", "deleted file mode")):
+                hunk = None
+            elif ln.startswith("\\"):
+                hunk["no_newline"] = True
+            elif ln[:1] in (" ", "-", "+"):
+                hunk["lines"].append((ln[0], ln[1:]))
+            elif ln == "":
+                hunk["lines"].append((" ", ""))  # context blank line that lost its leading space
+        i += 1
+    for f in files:
+        for h in f["hunks"]:
+            # Blank lines right after the @@ header or at the end come from the join, not
+            # the file; should one be real context, the hunk still matches without it
+            while h["lines"] and h["lines"][0] == (" ", ""):
+                h["lines"].pop(0)
+            while h["lines"] and h["lines"][-1] == (" ", ""):
+                h["lines"].pop()
+    return [f for f in files if f["hunks"] or f["new"] is None or f["old"] is None]
+
+def _diff_path(spec: str) -> str | None:
+    p = spec.split("\t")[0].strip()
+    return None if p == "/dev/null" else p
+
+def _norm(s: str) -> str:
+    return " ".join(s.split())
+
+def _find_hunk(lines: List[str], old: List[str], expected: int) -> int | None:
+    """Position of `old` in `lines` nearest to `expected`, or None. Scans outwards from
+    `expected`, so the usual small offsets cost a handful of comparisons."""
+    n = len(old)
+    last = len(lines) - n
+    if n == 0:
+        return min(max(expected, 0), len(lines))
+    if last < 0:
+        return None
+    expected = min(max(expected, 0), last)
+    first = old[0]
+    for dist in range(0, max(expected, last - expected) + 1):
+        for pos in ((expected - dist, expected + dist) if dist else (expected,)):
+            if 0 <= pos <= last and lines[pos] == first and lines[pos:pos + n] == old:
+                return pos
+    return None
+
+def apply_hunks(text: str, hunks: List[Dict[str, Any]], max_fuzz: int = PATCH_MAX_FUZZ) -> Tuple[str, float, List[str]]:
+    """Apply hunks to text in memory. Returns (new_text, confidence, log lines).
+    Raises PatchError when a hunk cannot be located."""
+    trailing_nl = text.endswith("\n") or text == ""
+    lines = text.split("\n")
+    if trailing_nl:
+        lines.pop()
+    log: List[str] = []
+    confidence = 1.0
+    delta = 0   # lines added minus removed by earlier hunks
+    drift = 0   # offset at which the previous hunk actually matched
+    norm: List[str] | None = None
+    for n, h in enumerate(hunks, 1):
+        body = h["lines"]
+        expected = (h["old_start"] - 1 if h["old_start"] else 0) + delta + drift
+        if h["old_start"] == 0:
+            expected = 0
+        found = None
+        for fuzz in range(0, max_fuzz + 1):
+            lead = _context_run(body, fuzz, front=True)
+            tail = _context_run(body, fuzz, front=False)
+            if fuzz and lead == 0 and tail == 0:
+                break
+            trimmed = body[lead:len(body) - tail]
+            old = [t for op, t in trimmed if op != "+"]
+            for loose in (False, True):
+                if loose:
+                    norm = norm if norm is not None else [_norm(ln) for ln in lines]
+                    pos = _find_hunk(norm, [_norm(t) for t in old], expected + lead)
+                else:
+                    pos = _find_hunk(lines, old, expected + lead)
+                if pos is not None:
+                    found = (pos, trimmed, fuzz, loose)
+                    break
+            if found:
+                break
+        if not found:
+            new = [t for op, t in body if op != "-"]
+            if new and _find_hunk(lines, new, expected) is not None:
+                raise PatchError(f"hunk #{n} appears to be already applied")
+            raise PatchError(f"hunk #{n} does not match (expected near line {expected + 1})")
+        pos, trimmed, fuzz, loose = found
+        offset = pos - (expected + _context_run(body, fuzz, front=True))
+        score = 1.0
+        if offset:
+            score -= OFFSET_PENALTY
+            log.append(f"hunk #{n} succeeded at {pos + 1} (offset {offset} lines)")
+        if fuzz:
+            score -= FUZZ_PENALTY * fuzz
+            log.append(f"hunk #{n} succeeded at {pos + 1} with fuzz {fuzz}")
+        if loose:
+            score -= WHITESPACE_PENALTY
+            log.append(f"hunk #{n} matched ignoring whitespace")
+        confidence = min(confidence, score)
+
+        # Rebuild the region, keeping the file's own context lines
+        out: List[str] = []
+        cur = pos
+        for op, t in trimmed:
+            if op == " ":
+                out.append(lines[cur]); cur += 1
+            elif op == "-":
+                cur += 1
+            else:
+                out.append(t)
+        lines[pos:cur] = out
+        delta += len(out) - (cur - pos)
+        drift += offset
+        norm = None
+        if h.get("no_newline") and trimmed and trimmed[-1][0] != "-" and pos + len(out) == len(lines):
+            trailing_nl = False
+    return "\n".join(lines) + ("\n" if trailing_nl and lines else ""), confidence, log
+
+def _context_run(body: List[Tuple[str, str]], limit: int, front: bool) -> int:
+    """Number of context lines (at most `limit`) at the front/back of a hunk."""
+    seq = body if front else list(reversed(body))
+    n = 0
+    for op, _ in seq:
+        if op != " " or n >= limit:
+            break
+        n += 1
+    return n
+
+def _resolve(job_dir: Path, path: str, must_exist: bool) -> Path:
+    """Map a diff path to a file under job_dir, trying -p1 (a/, b/) then -p0."""
+    parts = Path(path).parts
+    options = [Path(*parts[1:]) if len(parts) > 1 else None, Path(path)]
+    if parts and parts[0] not in ("a", "b"):
+        options.reverse()
+    root = job_dir.resolve()
+    for rel in [o for o in options if o is not None]:
+        target = (job_dir / rel).resolve()
+        if root not in target.parents:
+            continue
+        if target.exists() or not must_exist:
+            return target
+    raise PatchError(f"can't find file to patch: {path}")
+
+def extract_full_content(text: str) -> str | None:
+    """A programmer 'diff' that is really the whole file (optionally fenced)."""
+    if re.search(r"^@@", text, re.M) or re.search(r"^(---|\+\+\+) ", text, re.M):
+        return None
+    m = _FENCE_RE.search(text)
+    body = m.group(1) if m else text
+    return body if re.search(r"\bmodule\b", body) and re.search(r"\bendmodule\b", body) else None
+
+def apply_patches(job_dir: Path, patches: List[Dict[str, Any]],
+                  min_confidence: float = PATCH_MIN_CONFIDENCE) -> Dict[str, Any]:
+    """Apply programmer patches ([{"path", "unified_diff"} or {"path", "content"}]) to
+    job_dir atomically: either every file is updated or none is.
+    Returns {"ok", "log", "confidence", "files"}.
+    """
+    staged: Dict[Path, str | None] = {}   # target -> new text (None = delete)
+    log: List[str] = []
+    confidence = 1.0
+    try:
+        for p in patches:
+            diff_text = p.get("unified_diff") or ""
+            content = p.get("content")
+            if content is None and diff_text.strip():
+                content = extract_full_content(diff_text)
+                if content is not None:
+                    log.append(f"{p.get('path')}: no hunks found; using full-file replacement")
+            if content is not None:
+                if not p.get("path"):
+                    raise PatchError("full-file replacement without a path")
+                staged[_resolve(job_dir, p["path"], must_exist=False)] = content
+                continue
+            if not diff_text.strip():
+                continue
+            files = parse_unified_diff(diff_text)
+            if not files:
+                raise PatchError(f"{p.get('path') or 'patch'}: no valid hunks")
+            for f in files:
+                if f["new"] is None:
+                    staged[_resolve(job_dir, f["old"], must_exist=True)] = None
+                    log.append(f"deleting {f['old']}")
+                    continue
+                if f["old"] is None:
+                    target = _resolve(job_dir, f["new"], must_exist=False)
+                    base = ""
+                else:
+                    target = _resolve(job_dir, f["old"], must_exist=True)
+                    base = staged[target] if target in staged else target.read_text()
+                    if base is None:
+                        raise PatchError(f"{f['old']}: patched after being deleted")
+                log.append(f"patching file {target.relative_to(job_dir.resolve())}")
+                new_text, conf, hlog = apply_hunks(base, f["hunks"])
+                staged[target] = new_text
+                confidence = min(confidence, conf)
+                log += hlog
+    except (PatchError, OSError, UnicodeDecodeError) as e:
+        return {"ok": False, "log": "\n".join(log + [f"patch failed: {e}"]), "confidence": 0.0, "files": []}
+
+    if confidence < min_confidence:
+        log.append(f"patch rejected: confidence {confidence:.2f} < {min_confidence:.2f}")
+        return {"ok": False, "log": "\n".join(log), "confidence": confidence, "files": []}
+
+    # Write phase: stage every file next to its target, then rename them all into place.
+    # Renaming replaces the inode, so hard-linked workspace clones stay isolated.
+    tmp_paths: List[Tuple[Path, Path]] = []
+    try:
+        for target, text in staged.items():
+            if text is None:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{target.name}.patch-tmp")
+            tmp.write_text(text)
+            tmp_paths.append((tmp, target))
+    except OSError as e:
+        for tmp, _ in tmp_paths:
+            tmp.unlink(missing_ok=True)
+        return {"ok": False, "log": "\n".join(log + [f"patch write failed: {e}"]), "confidence": 0.0, "files": []}
+    for tmp, target in tmp_paths:
+        os.replace(tmp, target)
+    for target, text in staged.items():
+        if text is None:
+            target.unlink(missing_ok=True)
+    root = job_dir.resolve()
+    return {"ok": True, "log": "\n".join(log), "confidence": confidence,
+            "files": [str(t.relative_to(root)) for t in staged]}
@@ -1,9 +1,13 @@
 from __future__ import annotations
-import os, subprocess, shutil
+import os, re, asyncio, hashlib, shutil
 from pathlib import Path
 from typing import Dict, Any
 from jinja2 import Environment, FileSystemLoader
 
+import cache
+import sta_session
+from parsers import STA_TOP_PATHS
+
 # Prefer mounted /tools; fallback to repo-relative tools dir
 TOOLS_DIR_CANDIDATES = [
     Path(os.getenv("TOOLS_DIR", "/tools")),
@@ -11,21 +15,74 @@ TOOLS_DIR_CANDIDATES = [
 ]
 TOOLS_DIR = next((p for p in TOOLS_DIR_CANDIDATES if p.exists()), TOOLS_DIR_CANDIDATES[-1])
 
-def run(cmd: str, cwd: Path, timeout: int = 900) -> tuple[int, str, str]:
-    p = subprocess.run(cmd, cwd=str(cwd), shell=True, capture_output=True, text=True, timeout=timeout)
-    return p.returncode, p.stdout, p.stderr
+# Cap on concurrently running tool subprocesses across all jobs in this worker process
+EDA_CORE_BUDGET = int(os.getenv("EDA_CORE_BUDGET", str(os.cpu_count() or 1)))
+_TOOL_SEM: asyncio.Semaphore | None = None
 
-def render_synth(top_module: str, target_freq_mhz: float, abc_script: str, out_path: Path):
+# Incremental synthesis: synthesise each module on its own, cache the mapped RTLIL by a
+# hash of its source + children + synth settings, and only re-run changed modules.
+INCREMENTAL_SYNTH = os.getenv("INCREMENTAL_SYNTH", "0") == "1"
+SYNTH_CACHE_DIR   = Path(os.getenv("SYNTH_CACHE_DIR", "/data/cache/modules"))
+
+def tool_semaphore() -> asyncio.Semaphore:
+    global _TOOL_SEM
+    if _TOOL_SEM is None:
+        _TOOL_SEM = asyncio.Semaphore(max(1, EDA_CORE_BUDGET))
+    return _TOOL_SEM
+
+# Return codes of runs that say nothing about the design: timed out, tool missing
+TRANSIENT_RC = (-9, 127)
+
+async def run(argv: list[str], cwd: Path, timeout: int = 900, stdin: str | None = None,
+              budgeted: bool = True) -> tuple[int, str, str]:
+    """Run a tool without blocking the event loop. Tool runs (budgeted=True) wait for a
+    slot of the EDA core budget first; quick helpers skip the budget."""
+    async def _exec() -> tuple[int, str, str]:
+        try:
+            p = await asyncio.create_subprocess_exec(
+                *argv, cwd=str(cwd),
+                stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            return 127, "", f"{argv[0]}: command not found"
+        try:
+            out, err = await asyncio.wait_for(p.communicate(stdin.encode() if stdin is not None else None), timeout)
+        except asyncio.TimeoutError:
+            p.kill()
+            await p.wait()
+            return -9, "", f"{argv[0]}: timed out after {timeout}s"
+        except asyncio.CancelledError:
+            # Cancelled by the stage DAG (e.g. simulation failed): don't leave the tool running
+            p.kill()
+            raise
+        return p.returncode, out.decode(errors="replace"), err.decode(errors="replace")
+    if not budgeted:
+        return await _exec()
+    async with tool_semaphore():
+        return await _exec()
+
+def write_text(path: Path, text: str):
+    """Replace path with new contents. Unlinking first keeps hard-linked workspace
+    clones (see workspace.clone_workspace) from writing through to their source."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    path.write_text(text)
+
+def synth_script(top_module: str, target_freq_mhz: float, abc_script: str) -> str:
     env = Environment(loader=FileSystemLoader(str(TOOLS_DIR)))
     period_ns = 1000.0 / float(target_freq_mhz)
     abc_delay_ps = int(period_ns * 1000.0)
-    text = env.get_template("synth.ys.j2").render(
+    return env.get_template("synth.ys.j2").render(
         top_module=top_module,
         abc_delay_ps=abc_delay_ps,
         abc_script=abc_script
     )
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(text)
+
+def render_synth(top_module: str, target_freq_mhz: float, abc_script: str, out_path: Path):
+    write_text(out_path, synth_script(top_module, target_freq_mhz, abc_script))
 
 def render_sta(lib_path: Path, netlist_path: Path, top_module: str, clock_port: str, period_ns: float, out_path: Path):
     env = Environment(loader=FileSystemLoader(str(TOOLS_DIR)))
@@ -37,10 +94,10 @@ def render_sta(lib_path: Path, netlist_path: Path, top_module: str, clock_port:
         clock_name=clock_port,
         clock_period_ns=period_ns,
         input_delay_ns=0.10,
-        output_delay_ns=0.10
+        output_delay_ns=0.10,
+        path_count=STA_TOP_PATHS
     )
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(text)
+    write_text(out_path, text)
 
 def prepare_workspace(job_dir: Path, rtl_text: str, top_module: str):
     (job_dir / "rtl").mkdir(parents=True, exist_ok=True)
@@ -48,18 +105,141 @@ def prepare_workspace(job_dir: Path, rtl_text: str, top_module: str):
     (job_dir / "reports").mkdir(exist_ok=True)
     (job_dir / "scripts").mkdir(exist_ok=True)
     (job_dir / "tb").mkdir(exist_ok=True)
-    (job_dir / "tb" / "test_dummy.py").write_text("def test_ok(): assert True\n")
-    (job_dir / "rtl" / f"{top_module}.v").write_text(rtl_text)
+    write_text(job_dir / "tb" / "test_dummy.py", "def test_ok(): assert True\n")
+    write_text(job_dir / "rtl" / f"{top_module}.v", rtl_text)
 
-def run_verilator_pytest(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
-    rc, out, err = run("pytest -q", cwd=job_dir / "tb", timeout=timeout)
+async def run_verilator_pytest(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
+    rc, out, err = await run(["pytest", "-q"], cwd=job_dir / "tb", timeout=timeout)
     vcd = next((p for p in job_dir.rglob("*.vcd")), None)
-    return {"pass": rc == 0, "log": out + err, "vcd": str(vcd) if vcd else None}
+    return {"pass": rc == 0, "rc": rc, "log": out + err, "vcd": str(vcd) if vcd else None}
 
-def run_yosys(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
-    rc, out, err = run("yosys -s synth.ys", cwd=job_dir, timeout=timeout)
+async def run_yosys(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
+    rc, out, err = await run(["yosys", "-s", "synth.ys"], cwd=job_dir, timeout=timeout)
+    return {"rc": rc, "out": out, "err": err}
+
+async def run_yosys_screen(job_dir: Path, top_module: str, timeout: int = 120) -> Dict[str, Any]:
+    """Lint + coarse synthesis without ABC (tools/synth_screen.ys.j2) for candidate screening."""
+    env = Environment(loader=FileSystemLoader(str(TOOLS_DIR)))
+    write_text(job_dir / "scripts" / "screen.ys",
+               env.get_template("synth_screen.ys.j2").render(top_module=top_module))
+    rc, out, err = await run(["yosys", "-s", "scripts/screen.ys"], cwd=job_dir, timeout=timeout)
     return {"rc": rc, "out": out, "err": err}
 
-def run_opensta(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
-    rc, out, err = run("sta -exit scripts/sta.tcl", cwd=job_dir, timeout=timeout)
+async def run_opensta(job_dir: Path, timeout: int = 900) -> Dict[str, Any]:
+    if sta_session.STA_SESSION:
+        # Persistent session: the liberty is already loaded, only the netlist is re-read
+        async with tool_semaphore():
+            return await sta_session.run(job_dir, job_dir / "scripts" / "sta.tcl", timeout)
+    rc, out, err = await run(["sta", "-exit", "scripts/sta.tcl"], cwd=job_dir, timeout=timeout)
     return {"rc": rc, "out": out, "err": err}
+
+# --------- Incremental (per-module) synthesis ----------
+_MODULE_RE = re.compile(r"\bmodule\s+([A-Za-z_]\w*)\b.*?\bendmodule\b", re.S)
+
+def parse_modules(rtl_dir: Path) -> Dict[str, Dict[str, Any]] | None:
+    """Split rtl/*.v into {name: {"src", "children"}}. Returns None for designs the
+    per-module flow can't handle faithfully (macros/includes, parameter overrides,
+    duplicate module names); callers then fall back to full synthesis."""
+    mods: Dict[str, Dict[str, Any]] = {}
+    for p in sorted(rtl_dir.glob("*.v")):
+        text = cache.strip_comments(p.read_text())
+        if "`" in text:
+            return None
+        for m in _MODULE_RE.finditer(text):
+            if m.group(1) in mods:
+                return None
+            mods[m.group(1)] = {"src": m.group(0) + "\n", "children": []}
+    for name, mod in mods.items():
+        body = mod["src"][mod["src"].index(name) + len(name):]
+        for child in mods:
+            for m in re.finditer(r"\b" + re.escape(child) + r"\b\s*(#|[A-Za-z_\\][\w$]*\s*[\[(])", body):
+                if m.group(1) == "#":
+                    return None  # parameterised instance: needs a specialised copy
+                if child not in mod["children"]:
+                    mod["children"].append(child)
+    return mods
+
+def module_hashes(mods: Dict[str, Dict[str, Any]], top: str, salt: str) -> Dict[str, str]:
+    """Hash every module reachable from top over its canonical source, its children's
+    hashes and `salt` (synth settings + tool versions)."""
+    out: Dict[str, str] = {}
+    def visit(name: str) -> str:
+        if name not in out:
+            h = hashlib.sha256(salt.encode())
+            h.update(cache.canonical_rtl(mods[name]["src"]).encode())
+            for child in sorted(mods[name]["children"]):
+                h.update(b"\0" + child.encode() + b"=" + visit(child).encode())
+            out[name] = h.hexdigest()
+        return out[name]
+    visit(top)
+    return out
+
+async def run_yosys_incremental(job_dir: Path, top_module: str, target_freq_mhz: float,
+                                abc_script: str, timeout: int = 900) -> Dict[str, Any]:
+    """Per-module synthesis + stitch. Falls back to run_yosys() (full synth.ys) when the
+    design can't be split, or when synth.ys is not the stock script for these settings
+    (e.g. a candidate's synth_script_patch): the per-module scripts are rendered from
+    the templates and would drop the change. Returns run_yosys()'s shape plus module
+    hit/miss counts."""
+    synth_ys = job_dir / "synth.ys"
+    if synth_ys.exists() and synth_ys.read_text() != synth_script(top_module, target_freq_mhz, abc_script):
+        return {**await run_yosys(job_dir, timeout), "modules": None}
+    mods = parse_modules(job_dir / "rtl")
+    if not mods or top_module not in mods:
+        return {**await run_yosys(job_dir, timeout), "modules": None}
+
+    abc_delay_ps = int(1000.0 / float(target_freq_mhz) * 1000.0)
+    salt = f"{abc_script}|{abc_delay_ps}|{cache.tool_versions()}"
+    hashes = await asyncio.to_thread(module_hashes, mods, top_module, salt)
+    mod_dir = job_dir / "synth" / "modules"
+    (mod_dir / "src").mkdir(parents=True, exist_ok=True)
+    env = Environment(loader=FileSystemLoader(str(TOOLS_DIR)))
+
+    async def synth_one(name: str) -> tuple[int, str]:
+        cached = SYNTH_CACHE_DIR / hashes[name][:2] / f"{hashes[name]}.il"
+        out_path = mod_dir / f"{name}.il"
+        if cached.exists():
+            shutil.copyfile(cached, out_path)
+            return 0, ""
+        script = mod_dir / f"{name}.ys"
+        write_text(script, env.get_template("synth_module.ys.j2").render(
+            module=name,
+            src=f"synth/modules/src/{name}.v",
+            children=[f"synth/modules/src/{c}.v" for c in mods[name]["children"]],
+            abc_delay_ps=abc_delay_ps,
+            abc_script=abc_script,
+            out_path=f"synth/modules/{name}.il",
+        ))
+        rc, _, err = await run(["yosys", "-q", "-s", str(script.relative_to(job_dir))], cwd=job_dir, timeout=timeout)
+        if rc == 0 and out_path.exists():
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_suffix(f".tmp{os.getpid()}")
+            shutil.copyfile(out_path, tmp)
+            os.replace(tmp, cached)
+        return rc, err
+
+    misses = [n for n in hashes if not (SYNTH_CACHE_DIR / hashes[n][:2] / f"{hashes[n]}.il").exists()]
+    # Sources the misses read (their own and their children's), each written once before
+    # any yosys run starts: rewriting a shared child under a running run could tear it
+    for n in sorted({c for m in misses for c in (m, *mods[m]["children"])}):
+        write_text(mod_dir / "src" / f"{n}.v", mods[n]["src"])
+    results = await asyncio.gather(*(synth_one(n) for n in hashes))
+    failed = [(n, err) for n, (rc, err) in zip(hashes, results) if rc != 0]
+    if failed:
+        return {"rc": 1, "out": "", "err": "\n".join(f"[{n}] {err}" for n, err in failed),
+                "modules": {"total": len(hashes), "synthesized": len(misses)}}
+
+    write_text(job_dir / "synth" / "stitch.ys", env.get_template("synth_stitch.ys.j2").render(
+        top_module=top_module,
+        modules=[f"synth/modules/{n}.il" for n in sorted(hashes)],
+    ))
+    rc, out, err = await run(["yosys", "-s", "synth/stitch.ys"], cwd=job_dir, timeout=timeout)
+    return {"rc": rc, "out": out, "err": err,
+            "modules": {"total": len(hashes), "synthesized": len(misses)}}
+
+async def run_synthesis(job_dir: Path, top_module: str | None, target_freq_mhz: float,
+                        abc_script: str, timeout: int = 900) -> Dict[str, Any]:
+    """Full synth.ys run, or the per-module flow when INCREMENTAL_SYNTH=1."""
+    if INCREMENTAL_SYNTH and top_module:
+        return await run_yosys_incremental(job_dir, top_module, target_freq_mhz, abc_script, timeout)
+    return await run_yosys(job_dir, timeout)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+import os, math, asyncio
+from typing import Dict, Any, List, AsyncIterator, Awaitable, Callable
+
+# Multi-fidelity candidate scheduling (successive halving over two rungs). Every
+# prepared candidate first gets the cheap screen (lint + coarse synthesis without ABC,
+# giving a gate count and logic depth); only the best-ranked fraction is promoted to
+# the full pytest || yosys/ABC -> OpenSTA evaluation. Per-job knobs live in
+# spec.budgets next to max_iters/max_parallel:
+#   screening        : false disables the screen (every candidate gets the full run)
+#   screen_candidates: candidates requested from the planner and screened (default 2 x max_parallel)
+#   promote_ratio    : fraction of screened candidates promoted (at most max_parallel)
+#   screen_timeout_s / full_timeout_s : per-tool time budget of each fidelity
+MULTI_FIDELITY   = os.getenv("MULTI_FIDELITY", "1") == "1"
+PROMOTE_RATIO    = float(os.getenv("PROMOTE_RATIO", "0.5"))
+SCREEN_TIMEOUT_S = int(os.getenv("SCREEN_TIMEOUT_S", "120"))
+FULL_TIMEOUT_S   = int(os.getenv("FULL_TIMEOUT_S", "900"))
+
+def budgets(spec: Dict[str, Any], parallel: int) -> Dict[str, Any]:
+    b = spec.get("budgets", {}) or {}
+    screening = bool(b.get("screening", MULTI_FIDELITY))
+    return {
+        "screening": screening,
+        "candidates": max(1, int(b.get("screen_candidates", 2 * parallel if screening else parallel))),
+        "promote_ratio": min(1.0, max(0.0, float(b.get("promote_ratio", PROMOTE_RATIO)))),
+        "max_promote": max(1, parallel),
+        "screen_timeout_s": int(b.get("screen_timeout_s", SCREEN_TIMEOUT_S)),
+        "full_timeout_s": int(b.get("full_timeout_s", FULL_TIMEOUT_S)),
+    }
+
+def screen_cost(proxy: Dict[str, Any], baseline: Dict[str, Any] | None, weights) -> float:
+    """Rank a screened candidate by its proxies relative to the baseline's, using the
+    Pareto weights (fmax <- logic depth; area and both powers <- gate count). Each lint
+    problem costs as much as doubling a proxy."""
+    base = baseline or {}
+    depth = (proxy.get("depth") or base.get("depth") or 1) / (base.get("depth") or 1)
+    cells = (proxy.get("cells") or 0) / (base.get("cells") or 1)
+    w = list(weights)
+    return w[0] * depth + sum(w[1:]) * cells + (proxy.get("lint_problems") or 0)
+
+def promote_count(screened: int, b: Dict[str, Any]) -> int:
+    if screened == 0:
+        return 0
+    return min(b["max_promote"], screened, max(1, math.ceil(b["promote_ratio"] * screened)))
+
+async def successive_halving(prepared: List[tuple[Dict[str, Any], Awaitable[tuple[Dict[str, Any], Dict[str, Any]]]]],
+                             screen: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                             full: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                             cost: Callable[[Dict[str, Any]], float],
+                             b: Dict[str, Any],
+                             stats: Dict[str, int] | None = None) -> AsyncIterator[tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (candidate, result) as results become final. `prepared` pairs each candidate
+    with an awaitable of (candidate, prepare_candidate() result); candidates that fail
+    preparation or the screen, raise, or are not promoted are yielded with ok=False (the
+    reason says which). Full evaluations stream out in completion order."""
+    stats = stats if stats is not None else {}
+
+    async def rung0(cand, aw):
+        try:
+            cand, prep = await aw
+            if not prep["ok"] or not b["screening"]:
+                return cand, prep, None
+            return cand, prep, await screen(prep)
+        except Exception as e:
+            print(f"candidate evaluation error: {e}")
+            return cand, {"ok": False, "reason": f"error: {e}"}, None
+
+    survivors: List[tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any] | None]] = []
+    for nxt in asyncio.as_completed([rung0(c, aw) for c, aw in prepared]):
+        cand, prep, proxy = await nxt
+        if not prep["ok"]:
+            yield cand, prep
+        elif proxy is not None and not proxy["ok"]:
+            stats["screen_failed"] = stats.get("screen_failed", 0) + 1
+            yield cand, proxy
+        else:
+            survivors.append((cand, prep, proxy))
+
+    if b["screening"]:
+        stats["screened"] = stats.get("screened", 0) + len(survivors)
+        survivors.sort(key=lambda s: cost(s[2]))
+        k = promote_count(len(survivors), b)
+        for cand, prep, proxy in survivors[k:]:
+            yield cand, {"ok": False, "reason": "not promoted", "screen": proxy}
+        survivors = survivors[:k]
+    stats["promoted"] = stats.get("promoted", 0) + len(survivors)
+
+    async def rung1(cand, prep, proxy):
+        try:
+            res = await full(prep)
+        except Exception as e:
+            print(f"candidate evaluation error: {e}")
+            res = {"ok": False, "reason": f"error: {e}"}
+        return cand, {**res, "screen": proxy} if proxy is not None else res
+
+    for nxt in asyncio.as_completed([rung1(*s) for s in survivors]):
+        yield await nxt
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import os, re, asyncio
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Long-lived OpenSTA processes driven over their Tcl stdin. Each liberty file is read
+# once per process; a run then sources the rendered sta.tcl without its read_liberty
+# and exit lines, so only read_verilog/link_design and the constraint/report block run
+# per candidate. read_verilog replaces modules of the same name and link_design clears
+# the previous SDC (clocks, I/O delays), but modules the new netlist does not define
+# would linger and could be linked against. So a session only takes runs whose netlist
+# defines the same modules as the netlist it read before (the candidates of one design);
+# any other design gets a fresh process. A session is also recycled after
+# STA_SESSION_MAX_RUNS runs, once its RSS passes STA_SESSION_MAX_RSS_MB, or after any
+# timeout or Tcl error.
+STA_SESSION           = os.getenv("STA_SESSION", "1") == "1"
+STA_SESSIONS          = int(os.getenv("STA_SESSIONS", "2"))          # concurrent sessions per worker
+STA_SESSION_MAX_RUNS  = int(os.getenv("STA_SESSION_MAX_RUNS", "200"))
+STA_SESSION_MAX_RSS_MB = int(os.getenv("STA_SESSION_MAX_RSS_MB", "4096"))
+
+_MARKER = "__VERIRL_STA_DONE__"
+_LIBERTY_RE = re.compile(r"^\s*read_liberty\s+(.+?)\s*$")
+_VERILOG_RE = re.compile(r"^\s*read_verilog\s+(.+?)\s*$", re.M)
+_MODULE_RE  = re.compile(r"^\s*module\s+(\\\S+|[A-Za-z_][\w$]*)", re.M)
+
+def design_key(script: Path, job_dir: Path) -> frozenset[str]:
+    """Names of the modules the netlists read by `script` define."""
+    mods: set[str] = set()
+    for path in _VERILOG_RE.findall(script.read_text()):
+        try:
+            mods.update(_MODULE_RE.findall((job_dir / path.strip("{}\"'")).read_text()))
+        except OSError:
+            pass
+    return frozenset(mods)
+
+class StaSession:
+    def __init__(self):
+        self.proc: asyncio.subprocess.Process | None = None
+        self.liberties: set[str] = set()
+        self.design: frozenset[str] | None = None   # design_key() of the netlist in memory
+        self.runs = 0
+        self._seq = 0
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            "sta", "-no_splash", "-no_init",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    def rss_mb(self) -> float:
+        try:
+            with open(f"/proc/{self.proc.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, AttributeError):
+            pass
+        return 0.0
+
+    def worn_out(self) -> bool:
+        return self.runs >= STA_SESSION_MAX_RUNS or self.rss_mb() > STA_SESSION_MAX_RSS_MB
+
+    async def close(self):
+        if self.alive():
+            self.proc.stdin.close()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        self.proc = None
+
+    async def eval(self, tcl: str, timeout: float) -> tuple[int, str]:
+        """Run Tcl in the session; returns (0 or 1, output). Output ends at a marker
+        line echoed after the command, so the interpreter never has to exit."""
+        self._seq += 1
+        marker = f"{_MARKER} {self._seq}"
+        self.proc.stdin.write((
+            f"set __rc [catch {{{tcl}}} __err]\n"
+            f"if {{$__rc}} {{ puts \"Error: $__err\" }}\n"
+            f"puts \"\\n{marker} $__rc\"\n"
+            "flush stdout\n").encode())
+        await self.proc.stdin.drain()
+        out: List[str] = []
+        async def read():
+            while True:
+                line = await self.proc.stdout.readline()
+                if not line:
+                    raise EOFError("sta exited")
+                text = line.decode(errors="replace")
+                if text.startswith(marker):
+                    return int(text.split()[-1])
+                out.append(text)
+        rc = await asyncio.wait_for(read(), timeout)
+        return rc, "".join(out)
+
+    async def run(self, job_dir: Path, script: Path, timeout: float,
+                  design: frozenset[str] | None = None) -> Dict[str, Any]:
+        self.design = design
+        body: List[str] = []
+        for line in script.read_text().splitlines():
+            m = _LIBERTY_RE.match(line)
+            if m:
+                lib = m.group(1)
+                if lib not in self.liberties:
+                    rc, out = await self.eval(f"read_liberty {lib}", timeout)
+                    if rc:
+                        return {"rc": rc, "out": out, "err": out}
+                    self.liberties.add(lib)
+                continue
+            if line.strip() == "exit":
+                continue
+            body.append(line)
+        session_script = script.with_name(script.stem + "_session.tcl")
+        session_script.unlink(missing_ok=True)  # never write through a hard-linked clone
+        session_script.write_text("\n".join(body) + "\n")
+        rc, out = await self.eval(f"cd {{{job_dir}}}; source {{{session_script}}}", timeout)
+        self.runs += 1
+        return {"rc": rc, "out": out, "err": out if rc else ""}
+
+_idle: List[StaSession] = []
+_sem: asyncio.Semaphore | None = None
+
+async def run(job_dir: Path, script: Path, timeout: float = 900) -> Dict[str, Any]:
+    """run_opensta() through a pooled session; same {"rc", "out", "err"} result."""
+    global _sem
+    if _sem is None:
+        _sem = asyncio.Semaphore(max(1, STA_SESSIONS))
+    async with _sem:
+        design = await asyncio.to_thread(design_key, script, job_dir)
+        # Prefer a session that already holds this design; another design needs a fresh one
+        sess = next((s for s in _idle if s.design == design), None) or (_idle[-1] if _idle else StaSession())
+        if sess in _idle:
+            _idle.remove(sess)
+        try:
+            if sess.alive() and sess.design is not None and sess.design != design:
+                await sess.close()
+            if not sess.alive():
+                sess = StaSession()
+                await sess.start()
+            res = await sess.run(job_dir, script, timeout, design)
+        except FileNotFoundError:
+            return {"rc": 127, "out": "", "err": "sta: command not found"}
+        except asyncio.TimeoutError:
+            await _kill(sess)
+            return {"rc": -9, "out": "", "err": f"sta: timed out after {timeout}s"}
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            await _kill(sess)
+            return {"rc": 1, "out": "", "err": f"sta session died: {e}"}
+        except asyncio.CancelledError:
+            await _kill(sess)
+            raise
+        if res["rc"] or sess.worn_out():
+            await sess.close()   # a failed run may leave half-linked state behind
+        else:
+            _idle.append(sess)
+        return res
+
+async def _kill(sess: StaSession):
+    if sess.alive():
+        sess.proc.kill()
+        await sess.proc.wait()
+    sess.proc = None
+
+async def shutdown():
+    while _idle:
+        await _idle.pop().close()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+import os, re, json, math, zlib, asyncio
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+# Surrogate pre-ranking of planner candidates. Every candidate the worker finishes is
+# appended to SURROGATE_HISTORY (JSON lines, shared by all workers on the volume):
+# design features of the RTL it was applied to, transform + params, and the outcome
+# (fmax/area/power deltas relative to the result it started from, or a failure).
+# Before any programmer call or EDA run the plan's candidates are ranked by the
+# predicted gain, and, once the model has proven itself, likely failures are pruned:
+#   deltas  : ridge regression on [design, transform one-hot, transform x design size]
+#   failure : distance-weighted k-NN over the same vectors
+# Leave-one-out errors of both (closed form for ridge; k-NN on a sample of at most
+# SURROGATE_BRIER_SAMPLE rows) and the error of predictions made before the outcome was
+# known are reported with the job. Only EDA verdicts are learned from: screen/sim
+# failures and finished results, not LLM, patch or tool-timeout failures.
+SURROGATE             = os.getenv("SURROGATE", "1") == "1"
+SURROGATE_HISTORY     = Path(os.getenv("SURROGATE_HISTORY", "/data/surrogate/history.jsonl"))
+SURROGATE_MAX_ROWS    = int(os.getenv("SURROGATE_MAX_ROWS", "5000"))     # most recent rows trained on
+SURROGATE_MIN_ROWS    = int(os.getenv("SURROGATE_MIN_ROWS", "30"))       # rank only below this
+SURROGATE_PRUNE_FAIL  = float(os.getenv("SURROGATE_PRUNE_FAIL", "0.8"))  # predicted failure rate
+SURROGATE_RIDGE       = float(os.getenv("SURROGATE_RIDGE", "1.0"))
+SURROGATE_KNN         = int(os.getenv("SURROGATE_KNN", "7"))
+SURROGATE_BRIER_SAMPLE = int(os.getenv("SURROGATE_BRIER_SAMPLE", "500"))
+
+TARGETS = ("fmax", "area", "dyn_power", "leak_power")
+_METRIC = {"fmax": "fmax_mhz", "area": "area_ge", "dyn_power": "dyn_power_mw", "leak_power": "leak_power_mw"}
+_TRANSFORM_BUCKETS = 16
+_PARAM_BUCKETS = 8
+_DESIGN_RE = {
+    "always": re.compile(r"\balways(?:_ff|_comb|_latch)?\b"),
+    "assign": re.compile(r"\bassign\b"),
+    "reg": re.compile(r"\b(?:reg|logic)\b"),
+    "module": re.compile(r"\bmodule\b"),
+    "mul": re.compile(r"[^*]\*[^*]"),
+    "addsub": re.compile(r"[^+\-][+\-][^+\-]"),
+    "case": re.compile(r"\bcase[zx]?\b"),
+}
+_WIDTH_RE = re.compile(r"\[\s*(\d+)\s*:\s*(\d+)\s*\]")
+_GATES = 2 + len(_DESIGN_RE)   # index of log gate count in design_features()
+
+def design_features(rtl: str, metrics: Dict[str, Any]) -> List[float]:
+    """Size/structure of the RTL plus the metrics it currently achieves (log-scaled)."""
+    text = re.sub(r"//[^\n]*|/\*.*?\*/", "", rtl, flags=re.S)
+    counts = [len(r.findall(text)) for r in _DESIGN_RE.values()]
+    widths = [abs(int(a) - int(b)) + 1 for a, b in _WIDTH_RE.findall(text)]
+    return [math.log1p(x) for x in (
+        text.count("\n"), *counts, max(widths, default=1),
+        float(metrics.get("gate_count") or 0), float(metrics.get("fmax_mhz") or 0),
+        float(metrics.get("dyn_power_mw") or 0) * 1000)]
+
+def _bucket(s: str, n: int) -> int:
+    return zlib.crc32(s.encode()) % n
+
+def _transform_features(cand: Dict[str, Any], size: float) -> List[float]:
+    t = [0.0] * _TRANSFORM_BUCKETS
+    t[_bucket(str(cand.get("transform")), _TRANSFORM_BUCKETS)] = 1.0
+    p = [0.0] * _PARAM_BUCKETS
+    for k, v in sorted((cand.get("params") or {}).items()):
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            p[_bucket(f"{cand.get('transform')}.{k}", _PARAM_BUCKETS)] += math.copysign(math.log1p(abs(v)), v)
+        else:
+            p[_bucket(f"{cand.get('transform')}.{k}={v}", _PARAM_BUCKETS)] += 1.0
+    return t + p + [x * size for x in t]
+
+def features(design: List[float], cand: Dict[str, Any]) -> List[float]:
+    return design + _transform_features(cand, design[_GATES])
+
+# Failures that say something about the transform
+LEARNED_FAILURES = ("screen failed", "sim failed")
+
+def outcome(before: Dict[str, Any], res: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of each objective, or a failure."""
+    if not res.get("ok"):
+        return {"ok": False, "reason": res.get("reason")}
+    after = res["metrics"]
+    deltas = {}
+    for t in TARGETS:
+        b, a = float(before.get(_METRIC[t]) or 0), float(after.get(_METRIC[t]) or 0)
+        deltas[t] = (a - b) / b if b else 0.0
+    return {"ok": True, "deltas": deltas}
+
+class Model:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = len(rows)
+        X = np.array([r["x"] for r in rows], dtype=float) if rows else np.empty((0, 0))
+        self.fail = np.array([0.0 if r["outcome"]["ok"] else 1.0 for r in rows])
+        self.mu = X.mean(axis=0) if rows else None
+        self.sd = np.where(X.std(axis=0) > 1e-9, X.std(axis=0), 1.0) if rows else None
+        self.Z = (X - self.mu) / self.sd if rows else X
+        ok = self.fail == 0
+        self.W = None
+        self.loo_mae: Dict[str, float] = {}
+        self.loo_r2: Dict[str, float] = {}
+        if ok.sum() >= 3:
+            Z = np.hstack([self.Z[ok], np.ones((int(ok.sum()), 1))])
+            Y = np.array([[r["outcome"]["deltas"].get(t, 0.0) for t in TARGETS]
+                          for r, k in zip(rows, ok) if k])
+            reg = SURROGATE_RIDGE * np.eye(Z.shape[1])
+            reg[-1, -1] = 0.0   # intercept is not shrunk
+            A = np.linalg.pinv(Z.T @ Z + reg)
+            self.W = A @ Z.T @ Y
+            # Leave-one-out residuals without refitting: e_i / (1 - h_ii)
+            h = np.einsum("ij,jk,ik->i", Z, A, Z)
+            loo = (Y - Z @ self.W) / np.maximum(1e-9, 1 - h)[:, None]
+            var = Y.var(axis=0)
+            for j, t in enumerate(TARGETS):
+                self.loo_mae[t] = round(float(np.abs(loo[:, j]).mean()), 5)
+                self.loo_r2[t] = round(float(1 - (loo[:, j] ** 2).mean() / var[j]), 3) if var[j] > 0 else None
+        self.online = online_error(rows)
+
+    @cached_property
+    def fail_brier(self) -> float | None:
+        """Leave-one-out Brier score of the failure k-NN over an evenly spaced sample of
+        rows (each query is O(rows)); only the job report needs it."""
+        if self.rows <= SURROGATE_KNN:
+            return None
+        sample = np.unique(np.linspace(0, self.rows - 1, min(self.rows, SURROGATE_BRIER_SAMPLE)).astype(int))
+        p = np.array([self._knn(self.Z[i], skip=i) for i in sample])
+        return round(float(((p - self.fail[sample]) ** 2).mean()), 4)
+
+    def _knn(self, z: np.ndarray, skip: int | None = None) -> float:
+        d = np.sqrt(((self.Z - z) ** 2).sum(axis=1))
+        if skip is not None:
+            d[skip] = np.inf
+        k = min(SURROGATE_KNN, self.rows - (skip is not None))
+        if k <= 0:
+            return float(self.fail.mean()) if self.rows else 0.0
+        idx = np.argpartition(d, k - 1)[:k]
+        w = 1.0 / (d[idx] + 1e-6)
+        return float((w * self.fail[idx]).sum() / w.sum())
+
+    @property
+    def trusted(self) -> bool:
+        r2 = [v for v in self.loo_r2.values() if v is not None]   # constant targets say nothing
+        return self.rows >= SURROGATE_MIN_ROWS and bool(r2) and float(np.mean(r2)) > 0.0
+
+    def predict(self, x: List[float]) -> Dict[str, Any]:
+        if not self.rows:
+            return {"p_fail": 0.0, "deltas": {t: 0.0 for t in TARGETS}}
+        z = (np.array(x, dtype=float) - self.mu) / self.sd
+        deltas = dict.fromkeys(TARGETS, 0.0)
+        if self.W is not None:
+            deltas = {t: float(v) for t, v in zip(TARGETS, np.append(z, 1.0) @ self.W)}
+        return {"p_fail": round(self._knn(z), 4), "deltas": {t: round(v, 5) for t, v in deltas.items()}}
+
+def _load(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    rows: List[Dict[str, Any]] = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue   # a torn line from a crashed writer
+            if len(rows) > 2 * SURROGATE_MAX_ROWS:
+                rows = rows[-SURROGATE_MAX_ROWS:]
+    return rows[-SURROGATE_MAX_ROWS:]
+
+_model: Model | None = None
+_model_stamp: tuple[int, int] | None = None
+
+def model() -> Model:
+    """Model over the current history, refitted when the history file has changed."""
+    global _model, _model_stamp
+    try:
+        st = SURROGATE_HISTORY.stat()
+        stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        stamp = (0, 0)
+    if _model is None or stamp != _model_stamp:
+        _model, _model_stamp = Model(_load(SURROGATE_HISTORY)), stamp
+    return _model
+
+def online_error(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Error of predictions made before each outcome was known."""
+    done = [r for r in rows if r.get("predicted")]
+    ok = [r for r in done if r["outcome"]["ok"]]
+    out: Dict[str, Any] = {"rows": len(done)}
+    if ok:
+        out["mae"] = {t: round(float(np.mean([abs(r["predicted"]["deltas"].get(t, 0.0)
+                                                    - r["outcome"]["deltas"].get(t, 0.0)) for r in ok])), 5)
+                      for t in TARGETS}
+    if done:
+        out["fail_brier"] = round(float(np.mean([(r["predicted"]["p_fail"] - (not r["outcome"]["ok"])) ** 2
+                                                 for r in done])), 4)
+    return out
+
+def _cand_key(cand: Dict[str, Any]) -> str:
+    """Predictions depend on the transform and params only (the design is per plan)."""
+    return json.dumps([cand.get("transform"), cand.get("params") or {}], sort_keys=True, default=str)
+
+class Session:
+    """Per-job view: ranks each plan and records each outcome, keeping the predictions
+    so the job can report how well they held up. The model is fitted once, at the
+    job's first plan: the records flushed after every iteration (and other workers'
+    appends) change the history file, and refitting on each of them would cost a fit
+    per iteration for little gain."""
+    def __init__(self, weights: np.ndarray):
+        self.weights = weights   # pareto order: fmax, area, dyn, leak
+        self.model: Model | None = None
+        self.predicted: Dict[str, Dict[str, Any]] = {}
+        self.records: List[Dict[str, Any]] = []
+        self.ranked = 0
+        self.pruned = 0
+
+    def gain(self, pred: Dict[str, Any]) -> float:
+        d = pred["deltas"]
+        g = (self.weights[0] * d["fmax"] - self.weights[1] * d["area"]
+             - self.weights[2] * d["dyn_power"] - self.weights[3] * d["leak_power"])
+        return float((1 - pred["p_fail"]) * g)
+
+    async def rank(self, cands: List[Dict[str, Any]], design: List[float], keep: int) -> List[Dict[str, Any]]:
+        """Candidates best-first, at most `keep`, without likely failures once trusted."""
+        if not SURROGATE or not cands:
+            return cands[:keep]
+        if self.model is None:
+            self.model = await asyncio.to_thread(model)
+        m = self.model
+        scored = []
+        self.predicted = {}
+        for i, c in enumerate(cands):
+            pred = m.predict(features(design, c)) if m.rows else None
+            self.predicted[_cand_key(c)] = pred
+            scored.append((-self.gain(pred) if pred else 0.0, i, c, pred))
+        if m.rows >= SURROGATE_MIN_ROWS:
+            scored.sort(key=lambda s: (s[0], s[1]))
+            self.ranked += len(scored)
+        out = scored
+        if m.trusted:
+            out = [s for s in scored if s[3]["p_fail"] < SURROGATE_PRUNE_FAIL] or scored[:1]
+            self.pruned += len(scored) - len(out)
+        return [s[2] for s in out[:keep]]
+
+    def record(self, design: List[float], before: Dict[str, Any], cand: Dict[str, Any], res: Dict[str, Any]):
+        if not SURROGATE:
+            return
+        if not res.get("ok") and (res.get("reason") not in LEARNED_FAILURES or res.get("transient")):
+            return   # not an EDA verdict on the transform (not promoted, LLM/patch error, timeout)
+        self.records.append({
+            "x": features(design, cand),
+            "transform": cand.get("transform"),
+            "params": cand.get("params", {}),
+            "outcome": outcome(before, res),
+            "predicted": self.predicted.get(_cand_key(cand)),
+        })
+
+    async def flush(self):
+        """Append the records since the last flush to the shared history (one write per
+        iteration, so a crashed job keeps what it learned)."""
+        if not self.records:
+            return
+        text = "".join(json.dumps(r, default=str) + "\n" for r in self.records)
+        self.records = []
+        try:
+            await asyncio.to_thread(_append, SURROGATE_HISTORY, text)
+        except OSError as e:
+            print(f"surrogate history write to {SURROGATE_HISTORY} failed: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        m = model()
+        return {
+            "rows": m.rows,
+            "trusted": m.trusted,
+            "loo_mae": m.loo_mae,
+            "loo_r2": m.loo_r2,
+            "loo_fail_brier": m.fail_brier,
+            "online": m.online,
+            "ranked": self.ranked,
+            "pruned": self.pruned,
+        }
+
+def _append(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(text)
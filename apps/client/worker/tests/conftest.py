@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The worker modules are flat files run from apps/client/worker
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import cache
+import evaluate
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(cache, "_total", None)
+    monkeypatch.setattr(cache, "tool_versions", lambda: "yosys 0.0")
+    return tmp_path / "cache"
+
+@pytest.fixture
+def work(tmp_path):
+    w = tmp_path / "work"
+    for d in ("rtl", "tb", "synth", "reports", "scripts"):
+        (w / d).mkdir(parents=True)
+    (w / "rtl" / "top.v").write_text("module top(input a, output b);\n  assign b = a; // pass\nendmodule\n")
+    (w / "synth.ys").write_text("synth -top top\n")
+    return w
+
+def test_key_ignores_comments_and_whitespace(work, tmp_path):
+    lib = tmp_path / "none.lib"
+    key = cache.evaluation_key(work, lib)
+    (work / "rtl" / "top.v").write_text("module top(input a, output b);  assign b = a;\n/* x */ endmodule\n")
+    assert cache.evaluation_key(work, lib) == key
+    (work / "rtl" / "top.v").write_text("module top(input a, output b); assign b = ~a; endmodule\n")
+    assert cache.evaluation_key(work, lib) != key
+
+def test_miss_then_hit_restores_reports(cache_dir, work, tmp_path):
+    assert cache.get("ab" * 32, work) is None
+    (work / "synth" / "netlist.v").write_text("netlist")
+    cache.put("ab" * 32, work, {"yos_stat": {"cell_count": 3}})
+    other = tmp_path / "other"
+    hit = cache.get("ab" * 32, other)
+    assert hit["yos_stat"] == {"cell_count": 3}
+    assert (other / "synth" / "netlist.v").read_text() == "netlist"
+    assert cache.get("cd" * 32, other) is None
+
+@pytest.mark.parametrize("rc", [-9, 127])
+def test_transient_results_not_cached(cache_dir, work, tmp_path, monkeypatch, rc):
+    runs = []
+    async def run_dag(stages):
+        runs.append(1)
+        return {"sim": {"pass": False, "rc": rc, "log": "timed out", "vcd": None},
+                "aborted_by": "sim", "stage_s": {}}
+    monkeypatch.setattr(evaluate, "run_dag", run_dag)
+    for _ in range(2):
+        res = asyncio.run(evaluate.run_eda(work, 100.0, tmp_path / "none.lib", stop_on_sim_fail=True))
+        assert res["cached"] is False
+    assert len(runs) == 2
+    assert not list(cache_dir.glob("??/*/result.json"))
+
+def test_failed_simulation_verdict_cached(cache_dir, work, tmp_path, monkeypatch):
+    runs = []
+    async def run_dag(stages):
+        runs.append(1)
+        return {"sim": {"pass": False, "rc": 1, "log": "assert", "vcd": None},
+                "aborted_by": "sim", "stage_s": {}}
+    monkeypatch.setattr(evaluate, "run_dag", run_dag)
+    first = asyncio.run(evaluate.run_eda(work, 100.0, tmp_path / "none.lib", stop_on_sim_fail=True))
+    second = asyncio.run(evaluate.run_eda(work, 100.0, tmp_path / "none.lib", stop_on_sim_fail=True))
+    assert (first["cached"], second["cached"], len(runs)) == (False, True, 1)
+    assert second["sim"]["pass"] is False
+
+def test_eviction_is_lru_and_removes_locks(cache_dir, work, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_MAX_MB", 1)
+    (work / "synth" / "netlist.v").write_bytes(b"x" * 300_000)
+    keys = [f"{i:02x}" * 32 for i in range(6)]
+    async def fill():
+        for k in keys:
+            async with cache.claim(k):
+                cache.put(k, work, {"k": k})
+    asyncio.run(fill())
+    left = sorted(p.parent.name for p in cache_dir.glob("??/*/result.json"))
+    assert left == keys[-(len(left)):] and 0 < len(left) < len(keys)
+    assert sorted(p.stem for p in cache_dir.glob("??/*.lock")) == left
+    assert cache._total <= cache.CACHE_MAX_MB * 1024 * 1024
@@ -0,0 +1,54 @@
+import pytest
+
+from pareto import ParetoFront, parse_weights
+
+def m(fmax, area, dyn=1.0, leak=0.1, **kw):
+    return {"fmax_mhz": fmax, "area_ge": area, "dyn_power_mw": dyn, "leak_power_mw": leak, **kw}
+
+def test_dominance():
+    f = ParetoFront({})
+    assert f.add(m(100, 1000))
+    assert not f.add(m(90, 1100))          # worse on both
+    assert not f.add(m(100, 1000))         # identical
+    assert f.add(m(120, 1200))             # trade-off: faster but larger
+    assert f.add(m(130, 900))              # dominates both members
+    assert [e["metrics"]["fmax_mhz"] for e in f.entries] == [130]
+    assert not f.add(m(200, 100, functional_pass=False))
+    assert (f.offered, f.rejected) == (6, 3)
+
+def test_ranking_is_relative_to_baseline():
+    # +10% fmax vs -10% area are equal under equal weights when scaled by the baseline,
+    # whatever the units; the power terms break no ties here
+    base = m(100, 10000)
+    f = ParetoFront({}, {"fmax": 1, "area": 1, "power": 0}, baseline=base)
+    f.add(m(110, 10500))   # +10% fmax, +5% area
+    f.add(m(100, 9000))    # -10% area
+    assert f.select()["metrics"]["area_ge"] == 9000
+    g = ParetoFront({}, {"fmax": 3, "area": 1, "power": 0}, baseline=base)
+    g.add(m(110, 10500))
+    g.add(m(100, 9000))
+    assert g.select()["metrics"]["fmax_mhz"] == 110
+
+def test_targets_rank_before_weights():
+    f = ParetoFront({"frequency_mhz": 150}, {"fmax": 0, "area": 1, "power": 0}, baseline=m(100, 1000))
+    f.add(m(140, 500))
+    f.add(m(160, 2000))    # only point meeting the target
+    f.add(m(145, 700))
+    assert f.select()["metrics"]["fmax_mhz"] == 160
+    points = f.summary()["points"]
+    assert [p["fmax_mhz"] for p in points] == [160, 145, 140]
+    assert [p["meets_targets"] for p in points] == [True, False, False]
+    assert [p["selected"] for p in points] == [True, False, False]
+
+def test_state_round_trip():
+    f = ParetoFront({})
+    f.add(m(100, 1000), iteration=1)
+    f.add(m(120, 1200), iteration=2)
+    g = ParetoFront({})
+    g.load_state(f.state())
+    assert not g.add(m(110, 1300))
+    assert g.add(m(130, 1000))
+    assert len(g) == 1 and g.offered == 4
+
+def test_parse_weights_aliases():
+    assert parse_weights({"power": 2, "timing": -1, "bogus": 5}).tolist() == pytest.approx([0.0, 1.0, 2.0, 2.0])
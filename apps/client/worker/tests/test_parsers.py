@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+
+from parsers import critical_paths, iter_report_checks, timing_summary
+
+# report_checks -path full -fields {slew cap input_pins nets fanout} -digits 3 layout
+CHECKS = Path(__file__).parent / "data" / "sta_checks.txt"
+
+def test_iter_report_checks():
+    paths = list(iter_report_checks(CHECKS))
+    assert [(p["startpoint"], p["endpoint"], p["slack_ns"], p["met"]) for p in paths] == [
+        ("_10_", "_11_", -0.168, False), ("en", "_12_", 0.23, True), ("_12_", "_13_", 0.1, True)]
+    worst = paths[0]
+    assert (worst["group"], worst["type"], worst["arrival_ns"], worst["required_ns"]) == ("clk", "max", 0.548, 0.38)
+    kinds = [(s["kind"], s["pin"]) for s in worst["stages"]]
+    assert kinds == [("clock", None), ("wire", "_10_/CLK"), ("clkq", "_10_/Q"),
+                     ("wire", "_20_/A"), ("comb", "_20_/Y"), ("wire", "_21_/B"), ("comb", "_21_/Y"),
+                     ("wire", "_11_/D"), ("setup", None)]
+    q = worst["stages"][2]
+    assert (q["cell"], q["edge"], q["delay_ns"], q["slew_ns"], q["net"], q["fanout"], q["cap"]) == \
+        ("sky130_fd_sc_hd__dfxtp_1", "v", 0.312, 0.045, "count[0]", 2, 0.004)
+    assert paths[1]["stages"][1] == {"pin": None, "cell": None, "edge": "^", "kind": "input",
+                                     "delay_ns": 0.1, "time_ns": 0.1}
+
+def test_critical_paths_keeps_worst_k():
+    cp = critical_paths(CHECKS, k=2)
+    assert cp["paths_seen"] == 3
+    assert [p["slack_ns"] for p in cp["paths"]] == [-0.168, 0.1]
+    assert cp["paths"][0]["depth"] == 3
+    assert cp["breakdown"] == [{"stage": "clkq", "ns": 0.312}, {"stage": "comb", "ns": 0.235},
+                               {"stage": "wire", "ns": 0.001}, {"stage": "setup", "ns": 0.12}]
+    assert [c["instance"] for c in cp["bottlenecks"]] == ["_10_", "_12_", "_21_", "_20_"]
+
+def test_timing_summary():
+    s = timing_summary(critical_paths(CHECKS))
+    assert s["worst_slack_ns"] == -0.168
+    assert s["worst_path"] == "_10_ -> _11_"
+    assert (s["logic_depth"], s["violating_paths"]) == (3, 1)
+    assert [p["endpoint"] for p in s["paths"]] == ["_11_", "_13_", "_12_"]
+    assert timing_summary(critical_paths(CHECKS.with_name("missing.txt"))) is None
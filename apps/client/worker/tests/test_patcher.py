@@ -0,0 +1,90 @@
+import difflib
+
+import pytest
+
+import patcher
+from patcher import apply_hunks, apply_patches, parse_unified_diff, PatchError
+
+SRC = "".join(f"line {i}\n" for i in range(1, 31))
+
+def diff(before: str, after: str, path: str = "rtl/top.v") -> str:
+    return "".join(difflib.unified_diff(before.splitlines(True), after.splitlines(True),
+                                        f"a/{path}", f"b/{path}"))
+
+def hunks(text: str):
+    return parse_unified_diff(text)[0]["hunks"]
+
+def test_exact_hunk():
+    after = SRC.replace("line 10\n", "line ten\n")
+    text, conf, log = apply_hunks(SRC, hunks(diff(SRC, after)))
+    assert text == after
+    assert conf == 1.0 and log == []
+
+def test_offset_hunk():
+    after = SRC.replace("line 20\n", "line twenty\n")
+    shifted = "extra\n" * 5 + SRC
+    text, conf, log = apply_hunks(shifted, hunks(diff(SRC, after)))
+    assert text == "extra\n" * 5 + after
+    assert conf == pytest.approx(1.0 - patcher.OFFSET_PENALTY)
+    assert "offset 5 lines" in log[0]
+
+def test_fuzz_ignores_stale_outer_context():
+    after = SRC.replace("line 15\n", "line fifteen\n")
+    d = diff(SRC, after).replace(" line 12\n", " line twelve\n")   # outermost context is stale
+    text, conf, log = apply_hunks(SRC, hunks(d))
+    assert text == after
+    assert conf == pytest.approx(1.0 - patcher.FUZZ_PENALTY)
+    assert "fuzz 1" in log[0]
+
+def test_reindented_context():
+    src = "module top;\n  wire a;\n  wire b;\n  assign a = b;\nendmodule\n"
+    d = ("--- a/rtl/top.v\n+++ b/rtl/top.v\n@@ -1,5 +1,5 @@\n module top;\n"
+         "     wire a;\n     wire b;\n-    assign a = b;\n+  assign a = ~b;\n endmodule\n")
+    text, conf, log = apply_hunks(src, hunks(d))
+    assert text == "module top;\n  wire a;\n  wire b;\n  assign a = ~b;\nendmodule\n"
+    assert conf == pytest.approx(1.0 - patcher.WHITESPACE_PENALTY)
+    assert "ignoring whitespace" in log[0]
+
+def test_already_applied():
+    after = SRC.replace("line 10\n", "line ten\n")
+    with pytest.raises(PatchError, match="already applied"):
+        apply_hunks(after, hunks(diff(SRC, after)))
+
+def test_blank_lines_between_headers():
+    after = SRC + "// tail\n"
+    d = "\n".join(difflib.unified_diff(SRC.splitlines(), after.splitlines(), "a/rtl/top.v", "b/rtl/top.v"))
+    assert "\n\n+++ " in d and "@@\n\n" in d
+    text, conf, _ = apply_hunks(SRC, hunks(d))
+    assert text == after and conf == 1.0
+
+def test_multi_file_all_or_nothing(tmp_path):
+    (tmp_path / "rtl").mkdir()
+    (tmp_path / "rtl" / "a.v").write_text(SRC)
+    (tmp_path / "rtl" / "b.v").write_text(SRC)
+    good = diff(SRC, SRC.replace("line 3\n", "line three\n"), "rtl/a.v")
+    bad = diff("other\n" * 3, "changed\n" * 3, "rtl/b.v")
+    res = apply_patches(tmp_path, [{"path": "rtl/a.v", "unified_diff": good},
+                                   {"path": "rtl/b.v", "unified_diff": bad}])
+    assert not res["ok"] and "does not match" in res["log"]
+    assert (tmp_path / "rtl" / "a.v").read_text() == SRC
+    assert (tmp_path / "rtl" / "b.v").read_text() == SRC
+    assert not list(tmp_path.rglob("*.patch-tmp"))
+
+    res = apply_patches(tmp_path, [{"path": "rtl/a.v", "unified_diff": good + diff(SRC, SRC + "x\n", "rtl/b.v")}])
+    assert res["ok"] and sorted(res["files"]) == ["rtl/a.v", "rtl/b.v"]
+    assert "line three" in (tmp_path / "rtl" / "a.v").read_text()
+    assert (tmp_path / "rtl" / "b.v").read_text().endswith("x\n")
+
+def test_low_confidence_rejected(tmp_path):
+    (tmp_path / "top.v").write_text(SRC)
+    after = SRC.replace("line 15\n", "line fifteen\n")
+    d = diff(SRC, after, "top.v").replace(" line 12\n", " line twelve\n")
+    res = apply_patches(tmp_path, [{"path": "top.v", "unified_diff": d}], min_confidence=0.9)
+    assert not res["ok"] and "confidence" in res["log"]
+    assert (tmp_path / "top.v").read_text() == SRC
+
+def test_full_file_replacement(tmp_path):
+    res = apply_patches(tmp_path, [{"path": "rtl/top.v",
+                                    "unified_diff": "```verilog\nmodule top; endmodule\n```"}])
+    assert res["ok"]
+    assert (tmp_path / "rtl" / "top.v").read_text() == "module top; endmodule\n"
@@ -0,0 +1,53 @@
+import asyncio
+
+import scheduler
+from scheduler import budgets, promote_count, successive_halving
+
+def run(cands, b, screen_results, stats=None):
+    """cands: [(name, prepared_ok)]; screen_results: name -> proxy. Returns {name: result}."""
+    full_runs = []
+    async def prepared(name, ok):
+        return {"name": name}, ({"ok": True, "name": name} if ok else {"ok": False, "reason": "patch failed"})
+    async def screen(prep):
+        return screen_results[prep["name"]]
+    async def full(prep):
+        full_runs.append(prep["name"])
+        return {"ok": True, "metrics": {}}
+    async def go():
+        return {c["name"]: r async for c, r in successive_halving(
+            [({"name": n}, prepared(n, ok)) for n, ok in cands], screen, full,
+            cost=lambda proxy: proxy["cells"], b=b, stats=stats)}
+    return asyncio.run(go()), full_runs
+
+def test_promotes_cheapest_fraction():
+    b = budgets({"budgets": {"promote_ratio": 0.5}}, parallel=4)
+    proxies = {n: {"ok": True, "cells": c} for n, c in zip("abcdef", (50, 10, 40, 20, 30, 60))}
+    proxies["f"] = {"ok": False, "reason": "screen failed"}
+    stats = {}
+    res, full_runs = run([(n, True) for n in "abcdef"] + [("g", False)], b, proxies, stats)
+    assert sorted(full_runs) == ["b", "d", "e"]          # ceil(0.5 * 5 screened)
+    assert res["a"]["reason"] == res["c"]["reason"] == "not promoted"
+    assert res["f"]["reason"] == "screen failed"
+    assert res["g"]["reason"] == "patch failed"
+    assert res["b"]["ok"] and res["b"]["screen"]["cells"] == 10
+    assert stats == {"screen_failed": 1, "screened": 5, "promoted": 3}
+
+def test_promotion_capped_by_parallelism():
+    b = budgets({"budgets": {"promote_ratio": 1.0}}, parallel=2)
+    assert b["candidates"] == 4
+    assert promote_count(4, b) == 2
+    assert promote_count(0, b) == 0
+    assert promote_count(1, {**b, "promote_ratio": 0.0}) == 1
+
+def test_screening_disabled_runs_everything():
+    b = budgets({"budgets": {"screening": False}}, parallel=3)
+    res, full_runs = run([(n, True) for n in "abc"], b, {})
+    assert sorted(full_runs) == ["a", "b", "c"] and b["candidates"] == 3
+    assert all(r["ok"] and "screen" not in r for r in res.values())
+
+def test_screen_cost_relative_to_baseline():
+    w = [1.0, 1.0, 0.5, 0.5]
+    base = {"depth": 10, "cells": 100}
+    assert scheduler.screen_cost({"depth": 10, "cells": 100}, base, w) == 3.0
+    assert scheduler.screen_cost({"depth": 5, "cells": 100}, base, w) == 2.5
+    assert scheduler.screen_cost({"depth": 10, "cells": 100, "lint_problems": 2}, base, w) == 5.0
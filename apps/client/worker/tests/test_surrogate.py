@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import surrogate
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    path = tmp_path / "history.jsonl"
+    monkeypatch.setattr(surrogate, "SURROGATE_HISTORY", path)
+    monkeypatch.setattr(surrogate, "SURROGATE_MIN_ROWS", 10)
+    monkeypatch.setattr(surrogate, "_model", None)
+    return path
+
+DESIGN = surrogate.design_features("module top; assign y = a * b; endmodule\n", {"fmax_mhz": 100, "gate_count": 50})
+
+def seed(path, n=40):
+    """pipeline gains fmax in proportion to its depth; resize always fails"""
+    rows = []
+    for i in range(n):
+        depth = 1 + i % 4
+        cand = {"transform": "pipeline", "params": {"depth": depth}}
+        rows.append({"x": surrogate.features(DESIGN, cand),
+                     "outcome": {"ok": True, "deltas": {"fmax": 0.05 * depth, "area": 0.01 * depth,
+                                                        "dyn_power": 0.0, "leak_power": 0.0}}})
+        bad = {"transform": "resize", "params": {"depth": depth}}
+        rows.append({"x": surrogate.features(DESIGN, bad), "outcome": {"ok": False, "reason": "sim failed"}})
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows))
+
+def test_model_learns_and_ranks(history):
+    seed(history)
+    m = surrogate.model()
+    assert m.trusted
+    deep = m.predict(surrogate.features(DESIGN, {"transform": "pipeline", "params": {"depth": 4}}))
+    shallow = m.predict(surrogate.features(DESIGN, {"transform": "pipeline", "params": {"depth": 1}}))
+    assert deep["deltas"]["fmax"] > shallow["deltas"]["fmax"]
+    assert m.predict(surrogate.features(DESIGN, {"transform": "resize", "params": {"depth": 2}}))["p_fail"] > 0.8
+
+    s = surrogate.Session(np.array([1.0, 0.1, 0.0, 0.0]))
+    cands = [{"transform": "resize", "params": {"depth": 2}},
+             {"transform": "pipeline", "params": {"depth": 1}},
+             {"transform": "pipeline", "params": {"depth": 4}}]
+    ranked = asyncio.run(s.rank(cands, DESIGN, keep=3))
+    assert ranked == [cands[2], cands[1]]          # best first, likely failure pruned
+    assert (s.ranked, s.pruned) == (3, 1)
+
+def test_records_only_eda_verdicts(history):
+    s = surrogate.Session(np.ones(4))
+    cand = {"transform": "pipeline", "params": {"depth": 2}}
+    before = {"fmax_mhz": 100.0, "area_ge": 1000.0}
+    s.record(DESIGN, before, cand, {"ok": False, "reason": "patch failed"})
+    s.record(DESIGN, before, cand, {"ok": False, "reason": "sim failed", "transient": True})
+    s.record(DESIGN, before, cand, {"ok": False, "reason": "screen failed"})
+    s.record(DESIGN, before, dict(cand), {"ok": True, "metrics": {"fmax_mhz": 110.0, "area_ge": 1000.0}})
+    asyncio.run(s.flush())
+    rows = [json.loads(line) for line in history.read_text().splitlines()]
+    assert [r["outcome"]["ok"] for r in rows] == [False, True]
+    assert rows[1]["outcome"]["deltas"]["fmax"] == pytest.approx(0.1)
+
+def test_session_keeps_its_model(history):
+    seed(history)
+    s = surrogate.Session(np.ones(4))
+    cand = {"transform": "pipeline", "params": {"depth": 3}}
+    asyncio.run(s.rank([cand], DESIGN, keep=1))
+    fitted = s.model
+    s.record(DESIGN, {"fmax_mhz": 100.0}, {**cand}, {"ok": True, "metrics": {"fmax_mhz": 115.0}})
+    asyncio.run(s.flush())
+    asyncio.run(s.rank([cand], DESIGN, keep=1))
+    assert s.model is fitted
+    assert json.loads(history.read_text().splitlines()[-1])["predicted"] is not None
@@ -0,0 +1,100 @@
+import random
+from pathlib import Path
+
+import pytest
+
+import vcd
+
+def _ident(i: int) -> str:
+    s = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 94)
+        s += chr(33 + r)
+    return s
+
+def write_vcd(path: Path, widths, steps: int, seed: int = 7) -> Path:
+    """clk plus signals of the given widths, each changing at random (x/z included)."""
+    rnd = random.Random(seed)
+    ids = [_ident(i) for i in range(len(widths) + 1)]
+    out = ["$timescale 1ns $end", "$scope module tb $end", f"$var wire 1 {ids[0]} clk $end"]
+    out += [f"$var wire {w} {ids[i + 1]} s{i} $end" for i, w in enumerate(widths)]
+    out += ["$upscope $end", "$enddefinitions $end", "#0", "$dumpvars", f"0{ids[0]}"]
+    out += [f"0{ids[i + 1]}" if w == 1 else f"b0 {ids[i + 1]}" for i, w in enumerate(widths)]
+    out.append("$end")
+    for t in range(1, steps + 1):
+        out += [f"#{t * 5}", f"{t % 2}{ids[0]}"]
+        for i, w in enumerate(widths):
+            if rnd.random() < 0.4:
+                continue
+            if w == 1:
+                out.append(f"{rnd.choice('01xz')}{ids[i + 1]}")
+            else:
+                bits = format(rnd.getrandbits(w), "b")   # VCD drops leading zeros
+                if rnd.random() < 0.1:
+                    bits = "x" + bits[1:]
+                out.append(f"b{bits} {ids[i + 1]}")
+    path.write_text("\n".join(out) + "\n")
+    return path
+
+def reference_toggles(path: Path) -> dict:
+    """Line-by-line parser with arbitrary-precision values: bits that changed between
+    consecutive values of each signal (x/z read as 0; the first value counts nothing)."""
+    names, last, toggles = {}, {}, {}
+    body = False
+    for line in path.read_text().splitlines():
+        parts = line.split()
+        if not body:
+            if parts[:1] == ["$var"]:
+                names[parts[3]] = "tb." + parts[4]
+            body = parts[:1] == ["$enddefinitions"]
+            continue
+        if not line or line[0] in "#$":
+            continue
+        if line[0] in "bB":
+            bits, ident = line[1:].split()
+        else:
+            bits, ident = line[0], line[1:]
+        value = int("".join("1" if c == "1" else "0" for c in bits), 2)
+        name = names[ident]
+        if name in last:
+            toggles[name] = toggles.get(name, 0) + bin(value ^ last[name]).count("1")
+        last[name] = value
+    return toggles
+
+@pytest.mark.parametrize("chunk_mb", [8, 0])   # 0: one line per slice
+def test_matches_reference_parser(tmp_path, monkeypatch, chunk_mb):
+    monkeypatch.setattr(vcd, "VCD_CHUNK_MB", chunk_mb)
+    widths = [1, 1, 4, 8, 64, 65, 100, 130]
+    path = write_vcd(tmp_path / "t.vcd", widths, steps=150)
+    ref = reference_toggles(path)
+
+    act = vcd.activity(path)
+    top = {t["signal"]: t["toggles"] for t in act["top"]}
+    assert act["clock"] == "tb.clk"
+    assert {k: v for k, v in top.items() if k != "tb.clk"} == {k: v for k, v in ref.items() if k != "tb.clk" and v}
+    assert act["toggles"] == sum(v for k, v in ref.items() if k != "tb.clk")
+    assert act["cycles"] == ref["tb.clk"] / 2
+    assert act["bits"] == sum(widths)
+    assert sum(w["toggles"] for w in act["windows"]) == act["toggles"]
+    assert sum(w["clock_toggles"] for w in act["windows"]) == ref["tb.clk"]
+
+def test_wide_vector_high_bits(tmp_path):
+    # Only bit 99 of a 100-bit bus toggles: invisible in the low 64 bits
+    path = tmp_path / "w.vcd"
+    path.write_text("$timescale 1ns $end\n$scope module tb $end\n$var wire 1 ! clk $end\n"
+                    "$var wire 100 \" bus $end\n$upscope $end\n$enddefinitions $end\n"
+                    "#0\n0!\nb0 \"\n#5\n1!\nb1" + "0" * 99 + " \"\n#10\n0!\nb0 \"\n")
+    act = vcd.activity(path)
+    assert act["top"] == [{"signal": "tb.clk", "toggles": 2}, {"signal": "tb.bus", "toggles": 2}] \
+        or act["top"] == [{"signal": "tb.bus", "toggles": 2}, {"signal": "tb.clk", "toggles": 2}]
+    assert act["toggles"] == 2
+
+def test_saif(tmp_path):
+    path = tmp_path / "t.saif"
+    path.write_text("(SAIFILE (TIMESCALE 1 ns) (DURATION 100)\n (INSTANCE tb\n (NET\n"
+                    "  (clk (T0 50) (T1 50) (TX 0) (TC 20))\n  (a (T0 90) (T1 10) (TX 0) (TC 4))\n"
+                    "  (b (T0 60) (T1 40) (TX 0) (TC 6))\n )))\n")
+    act = vcd.activity(path)
+    assert (act["format"], act["clock"], act["cycles"], act["toggles"]) == ("saif", "clk", 10, 10)
+    assert act["activity"] == pytest.approx(10 / (2 * 10))
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import os, sys, json, time, uuid, asyncio, hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Iterator
+
+# Lightweight span tracing for the workers. A job's trace id comes from the API (the
+# claimed job's "trace_id") and is forwarded to the orchestrator and callbacks in a W3C
+# `traceparent` header. Finished spans are kept per trace until export(), which appends
+# them to TRACE_FILE as JSON lines and/or POSTs them to TRACE_COLLECTOR_URL.
+# `python tracing.py spans.jsonl > trace.json` converts a span file to the Chrome trace
+# format (chrome://tracing, Perfetto, speedscope) for flame charts.
+TRACING             = os.getenv("TRACING", "1") == "1"
+TRACE_FILE          = os.getenv("TRACE_FILE", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+
+
+_current: ContextVar["Span | None"] = ContextVar("trace_span", default=None)
+_finished: Dict[str, List[Dict[str, Any]]] = {}
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        task = asyncio.current_task() if _in_loop() else None
+        _finished.setdefault(self.trace_id, []).append({
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "start_us": int(self.start * 1e6),
+            "dur_us": int((time.perf_counter() - self._t0) * 1e6),
+            "pid": os.getpid(), "task": task.get_name() if task else "main",
+            "attrs": self.attrs,
+        })
+
+def _in_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def trace_id_for(job_id: str) -> str:
+    """Stable trace id for a job when the API didn't hand one out."""
+    try:
+        return uuid.UUID(str(job_id)).hex
+    except ValueError:
+        return hashlib.sha256(str(job_id).encode()).hexdigest()[:32]
+
+def current_trace_id() -> str | None:
+    sp = _current.get()
+    return sp.trace_id if sp else None
+
+@contextmanager
+def trace(name: str, trace_id: str | None = None, **attrs) -> Iterator[Span | None]:
+    """Root span of a trace (one per job). Spans opened inside, including in tasks and
+    threads started from here, become its descendants."""
+    if not TRACING:
+        yield None
+        return
+    sp = Span(name, trace_id or uuid.uuid4().hex, None, attrs)
+    token = _current.set(sp)
+    try:
+        yield sp
+    finally:
+        _current.reset(token)
+        sp.finish()
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span | None]:
+    """Child span of the current span; a no-op outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    sp = Span(name, parent.trace_id, parent.span_id, attrs)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=type(e).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        sp.finish()
+
+def add_span(name: str, trace_id: str, start: float, dur_s: float, **attrs):
+    """Record a span measured before its trace existed (e.g. the claim that fetched the job)."""
+    if not TRACING:
+        return
+    _finished.setdefault(trace_id, []).append({
+        "trace_id": trace_id, "span_id": uuid.uuid4().hex[:16], "parent_id": None,
+        "name": name, "start_us": int(start * 1e6), "dur_us": int(dur_s * 1e6),
+        "pid": os.getpid(), "task": "main", "attrs": attrs,
+    })
+
+def headers() -> Dict[str, str]:
+    sp = _current.get()
+    return {"traceparent": f"00-{sp.trace_id}-{sp.span_id}-01"} if sp else {}
+
+def summary(trace_id: str | None) -> Dict[str, Any]:
+    """Per-stage timing summary of the spans finished so far:
+    {"trace_id", "stages": {name: {"count", "total_s", "max_s"}}}."""
+    stages: Dict[str, Dict[str, Any]] = {}
+    for s in _finished.get(trace_id or "", []):
+        st = stages.setdefault(s["name"], {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        d = s["dur_us"] / 1e6
+        st["count"] += 1
+        st["total_s"] = round(st["total_s"] + d, 4)
+        st["max_s"] = round(max(st["max_s"], d), 4)
+    return {"trace_id": trace_id, "stages": stages}
+
+async def export(trace_id: str | None, client=None) -> List[Dict[str, Any]]:
+    """Flush a trace's spans to TRACE_FILE / TRACE_COLLECTOR_URL (best effort)."""
+    spans = _finished.pop(trace_id or "", [])
+    if not spans:
+        return spans
+    if TRACE_FILE:
+        text = "".join(json.dumps(s) + "\n" for s in spans)
+        try:
+            await asyncio.to_thread(_append, TRACE_FILE, text)
+        except OSError as e:
+            print(f"trace export to {TRACE_FILE} failed: {e}")
+    if TRACE_COLLECTOR_URL and client is not None:
+        try:
+            await client.post(TRACE_COLLECTOR_URL, json={"spans": spans}, timeout=10)
+        except Exception as e:
+            print(f"trace export to collector failed: {e}")
+    return spans
+
+def _append(path: str, text: str):
+    with open(path, "a") as f:
+        f.write(text)
+
+def to_chrome(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Chrome trace-event JSON; concurrent asyncio tasks get their own lanes."""
+    events = []
+    for s in spans:
+        events.append({
+            "name": s["name"], "ph": "X", "ts": s["start_us"], "dur": s["dur_us"],
+            "pid": s["trace_id"][:8], "tid": s.get("task", "main"),
+            "args": {**s.get("attrs", {}), "span_id": s["span_id"], "parent_id": s["parent_id"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python tracing.py spans.jsonl > trace.json")
+    with open(sys.argv[1]) as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    json.dump(to_chrome(spans), sys.stdout)
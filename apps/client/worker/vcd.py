@@ -0,0 +1,335 @@
+from __future__ import annotations
+import os, re, mmap
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+# Switching activity from simulation dumps, for the power estimate in parsers.py.
+# VCDs are memory-mapped and scanned once in VCD_CHUNK_MB slices; each slice is split
+# into lines and decoded with NumPy (timestamps, scalar and vector value changes, id
+# codes), and toggles are accumulated per signal and per time window. Memory stays
+# constant: per-signal state plus ACTIVITY_WINDOWS buckets, whose width doubles (and
+# neighbours merge) whenever the trace runs past the last bucket.
+# Assumes one value change per line, as written by Icarus, Verilator and cocotb.
+# Vector values are decoded to their low 64 bits; the bits above that, of signals
+# declared wider than 64, are compared per change in Python (wide buses are rare).
+# SAIF (TC counts per net) is accepted as a smaller input and yields totals without a
+# time series.
+VCD_CHUNK_MB     = int(os.getenv("VCD_CHUNK_MB", "8"))
+ACTIVITY_WINDOWS = int(os.getenv("ACTIVITY_WINDOWS", "64"))  # even
+
+MAX_ID_CHARS = 8      # id codes up to 8 chars fit an int64 in base 95
+MAX_TS_DIGITS = 19
+CLOCK_NAMES = ("clk", "clock", "clk_i", "i_clk", "clk_in", "aclk")
+
+_DECL_RE = re.compile(rb"\$(scope|upscope|var|timescale|enddefinitions)\b(.*?)\$end", re.S)
+_TIMESCALE_RE = re.compile(r"(\d+)\s*(s|ms|us|ns|ps|fs)")
+_SCALAR = np.zeros(256, dtype=bool)
+_SCALAR[list(b"01xzXZ")] = True
+_UNITS = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9, "ps": 1e-12, "fs": 1e-15}
+_BITS = bytes(49 if c == 49 else 48 for c in range(256))   # x/z/anything else -> 0
+
+def _id_code(ident: bytes) -> int:
+    code = 0
+    for c in reversed(ident):
+        code = code * 95 + (c - 32)
+    return code
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.int64)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+    return table[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def _gather_int(buf: np.ndarray, start: np.ndarray, length: np.ndarray, max_len: int,
+                base: int, digit) -> np.ndarray:
+    """Vectorised parse of fixed-base numbers at buf[start:start+length]; only the last
+    `max_len` characters of longer fields are used."""
+    skip = np.maximum(length - max_len, 0)
+    start, length = start + skip, length - skip
+    out = np.zeros(len(start), dtype=np.uint64)
+    last = len(buf) - 1
+    for k in range(max_len):
+        live = k < length
+        if not live.any():
+            break
+        d = digit(buf[np.minimum(start + k, last)]).astype(np.uint64)
+        out = np.where(live, out * np.uint64(base) + d, out)
+    return out
+
+class _Signals:
+    def __init__(self, names: Dict[int, str], widths: Dict[int, int]):
+        self.codes = np.array(sorted(names), dtype=np.int64)
+        self.names = [names[c] for c in self.codes.tolist()]
+        self.widths = np.array([widths[c] for c in self.codes.tolist()], dtype=np.int64)
+        n = len(self.codes)
+        self.last = np.zeros(n, dtype=np.uint64)
+        self.seen = np.zeros(n, dtype=bool)
+        self.toggles = np.zeros(n, dtype=np.int64)
+        self.high: Dict[int, int] = {}   # bits above the low 64 of wide signals, by index
+        self.clock = next((i for i in range(n) if self.widths[i] == 1 and
+                           self.names[i].rsplit(".", 1)[-1].lower() in CLOCK_NAMES), None)
+
+    def index(self, codes: np.ndarray) -> np.ndarray:
+        """Signal index per code, -1 for codes not declared in the header."""
+        if not len(self.codes):
+            return np.full(len(codes), -1)
+        i = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        return np.where(self.codes[i] == codes, i, -1)
+
+def _parse_header(mm: mmap.mmap) -> Tuple[_Signals, float, int]:
+    names: Dict[int, str] = {}
+    widths: Dict[int, int] = {}
+    scope: List[str] = []
+    timescale = 1e-9
+    end = 0
+    for m in _DECL_RE.finditer(mm):
+        kind, body = m.group(1), m.group(2).split()
+        end = m.end()
+        if kind == b"scope" and len(body) >= 2:
+            scope.append(body[1].decode(errors="replace"))
+        elif kind == b"upscope" and scope:
+            scope.pop()
+        elif kind == b"var" and len(body) >= 4 and len(body[2]) <= MAX_ID_CHARS:
+            code = _id_code(body[2])
+            if code not in names:  # aliases share an id code; count the net once
+                names[code] = ".".join(scope + [body[3].decode(errors="replace")])
+                widths[code] = max(1, int(body[1]))
+        elif kind == b"timescale":
+            tm = _TIMESCALE_RE.search(b"".join(body).decode())
+            if tm:
+                timescale = int(tm.group(1)) * _UNITS[tm.group(2)]
+        elif kind == b"enddefinitions":
+            break
+    return _Signals(names, widths), timescale, end
+
+class _Windows:
+    """ACTIVITY_WINDOWS toggle buckets over time; widths double as the trace grows."""
+    def __init__(self, n: int = ACTIVITY_WINDOWS):
+        self.n = max(2, n + n % 2)
+        self.width = 1
+        self.data = np.zeros(self.n, dtype=np.int64)
+        self.clock = np.zeros(self.n, dtype=np.int64)
+
+    def add(self, t: np.ndarray, data: np.ndarray, clock: np.ndarray):
+        if not len(t):
+            return
+        while int(t.max()) >= self.n * self.width:
+            half = self.n // 2
+            for acc in (self.data, self.clock):
+                acc[:half] = acc.reshape(half, 2).sum(axis=1)
+                acc[half:] = 0
+            self.width *= 2
+        b = (t // self.width).astype(np.int64)
+        self.data += np.bincount(b, weights=data, minlength=self.n).astype(np.int64)
+        self.clock += np.bincount(b, weights=clock, minlength=self.n).astype(np.int64)
+
+def _clock_index(sig: _Signals) -> int | None:
+    """The clock by name, else the busiest 1-bit signal."""
+    if sig.clock is not None:
+        return sig.clock
+    one_bit = np.flatnonzero(sig.widths == 1)
+    return int(one_bit[np.argmax(sig.toggles[one_bit])]) if len(one_bit) else None
+
+def _scan_chunk(buf: np.ndarray, sig: _Signals, win: _Windows, t_carry: int) -> int:
+    """Accumulate one slice of whole lines; returns the last timestamp seen."""
+    nl = np.flatnonzero(buf == 10)
+    if not len(nl) or nl[-1] != len(buf) - 1:
+        nl = np.append(nl, len(buf))
+    starts = np.concatenate(([0], nl[:-1] + 1))
+    ends = nl.copy()
+    cr = (ends > starts) & (buf[np.maximum(ends - 1, 0)] == 13)
+    ends[cr] -= 1
+    lens = ends - starts
+    keep = lens > 0
+    starts, ends, lens = starts[keep], ends[keep], lens[keep]
+    first = buf[starts]
+
+    # Timestamps, and the timestamp in force at every line
+    is_ts = first == ord("#")
+    ts_val = _gather_int(buf, starts[is_ts] + 1, lens[is_ts] - 1, MAX_TS_DIGITS, 10,
+                         lambda c: c - 48).astype(np.int64)
+    ts_pos = np.where(is_ts, np.arange(len(starts)), -1)
+    last_ts = np.maximum.accumulate(ts_pos) if len(ts_pos) else ts_pos
+    ts_of_line = np.full(len(starts), -1, dtype=np.int64)
+    ts_of_line[is_ts] = np.arange(int(is_ts.sum()))
+    line_t = np.where(last_ts >= 0, ts_val[ts_of_line[np.maximum(last_ts, 0)]] if len(ts_val) else t_carry, t_carry)
+
+    # Scalar changes: <value><id>; vector changes: b<bits> <id>
+    is_scalar = _SCALAR[first]
+    is_vector = (first == ord("b")) | (first == ord("B"))
+    spaces = np.flatnonzero(buf == 32)
+    v_starts, v_ends = starts[is_vector], ends[is_vector]
+    sp = spaces[np.minimum(np.searchsorted(spaces, v_starts), max(len(spaces) - 1, 0))] if len(spaces) else v_ends
+    ok = (sp > v_starts) & (sp < v_ends)
+    v_starts, v_ends, sp = v_starts[ok], v_ends[ok], sp[ok]
+
+    # Value changes in file order: id position/length, value and time of each
+    vec_lines = np.flatnonzero(is_vector)[ok]
+    line_sp = np.zeros(len(starts), dtype=np.int64)
+    line_sp[vec_lines] = sp
+    change = is_scalar.copy()
+    change[vec_lines] = True
+    ident, ident_len = starts + 1, lens - 1
+    ident[vec_lines], ident_len[vec_lines] = sp + 1, v_ends - sp - 1
+    values = (first == ord("1")).astype(np.uint64)
+    values[vec_lines] = _vector_values(buf, v_starts, sp)
+    lines = np.flatnonzero(change)
+    ident, ident_len, values, times = ident[change], ident_len[change], values[change], line_t[change]
+
+    fits = ident_len <= MAX_ID_CHARS
+    codes = _id_codes(buf, ident, ident_len)
+    idx = np.where(fits, sig.index(codes), -1)
+    sel = idx >= 0
+    idx, values, times, lines = idx[sel], values[sel], times[sel], lines[sel]
+
+    wide = np.flatnonzero(sig.widths[idx] > 64) if len(idx) else idx
+    if len(wide):
+        _scan_high(buf, sig, win, idx[wide], times[wide], starts[lines[wide]], line_sp[lines[wide]])
+
+    # Toggles = bits that differ from the signal's previous value (first value: none)
+    # Stable sort groups each signal's changes in file order (radix sort for <64k signals)
+    order = np.argsort(idx.astype(np.uint16) if len(sig.codes) <= 1 << 16 else idx, kind="stable")
+    s, v, t = idx[order], values[order], times[order]
+    if len(s):
+        head = np.ones(len(s), dtype=bool)
+        head[1:] = s[1:] != s[:-1]
+        prev = np.empty_like(v)
+        prev[1:] = v[:-1]
+        prev[head] = sig.last[s[head]]
+        counted = ~head | sig.seen[s]
+        tog = np.where(counted, _popcount(v ^ prev), 0)
+        tail = np.ones(len(s), dtype=bool)
+        tail[:-1] = head[1:]
+        sig.last[s[tail]] = v[tail]
+        sig.seen[s] = True
+        sig.toggles += np.bincount(s, weights=tog, minlength=len(sig.codes)).astype(np.int64)
+        is_clk = s == (sig.clock if sig.clock is not None else -1)
+        win.add(t, np.where(is_clk, 0, tog), np.where(is_clk, tog, 0))
+    return int(ts_val[-1]) if len(ts_val) else t_carry
+
+def _scan_high(buf: np.ndarray, sig: _Signals, win: _Windows, idx: np.ndarray, times: np.ndarray,
+               v_starts: np.ndarray, sp: np.ndarray):
+    """Toggles above bit 63 of wide signals' changes (in file order; sp = 0 for a
+    scalar change). The low 64 bits are counted by the vectorised pass."""
+    tog = np.zeros(len(idx), dtype=np.int64)
+    for j, (i, start, end) in enumerate(zip(idx.tolist(), v_starts.tolist(), sp.tolist())):
+        digits = buf[start + 1:max(end - 64, start + 1)].tobytes().translate(_BITS) if end else b""
+        value = int(digits, 2) if digits else 0
+        prev = sig.high.get(i)
+        if prev is not None:
+            tog[j] = bin(value ^ prev).count("1")
+        sig.high[i] = value
+    sig.toggles += np.bincount(idx, weights=tog, minlength=len(sig.codes)).astype(np.int64)
+    win.add(times, tog, np.zeros(len(tog), dtype=np.int64))
+
+def _vector_values(buf: np.ndarray, v_starts: np.ndarray, sp: np.ndarray) -> np.ndarray:
+    """Low 64 bits of each b<bits> value. Lines are grouped by digit count so each group
+    is one (lines, digits) gather, packed to bytes and right-aligned into a uint64."""
+    out = np.zeros(len(v_starts), dtype=np.uint64)
+    digits = np.minimum(sp - v_starts - 1, 64)
+    for n in np.unique(digits):
+        if n <= 0:
+            continue
+        rows = np.flatnonzero(digits == n)
+        bits = buf[(sp[rows] - n)[:, None] + np.arange(n)] == 49
+        nbytes = (int(n) + 7) // 8
+        word = np.zeros((len(rows), 8), dtype=np.uint8)
+        word[:, 8 - nbytes:] = np.packbits(bits, axis=1)
+        out[rows] = word.view(">u8").ravel() >> np.uint64(nbytes * 8 - n)
+    return out
+
+def _id_codes(buf: np.ndarray, start: np.ndarray, length: np.ndarray) -> np.ndarray:
+    """Base-95 id codes matching _id_code() (first character least significant)."""
+    out = np.zeros(len(start), dtype=np.int64)
+    mult = np.int64(1)
+    last = len(buf) - 1
+    for k in range(MAX_ID_CHARS):
+        live = k < length
+        if not live.any():
+            break
+        c = buf[np.minimum(start + k, last)].astype(np.int64) - 32
+        out += np.where(live, c * mult, 0)
+        mult *= 95
+    return out
+
+def vcd_activity(path: Path, windows: int = ACTIVITY_WINDOWS) -> Dict[str, Any]:
+    """Single streaming pass over a VCD; see activity() for the result."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sig, timescale, pos = _parse_header(mm)
+        win = _Windows(windows)
+        t_last = 0
+        chunk = VCD_CHUNK_MB << 20
+        size = len(mm)
+        while pos < size:
+            end = min(pos + chunk, size)
+            if end < size:
+                cut = mm.rfind(b"\n", pos, end)
+                end = cut + 1 if cut >= pos else (mm.find(b"\n", end) + 1 or size)
+            buf = np.frombuffer(mm, dtype=np.uint8, count=end - pos, offset=pos)
+            t_last = _scan_chunk(buf, sig, win, t_last)
+            del buf  # release the mmap export before the next slice / close
+            if hasattr(mmap, "MADV_DONTNEED"):
+                # Drop the scanned pages so resident memory stays at one slice
+                start = pos - pos % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+            pos = end
+    return _summarise(sig, win, timescale, t_last, "vcd")
+
+def _summarise(sig: _Signals, win: _Windows | None, timescale: float, t_last: int, fmt: str) -> Dict[str, Any]:
+    clk = _clock_index(sig)
+    clock_toggles = int(sig.toggles[clk]) if clk is not None else 0
+    data = np.ones(len(sig.codes), dtype=bool)
+    if clk is not None:
+        data[clk] = False
+    bits = int(sig.widths[data].sum())
+    toggles = int(sig.toggles[data].sum())
+    cycles = clock_toggles / 2
+    duration_s = t_last * timescale
+    out: Dict[str, Any] = {
+        "format": fmt, "signals": len(sig.codes), "bits": bits, "toggles": toggles,
+        "clock": sig.names[clk] if clk is not None else None, "cycles": cycles,
+        "duration_s": duration_s,
+        "clock_mhz": cycles / duration_s / 1e6 if duration_s > 0 and cycles else None,
+        "activity": toggles / (bits * cycles) if bits and cycles else None,
+        "top": [{"signal": sig.names[i], "toggles": int(sig.toggles[i])}
+                for i in np.argsort(-sig.toggles)[:10] if sig.toggles[i] > 0],
+        "window_ns": None, "windows": [],
+    }
+    if win is not None and t_last > 0:
+        used = min(win.n, t_last // win.width + 1)
+        out["window_ns"] = win.width * timescale * 1e9
+        out["windows"] = [{"t_ns": round(i * win.width * timescale * 1e9, 3),
+                           "toggles": int(win.data[i]), "clock_toggles": int(win.clock[i])}
+                          for i in range(used)]
+    return out
+
+_SAIF_DURATION_RE  = re.compile(rb"\(DURATION\s+(\d+)\)")
+_SAIF_TIMESCALE_RE = re.compile(rb"\(TIMESCALE\s+(\d+)\s*(s|ms|us|ns|ps|fs)\)")
+_SAIF_NET_RE = re.compile(rb"\(\s*([^\s()]+)\s*\(T0\s+\d+\)\s*\(T1\s+\d+\)(?:\s*\(TX\s+\d+\))?\s*\(TC\s+(\d+)\)")
+
+def saif_activity(path: Path) -> Dict[str, Any]:
+    """Toggle counts (TC) per net from a SAIF file; every net counts as one bit."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ts = _SAIF_TIMESCALE_RE.search(mm)
+        timescale = int(ts.group(1)) * _UNITS[ts.group(2).decode()] if ts else 1e-9
+        dur = _SAIF_DURATION_RE.search(mm)
+        duration = int(dur.group(1)) if dur else 0
+        del ts, dur
+        names: Dict[int, str] = {}
+        counts: List[int] = []
+        for m in _SAIF_NET_RE.finditer(mm):
+            names[len(counts)] = m.group(1).decode(errors="replace").replace("\\", "")
+            counts.append(int(m.group(2)))
+        m = None
+    sig = _Signals(names, {i: 1 for i in names})
+    sig.toggles[:] = counts
+    return _summarise(sig, None, timescale, duration, "saif")
+
+def activity(path: Path) -> Dict[str, Any]:
+    """Switching activity of a VCD or SAIF file:
+    {"format", "signals", "bits", "toggles", "clock", "cycles", "duration_s", "clock_mhz",
+     "activity" (toggles per data bit per clock cycle), "top", "window_ns",
+     "windows": [{"t_ns", "toggles", "clock_toggles"}]}."""
+    return saif_activity(path) if path.suffix.lower() == ".saif" else vcd_activity(path)
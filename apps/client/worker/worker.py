@@ -1,26 +1,46 @@
 from __future__ import annotations
-import os, time, json, difflib, tempfile, subprocess, shutil
+import os, time, json, gzip, random, socket, asyncio, hashlib, shutil
 from pathlib import Path
 from typing import Dict, Any, List
-import requests
-
-from runners import (
-    prepare_workspace, render_synth, render_sta,
-    run_verilator_pytest, run_yosys, run_opensta
-)
-from parsers import parse_yosys_stat, parse_sta_summary, timing_breakdown_from_checks, power_proxy_from_vcd
+import httpx
+
+from runners import prepare_workspace, render_synth, render_sta, EDA_CORE_BUDGET
+from evaluate import run_eda, prepare_candidate, screen_candidate, finish_candidate
+from parsers import timing_summary
+import tracing
+import workspace
+import artifacts
+import pareto
+import scheduler
+import surrogate
+import checkpoint
+import sta_session
 
 # --------- Env ----------
 NEXT_JOB_URL      = os.getenv("LOVABLE_NEXT_JOB_URL")
+NEXT_JOBS_URL     = os.getenv("LOVABLE_NEXT_JOBS_URL")  # batch claim (/next-queued-jobs); optional
 CALLBACK_URL      = os.getenv("LOVABLE_CALLBACK_URL")
+HEARTBEAT_URL     = os.getenv("LOVABLE_HEARTBEAT_URL")   # lease renewal (/heartbeat); optional
 ORCH              = os.getenv("ORCH_BASE_URL", "http://localhost:8000")
 
-POLL_INTERVAL     = int(os.getenv("POLL_INTERVAL_SEC", "3"))
+POLL_INTERVAL     = int(os.getenv("POLL_INTERVAL_SEC", "3"))     # only used if the server can't long-poll
+LONG_POLL_SEC     = float(os.getenv("LONG_POLL_SEC", "25"))      # ?wait= sent to /next-queued-job
+BACKOFF_MAX_SEC   = float(os.getenv("BACKOFF_MAX_SEC", "30"))
+WORKER_TOKEN      = os.getenv("WORKER_TOKEN", "local-worker-secret")
 DATA_ROOT         = Path(os.getenv("DATA_ROOT", "/data/jobs"))
 MAX_ITERS_DEFAULT = int(os.getenv("MAX_ITERS", "10"))
 MAX_PARALLEL      = int(os.getenv("MAX_PARALLEL", "2"))
+WORKER_SLOTS      = int(os.getenv("WORKER_SLOTS", "1"))          # jobs processed concurrently
+UTIL_REPORT_SEC   = int(os.getenv("UTIL_REPORT_SEC", "60"))
 DEFAULT_CLOCK     = os.getenv("DEFAULT_CLOCK_PORT", "clk")
 DEFAULT_FREQ_MHZ  = float(os.getenv("DEFAULT_FREQ_MHZ", "500"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+SPECULATIVE_PLANNER  = os.getenv("SPECULATIVE_PLANNER", "1") == "1"  # start next /planner call during EDA
+CALLBACK_COALESCE_SEC = float(os.getenv("CALLBACK_COALESCE_SEC", "0.5"))  # merge window for bursts
+CALLBACK_GZIP_MIN     = int(os.getenv("CALLBACK_GZIP_MIN", "2048"))        # gzip bodies from this size
+CALLBACK_MAX_RETRIES  = int(os.getenv("CALLBACK_MAX_RETRIES", "4"))
+WORKER_ID             = os.getenv("WORKER_ID") or socket.gethostname()  # lease owner
+HEARTBEAT_SEC         = float(os.getenv("HEARTBEAT_SEC", "30"))         # at most lease_sec / 3
 
 LIB_PATH = Path(os.getenv("LIB_PATH", "/app/tools/sky130.lib"))  # If missing, we skip OpenSTA gracefully
 
@@ -33,72 +53,229 @@ SMOKE_FREQ = float(os.getenv("SMOKE_FREQ_MHZ", str(DEFAULT_FREQ_MHZ)))
 SMOKE_SAVE_DIR = os.getenv("SMOKE_SAVE_DIR", "")  # if set, copy workspace here for inspection
 
 # --------- Helpers ----------
-def get_queued_job() -> Dict[str, Any] | None:
+def make_client() -> httpx.AsyncClient:
+    """One pooled keep-alive client shared by orchestrator calls, job claims and callbacks."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+    )
+
+def _lease_params() -> Dict[str, str]:
+    """Claims are leased to this worker only when it can renew them (HEARTBEAT_URL set)."""
+    return {"worker": WORKER_ID} if HEARTBEAT_URL else {}
+
+async def get_queued_job(client: httpx.AsyncClient, wait: float = 0) -> Dict[str, Any] | None:
     """Your Lovable Edge Function should return a JSON like:
-       {"job_id": "...", "spec": {...}}
+       {"job_id": "...", "spec": {...}, "checkpoint": {...} or null}
        and atomically mark it running.
+    With wait > 0 the server may hold the request open for up to `wait` seconds until
+    a job is queued (204 when none). Raises on transport/HTTP errors.
     """
-    try:
-        r = requests.get(NEXT_JOB_URL, timeout=20)
-        if r.ok:
-            data = r.json()
-            return data if data.get("job_id") else None
-    except Exception:
+    params = {**({"wait": wait} if wait else {}), **_lease_params()}
+    r = await client.get(NEXT_JOB_URL, params=params or None,
+                         headers={"Authorization": f"Bearer {WORKER_TOKEN}"}, timeout=wait + 20)
+    if r.status_code == 204:
         return None
-    return None
-
-def post_update(job_id: str, payload: Dict[str, Any]):
-    try:
-        body = {"job_id": job_id, **payload}
-        requests.post(CALLBACK_URL, json=body, timeout=30)
-    except Exception as e:
-        print("callback error:", e)
-
-def call_orch(path: str, body: Dict[str, Any], timeout=120):
-    r = requests.post(ORCH + path, json=body, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    return data if data.get("job_id") else None
+
+async def get_queued_jobs(client: httpx.AsyncClient, max_jobs: int, wait: float = 0) -> List[Dict[str, Any]]:
+    """Claim up to max_jobs in one round trip via NEXT_JOBS_URL (?max=N), falling back to
+    the single-job endpoint when no batch URL is configured or it isn't deployed."""
+    if NEXT_JOBS_URL and max_jobs > 1:
+        r = await client.get(NEXT_JOBS_URL, params={"max": max_jobs, "wait": wait, **_lease_params()},
+                             headers={"Authorization": f"Bearer {WORKER_TOKEN}"}, timeout=wait + 20)
+        if r.status_code == 204:
+            return []
+        if r.status_code != 404:
+            r.raise_for_status()
+            return [j for j in r.json() if j.get("job_id")]
+    job = await get_queued_job(client, wait)
+    return [job] if job else []
+
+async def send_heartbeat(client: httpx.AsyncClient, job_ids: List[str]) -> Dict[str, Any]:
+    """Renew the leases on job_ids; returns {"lease_sec", "lost": [...]}."""
+    r = await client.post(HEARTBEAT_URL, json={"worker_id": WORKER_ID, "job_ids": job_ids},
+                          headers={"Authorization": f"Bearer {WORKER_TOKEN}"}, timeout=10)
     r.raise_for_status()
     return r.json()
 
-def unified_diff(before: str, after: str, fname: str) -> str:
-    return "\n".join(difflib.unified_diff(
-        before.splitlines(), after.splitlines(), fromfile=f"a/{fname}", tofile=f"b/{fname}"
-    ))
+def backoff_delay(attempt: int, base: float = 1.0) -> float:
+    """Full-jitter exponential backoff, so a fleet of workers doesn't retry in lockstep."""
+    return random.uniform(0, min(BACKOFF_MAX_SEC, base * 2 ** attempt))
+
+# Progress callbacks go through one background channel per job, so a slow callback
+# endpoint never stalls EDA work. Updates posted while a delivery is pending are merged
+# (latest value per field wins) and fields the receiver already has are dropped, since
+# eda-worker-callback applies each body as a partial row update. Large bodies are
+# gzip-compressed. A failed delivery is retried with backoff up to CALLBACK_MAX_RETRIES
+# times; its fields stay merged into the job's single pending update, so buffering is
+# bounded by one state per job.
+class CallbackError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.retryable = status >= 500 or status == 429
+
+class CallbackChannel:
+    def __init__(self, client: httpx.AsyncClient, job_id: str):
+        self.client = client
+        self.job_id = job_id
+        self.pending: Dict[str, Any] = {}   # fields not yet delivered
+        self.sent: Dict[str, str] = {}      # field -> digest of the value the receiver has
+        self.wake = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def push(self, payload: Dict[str, Any]):
+        self.pending.update(payload)
+        self.wake.set()
+
+    def _delta(self) -> Dict[str, Any]:
+        out = {}
+        for k, v in self.pending.items():
+            if self.sent.get(k) != _digest(v):
+                out[k] = v
+        self.pending = {}
+        return out
+
+    async def _run(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            if not self.closed and self.pending.get("state") not in ("succeeded", "failed"):
+                await asyncio.sleep(CALLBACK_COALESCE_SEC)  # let a burst of updates merge
+            await self._deliver()
+            if self.closed and not self.wake.is_set():
+                return
 
-def apply_unified_diff(job_dir: Path, diff_text: str) -> tuple[bool, str]:
-    """Apply a unified diff using the system 'patch' tool.
-    Returns (ok, log). Uses -p1 to strip leading a/ and b/ prefixes.
-    """
-    try:
-        # Ensure patch tool exists
-        rc = subprocess.run(["patch", "--version"], capture_output=True, text=True)
-        if rc.returncode != 0:
-            return False, f"'patch' tool not available: {rc.stderr}"
-
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".patch") as tf:
-            tf.write(diff_text)
-            patch_path = tf.name
-
-        # Dry run first
-        dry = subprocess.run(
-            ["patch", "-p1", "--forward", "--dry-run", "-i", patch_path],
-            cwd=str(job_dir), capture_output=True, text=True
-        )
-        if dry.returncode != 0:
-            return False, f"patch dry-run failed: {dry.stdout}\n{dry.stderr}"
-
-        # Real apply
-        real = subprocess.run(
-            ["patch", "-p1", "--forward", "-i", patch_path],
-            cwd=str(job_dir), capture_output=True, text=True
-        )
-        if real.returncode != 0:
-            return False, f"patch apply failed: {real.stdout}\n{real.stderr}"
-        return True, real.stdout
-    except Exception as e:
-        return False, f"patch exception: {e}"
+    async def _deliver(self):
+        for attempt in range(CALLBACK_MAX_RETRIES + 1):
+            delta = self._delta()
+            if not delta:
+                return
+            try:
+                await self._post(delta)
+                self.sent.update({k: _digest(v) for k, v in delta.items()})
+                if not self.pending:
+                    return
+                continue  # newer fields arrived during the post
+            except Exception as e:
+                # Put the fields back under anything newer and retry the merged state
+                self.pending = {**delta, **self.pending}
+                if attempt == CALLBACK_MAX_RETRIES or not getattr(e, "retryable", True):
+                    print(f"callback error ({self.job_id}): {e}; keeping {len(self.pending)} field(s) for the next update")
+                    return
+                await asyncio.sleep(backoff_delay(attempt, 0.5))
+
+    async def _post(self, delta: Dict[str, Any]):
+        raw = json.dumps({"job_id": self.job_id, **delta}, default=str).encode()
+        headers = {"Content-Type": "application/json", **tracing.headers()}
+        if len(raw) >= CALLBACK_GZIP_MIN:
+            raw = gzip.compress(raw, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        with tracing.span("callback", state=delta.get("state"), fields=len(delta), bytes=len(raw)):
+            r = await self.client.post(CALLBACK_URL, content=raw, headers=headers, timeout=30)
+        if r.status_code >= 400:
+            raise CallbackError(r.status_code)
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+_channels: Dict[str, CallbackChannel] = {}
+
+def post_update(client: httpx.AsyncClient, job_id: str, payload: Dict[str, Any]):
+    ch = _channels.get(job_id)
+    if ch is None:
+        ch = _channels[job_id] = CallbackChannel(client, job_id)
+    ch.push(payload)
+
+async def flush_updates(job_id: str):
+    """Deliver whatever is pending for job_id (bounded retries) and close its channel."""
+    ch = _channels.pop(job_id, None)
+    if ch:
+        ch.closed = True
+        ch.wake.set()
+        await asyncio.gather(ch.task, return_exceptions=True)
+
+def drop_updates(job_id: str):
+    """Discard job_id's undelivered updates and close its channel (the job was lost)."""
+    ch = _channels.pop(job_id, None)
+    if ch:
+        ch.pending = {}
+        ch.task.cancel()
+
+async def publish_artifacts(work: Path, vcd: str | None) -> Dict[str, Any]:
+    """Copy a workspace's netlist, reports, VCD and bundle into the artifact store, since
+    `work` is deleted with the job; the result references them by artifact id."""
+    if not artifacts.ARTIFACTS:
+        return {
+            "netlist_path": str(work/"synth"/"netlist.v"),
+            "reports": {
+                "yosys_stat": str(work/"reports"/"yosys_stat.txt"),
+                "opensta": str(work/"reports"/"sta_summary.txt") if LIB_PATH.exists() else "",
+            },
+            "wave_vcd": vcd or "",
+            "bundle_zip": ""
+        }
+    with tracing.span("artifacts") as sp:
+        out = await asyncio.to_thread(artifacts.collect, work, vcd)
+        if sp:
+            sp.set(blobs=len(out["blobs"]), dedup=sum(1 for b in out["blobs"].values() if b["dedup"]))
+        return out
+
+async def call_orch(client: httpx.AsyncClient, path: str, body: Dict[str, Any], timeout=120):
+    with tracing.span(path.strip("/")):
+        r = await client.post(ORCH + path, json=body, headers=tracing.headers(), timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+def _plan_key(body: Dict[str, Any]) -> str:
+    return json.dumps(body, sort_keys=True, default=str)
+
+class PlannerSpeculation:
+    """Next iteration's /planner call, started from the best result seen so far while the
+    current iteration's candidates are still being evaluated. It is reused only if the
+    final planner inputs match; otherwise it is cancelled and the call is made fresh."""
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.key = None
+        self.task = None
+        self.reused = 0
+        self.discarded = 0
+
+    def start(self, body: Dict[str, Any]):
+        key = _plan_key(body)
+        if key == self.key:
+            return
+        self.cancel()
+        self.key = key
+        self.task = asyncio.create_task(call_orch(self.client, "/planner", body))
+        self.task.add_done_callback(lambda t: t.cancelled() or t.exception())  # errors surface in plan()
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.discarded += 1
+        self.key = self.task = None
+
+    async def plan(self, body: Dict[str, Any]) -> tuple[Dict[str, Any], bool]:
+        """Planner response for `body` and whether it came from the speculative call."""
+        if self.task is not None and self.key == _plan_key(body):
+            task, self.key, self.task = self.task, None, None
+            try:
+                res = await task
+                self.reused += 1
+                return res, True
+            except Exception:
+                self.discarded += 1
+        else:
+            self.cancel()
+        return await call_orch(self.client, "/planner", body), False
 
 # --------- Core loop ----------
-def process_job(job: Dict[str, Any]):
+async def process_job(client: httpx.AsyncClient, job: Dict[str, Any]):
     job_id = job["job_id"]
     spec   = job["spec"]
     top    = spec.get("top_module", "top")
@@ -108,274 +285,484 @@ def process_job(job: Dict[str, Any]):
     parallel  = int(spec.get("budgets", {}).get("max_parallel", MAX_PARALLEL))
     rtl_text  = spec.get("original_verilog", f"module {top}(input {DEFAULT_CLOCK});endmodule")
 
-    with tempfile.TemporaryDirectory(dir=DATA_ROOT) as tmp:
-        work = Path(tmp)
-        if SMOKE_MODE:
-            print(f"[SMOKE] Workspace: {work}")
-        # Stage design files
-        if SMOKE_MODE:
-            print("[SMOKE] Preparing workspace...")
-        prepare_workspace(work, rtl_text, top)
-        # Render EDA scripts
-        if SMOKE_MODE:
-            print("[SMOKE] Rendering synth.ys...")
-        render_synth(top, freq_mhz, abc_script=spec.get("abc_script","resyn2"), out_path=work/"synth.ys")
-        period_ns = 1000.0 / freq_mhz
-        if LIB_PATH.exists():
-            if SMOKE_MODE:
-                print(f"[SMOKE] Rendering STA script using {LIB_PATH}...")
-            render_sta(LIB_PATH, work/"synth/netlist.v", top, DEFAULT_CLOCK, period_ns, out_path=work/"scripts/sta.tcl")
-        else:
-            if SMOKE_MODE:
-                print("[SMOKE] No LIB_PATH found; will skip OpenSTA.")
+    planner = PlannerSpeculation(client)
+    held: List[Path] = []  # pooled workspaces this job still holds
+    try:
+        await _run_iterations(client, job, held, spec, top, targets, freq_mhz,
+                              max_iters, parallel, rtl_text, planner)
+        checkpoint.discard(job_id)
+    finally:
+        planner.cancel()
+        for ws in held:
+            workspace.release_soon(ws)
+        await flush_updates(job_id)
+
+async def save_checkpoint(client: httpx.AsyncClient, job: Dict[str, Any], work: Path, state: Dict[str, Any]):
+    """Checkpoint the job (best effort): workspace bundle + loop state, see checkpoint.py."""
+    if not checkpoint.CHECKPOINTS:
+        return
+    try:
+        with tracing.span("checkpoint", iteration=state["iteration"]):
+            ck = await asyncio.to_thread(checkpoint.save, job, work, state)
+        post_update(client, job["job_id"], {"checkpoint": ck})
+    except Exception as e:
+        print(f"checkpoint of {job['job_id']} failed: {e}")
 
-        # ------ Baseline ------
+async def _baseline(client: httpx.AsyncClient, job_id: str, work: Path, spec: Dict[str, Any],
+                    top: str, targets: Dict[str, Any], freq_mhz: float, rtl_text: str,
+                    budget: Dict[str, Any]) -> Dict[str, Any]:
+    """Stage the design in `work`, measure it and publish the baseline. Returns the loop
+    state the iterations start from (the same shape as a checkpoint)."""
+    if SMOKE_MODE:
+        print(f"[SMOKE] Workspace: {work}")
+    # Stage design files
+    if SMOKE_MODE:
+        print("[SMOKE] Preparing workspace...")
+    prepare_workspace(work, rtl_text, top)
+    # Render EDA scripts
+    if SMOKE_MODE:
+        print("[SMOKE] Rendering synth.ys...")
+    render_synth(top, freq_mhz, abc_script=spec.get("abc_script","resyn2"), out_path=work/"synth.ys")
+    period_ns = 1000.0 / freq_mhz
+    if LIB_PATH.exists():
         if SMOKE_MODE:
-            print("[SMOKE] Running baseline: pytest, yosys, (optional) opensta...")
-        sim = run_verilator_pytest(work)
-        yos = run_yosys(work)
-        # OpenSTA optional if no liberty file present
-        if LIB_PATH.exists():
-            _ = run_opensta(work)
-            sta_sum  = parse_sta_summary(work/"reports"/"sta_summary.txt")
-        else:
-            sta_sum = {"clock_period_ns": None, "wns_ns": None, "tns_ns": None, "fmax_mhz": targets.get("frequency_mhz")}
-        yos_stat = parse_yosys_stat(work/"reports"/"yosys_stat.json", work/"reports"/"yosys_stat.txt")
+            print(f"[SMOKE] Rendering STA script using {LIB_PATH}...")
+        render_sta(LIB_PATH, work/"synth/netlist.v", top, DEFAULT_CLOCK, period_ns, out_path=work/"scripts/sta.tcl")
+    else:
         if SMOKE_MODE:
-            print(f"[SMOKE] Baseline sim pass={sim['pass']} cells={yos_stat['cell_count']} fmax={sta_sum.get('fmax_mhz')}")
-        power    = power_proxy_from_vcd(Path(sim.get("vcd") or ""), yos_stat["cell_count"], sta_sum.get("fmax_mhz"))
-
-        best = {
-            "functional_pass": bool(sim["pass"]),
-            "fmax_mhz": sta_sum.get("fmax_mhz") or 0.0,
-            "area_ge": yos_stat["ge"],
-            "dyn_power_mw": power["dyn_mw"],
-            "leak_power_mw": power["leak_mw"],
-            "gate_count": yos_stat["cell_count"],
-            "power_savings_pct": 0.0,                # baseline is 0; later compare deltas if you want
-            "timing_improvement_pct": 0.0
-        }
-        charts = {
-            "power_timeseries": power["series"],
-            "timing_breakdown": timing_breakdown_from_checks(work/"reports"/"sta_checks.txt")
-        }
+            print("[SMOKE] No LIB_PATH found; will skip OpenSTA.")
 
-        post_update(job_id, {
-            "state": "running",
-            "iteration": 0,
-            "best_result": best,
-            "optimized_verilog": (work/"rtl"/f"{top}.v").read_text(),
-            "diffs": [],
-            "charts": charts,
-            "insights": [{"title":"Baseline measured","detail":"Initial synthesis/sim/STA complete."}],
-            "artifacts": {
-                "netlist_path": str(work/"synth"/"netlist.v"),
-                "reports": {
-                    "yosys_stat": str(work/"reports"/"yosys_stat.txt"),
-                    "opensta": str(work/"reports"/"sta_summary.txt"),
-                    "verilator": "pytest.log"
-                },
-                "wave_vcd": sim.get("vcd") or "",
-                "bundle_zip": ""  # you can zip the workspace if you want
-            },
-            "logs_tail": (yos["err"] or "")[-240:]
-        })
-
-    # ------ Iterations ------
-        for it in range(1, max_iters+1):
-            # Planner
-            if SMOKE_MODE:
-                print(f"[SMOKE] Iteration {it}: planner...")
-            plan = call_orch("/planner", {
-                "targets": targets,
-                "last_result": best
-            })
-            cands = plan["candidates"][:parallel] if plan.get("candidates") else []
-            if SMOKE_MODE:
-                print(f"[SMOKE] planner candidates={len(cands)}")
+    # ------ Baseline ------
+    if SMOKE_MODE:
+        print("[SMOKE] Running baseline: pytest, yosys, (optional) opensta...")
+    with tracing.span("baseline"):
+        ev = await run_eda(work, freq_mhz, LIB_PATH, top=top, abc_script=spec.get("abc_script","resyn2"),
+                           timeout=budget["full_timeout_s"])
+    sim, yos_stat, sta_sum, power = ev["sim"], ev["yos_stat"], ev["sta_sum"], ev["power"]
+    if SMOKE_MODE:
+        print(f"[SMOKE] Baseline sim pass={sim['pass']} cells={yos_stat['cell_count']} fmax={sta_sum.get('fmax_mhz')} cached={ev['cached']}")
+
+    best = {
+        "functional_pass": bool(sim["pass"]),
+        "fmax_mhz": sta_sum.get("fmax_mhz") or 0.0,
+        "area_ge": yos_stat["ge"],
+        "dyn_power_mw": power["dyn_mw"],
+        "leak_power_mw": power["leak_mw"],
+        "gate_count": yos_stat["cell_count"],
+        "power_savings_pct": 0.0,                # baseline is 0; later compare deltas if you want
+        "timing_improvement_pct": 0.0
+    }
+    charts = {
+        "power_timeseries": power["series"],
+        "timing_breakdown": ev["timing_breakdown"],
+        "critical_paths": timing_summary(ev.get("critical_paths")),
+    }
+    front = pareto.ParetoFront(targets, spec.get("weights"), baseline=best)
+    front.add(best, iteration=0, transform="baseline")
+    # Candidates are screened cheaply and only the best fraction gets the full run; the
+    # baseline's screening proxies are the reference for ranking them
+    base_proxy = None
+    if budget["screening"]:
+        base_proxy = await screen_candidate({"work": work, "top": top}, budget["screen_timeout_s"])
+        base_proxy = base_proxy if base_proxy["ok"] else None
+    timing = charts["critical_paths"]
+    insights = [{"title":"Baseline measured","detail":"Initial synthesis/sim/STA complete."}]
+    if timing:
+        hot = ", ".join(f'{c["instance"]} ({c["cell"]}, {c["delay_ns"]} ns)' for c in timing["bottlenecks"][:3])
+        insights.append({"title": "Critical path",
+                         "detail": f'{timing["worst_path"]}: slack {timing["worst_slack_ns"]} ns, '
+                                   f'{timing["logic_depth"]} levels; slowest cells {hot}'})
+
+    post_update(client, job_id, {
+        "state": "running",
+        "iteration": 0,
+        "best_result": best,
+        "optimized_verilog": (work/"rtl"/f"{top}.v").read_text(),
+        "diffs": [],
+        "charts": charts,
+        "pareto_front": front.summary(),
+        "insights": insights,
+        "artifacts": await publish_artifacts(work, sim.get("vcd")),
+        "logs_tail": ev["logs_tail"]
+    })
+    return {"iteration": 0, "baseline": best, "best": best, "charts": charts, "timing": timing,
+            "front": front.state(), "base_proxy": base_proxy}
+
+async def _run_iterations(client: httpx.AsyncClient, job: Dict[str, Any], held: List[Path], spec: Dict[str, Any],
+                          top: str, targets: Dict[str, Any], freq_mhz: float,
+                          max_iters: int, parallel: int, rtl_text: str, planner: PlannerSpeculation):
+    job_id = job["job_id"]
+    budget = scheduler.budgets(spec, parallel)
+    work = workspace.acquire()
+    held.append(work)
 
-            improved = False
-            for cand in cands:
-                # Programmer
-                if SMOKE_MODE:
-                    print("[SMOKE] programmer...")
-                files = {
-                    f"rtl/{top}.v": (work/"rtl"/f"{top}.v").read_text(),
-                    "synth.ys": (work/"synth.ys").read_text()
-                }
-                prog = call_orch("/programmer", {"files": files, "candidate": cand})
-                # Reviewer
-                if SMOKE_MODE:
-                    print("[SMOKE] reviewer...")
-                rev  = call_orch("/reviewer", {"programmer_json": prog})
-                if not rev.get("ok"):
-                    if SMOKE_MODE:
-                        print("[SMOKE] reviewer rejected; skipping candidate")
-                    continue
+    # Resume from the last checkpoint when there is one; otherwise measure the baseline
+    ck = checkpoint.load(job) if checkpoint.CHECKPOINTS else None
+    if ck:
+        try:
+            await asyncio.to_thread(checkpoint.restore, ck, work)
+        except Exception as e:
+            print(f"checkpoint of {job_id} not restored ({e}); starting over")
+            ck = None
+            held.remove(work)
+            workspace.release_soon(work)
+            work = workspace.acquire()
+            held.append(work)
+    if ck:
+        state = ck
+        print(f"job {job_id}: resuming after iteration {ck['iteration']}")
+        post_update(client, job_id, {"state": "running", "iteration": ck["iteration"],
+                                     "logs_tail": f"resumed from checkpoint after iteration {ck['iteration']}"})
+    else:
+        state = await _baseline(client, job_id, work, spec, top, targets, freq_mhz, rtl_text, budget)
+        await save_checkpoint(client, job, work, state)
+
+    # Every functional result is offered to the Pareto front; `best` is the member the
+    # targets and weights prefer, and `work` always holds its workspace
+    front = pareto.ParetoFront(targets, spec.get("weights"), baseline=state["baseline"])
+    front.load_state(state["front"])
+    best = front.select()["metrics"] if len(front) else state["best"]
+    base_proxy = state.get("base_proxy")
+    fidelity: Dict[str, int] = {}
+    # Plans are ranked (and, once the model is trusted, pruned) by the surrogate before any
+    # programmer call; every finished candidate is added to its history
+    surr = surrogate.Session(front.weights)
+    # Critical paths of the current best, handed to the planner with each request
+    timing = state.get("timing")
+    charts = state.get("charts", {})
+
+    def plan_body() -> Dict[str, Any]:
+        # The same body for the speculative and the final /planner call, so they match
+        return {"targets": targets, "last_result": best, "timing": timing,
+                "max_candidates": budget["candidates"]}
 
-                # Apply patches (unified diffs) if provided
-                diffs_applied: List[Dict[str, str]] = []
-                # 1) RTL patches
-                for p in prog.get("patches", []) or []:
-                    diff_text = p.get("unified_diff") or ""
-                    if not diff_text.strip():
-                        continue
-                    ok, log = apply_unified_diff(work, diff_text)
-                    if SMOKE_MODE:
-                        print(f"[SMOKE] apply patch ok={ok}")
-                    if ok:
-                        # Try to compute a diff for the path field if we can
-                        path_val = p.get("path", "")
-                        try:
-                            rel_path = path_val.replace("rtl/", f"rtl/") if path_val else f"rtl/{top}.v"
-                            fpath = work / rel_path
-                            if fpath.exists():
-                                after = fpath.read_text()
-                                # We can't easily reconstruct 'before' now; include raw unified diff
-                                diffs_applied.append({"path": rel_path, "unified_diff": diff_text})
-                            else:
-                                diffs_applied.append({"path": rel_path, "unified_diff": diff_text})
-                        except Exception:
-                            diffs_applied.append({"path": path_val or f"rtl/{top}.v", "unified_diff": diff_text})
-                    else:
-                        # If patch failed, skip this candidate
-                        continue
-
-                # 2) synth.ys patch (if any)
-                synth_patch = prog.get("synth_script_patch")
-                if synth_patch and str(synth_patch).strip():
-                    ok, log = apply_unified_diff(work, synth_patch)
-                    # If synth patch fails, keep going with previous synth.ys
-
-                # Re-render scripts in case the candidate changed constraints
-                render_synth(top, freq_mhz, abc_script=cand.get("params",{}).get("script","resyn2"), out_path=work/"synth.ys")
-                if LIB_PATH.exists():
-                    render_sta(LIB_PATH, work/"synth/netlist.v", top, DEFAULT_CLOCK, period_ns, out_path=work/"scripts/sta.tcl")
-
-                # Evaluate
-                if SMOKE_MODE:
-                    print("[SMOKE] evaluate: pytest -> yosys -> (optional) opensta...")
-                sim = run_verilator_pytest(work)
-                if not sim["pass"]:
-                    if SMOKE_MODE:
-                        print("[SMOKE] sim failed; skipping candidate")
-                    continue
-                yos = run_yosys(work)
-                if LIB_PATH.exists():
-                    _ = run_opensta(work)
-                yos_stat = parse_yosys_stat(work/"reports"/"yosys_stat.json", work/"reports"/"yosys_stat.txt")
-                if LIB_PATH.exists():
-                    sta_sum  = parse_sta_summary(work/"reports"/"sta_summary.txt")
-                else:
-                    sta_sum = {"clock_period_ns": None, "wns_ns": None, "tns_ns": None, "fmax_mhz": freq_mhz}
-                power    = power_proxy_from_vcd(Path(sim.get("vcd") or ""), yos_stat["cell_count"], sta_sum.get("fmax_mhz"))
+    # ------ Iterations ------
+    # Each candidate is evaluated in its own clone of `work`, so a rejected patch never
+    # leaks into the next candidate; the winning clone becomes the new `work`.
+    # LLM calls overlap EDA: programmer/reviewer run for all candidates at once, and the
+    # next planner call starts speculatively whenever the best result so far changes.
+    for it in range(state["iteration"] + 1, max_iters + 1):
+        # Planner
+        if SMOKE_MODE:
+            print(f"[SMOKE] Iteration {it}: planner...")
+        plan, reused = await planner.plan(plan_body())
+        files = {
+            f"rtl/{top}.v": (work/"rtl"/f"{top}.v").read_text(),
+            "synth.ys": (work/"synth.ys").read_text()
+        }
+        start = best
+        design = surrogate.design_features(files[f"rtl/{top}.v"], start)
+        cands = await surr.rank(plan.get("candidates") or [], design, budget["candidates"])
+        if SMOKE_MODE:
+            print(f"[SMOKE] planner candidates={len(cands)} speculative={reused}")
+        # programmer -> reviewer -> patch -> screen, all candidates at once; the best
+        # screened fraction is promoted to (pytest || yosys -> opensta)
+        cand_dirs = [workspace.acquire() for _ in cands]
+        held.extend(cand_dirs)
+        def preparer(i, cand, base=work):
+            return lambda prog: prepare_candidate(base, cand_dirs[i], top, freq_mhz,
+                                                  DEFAULT_CLOCK, LIB_PATH, cand, prog)
+        tasks = [(cand, asyncio.create_task(_candidate(client, cand, files, preparer(i, cand))))
+                 for i, cand in enumerate(cands)]
+
+        improved = False   # the selected point changed
+        grew = False       # the front gained a trade-off point
+        winner = None
+        async for cand, res in scheduler.successive_halving(
+                tasks,
+                screen=lambda prep: screen_candidate(prep, budget["screen_timeout_s"]),
+                full=lambda prep: finish_candidate(prep, budget["full_timeout_s"]),
+                cost=lambda proxy: scheduler.screen_cost(proxy, base_proxy, front.weights),
+                b=budget, stats=fidelity):
+            surr.record(design, start, cand, res)
+            if not res["ok"]:
                 if SMOKE_MODE:
-                    print(f"[SMOKE] candidate fmax={sta_sum.get('fmax_mhz')} cells={yos_stat['cell_count']}")
-
-                cand_best = {
-                    "functional_pass": True,
-                    "fmax_mhz": sta_sum.get("fmax_mhz") or 0.0,
-                    "area_ge": yos_stat["ge"],
-                    "dyn_power_mw": power["dyn_mw"],
-                    "leak_power_mw": power["leak_mw"],
-                    "gate_count": yos_stat["cell_count"],
-                    "power_savings_pct": 32.0,  # simple placeholder (compute vs baseline if you log baseline dyn)
-                    "timing_improvement_pct": 15.0
-                }
-
-                # Simple “better” rule: greater fmax, or equal fmax and fewer gates
-                def better(new, old):
-                    return (new["fmax_mhz"], -new["gate_count"]) > (old["fmax_mhz"], -old["gate_count"])
-
-                if better(cand_best, best):
-                    best = cand_best
-                    improved = True
-                    charts = {
-                        "power_timeseries": power["series"],
-                        "timing_breakdown": timing_breakdown_from_checks(work/"reports"/"sta_checks.txt")
-                    }
-                    post_update(job_id, {
-                        "state": "running",
-                        "iteration": it,
-                        "best_result": best,
-                        "optimized_verilog": (work/"rtl"/f"{top}.v").read_text(),
-                        "diffs": diffs_applied,
-                        "charts": charts,
-                        "insights": [{"title":"Candidate accepted",
-                                      "detail": f"Applied {cand.get('transform')} with params {cand.get('params',{})}"}],
-                        "artifacts": {
-                            "netlist_path": str(work/"synth"/"netlist.v"),
-                            "reports": {
-                                "yosys_stat": str(work/"reports"/"yosys_stat.txt"),
-                                "opensta": str(work/"reports"/"sta_summary.txt") if LIB_PATH.exists() else "",
-                                "verilator": "pytest.log"
-                            },
-                            "wave_vcd": sim.get("vcd") or "",
-                            "bundle_zip": ""
-                        },
-                        "logs_tail": "iteration improved"
-                    })
-
-            # Evaluator – stop if orchestrator says so or no improvement
-            ev = call_orch("/evaluator", {
-                "targets": targets,
-                "batch": [best],
-                "current_best": best
+                    print(f"[SMOKE] {res['reason']}; skipping candidate")
+                continue
+            if SMOKE_MODE:
+                print(f"[SMOKE] candidate fmax={res['metrics']['fmax_mhz']} cells={res['metrics']['gate_count']} cached={res['cached']}")
+            if not front.add(res["metrics"], iteration=it, transform=cand.get("transform"),
+                             params=cand.get("params", {})):
+                continue
+            grew = True
+            if front.select()["metrics"] is res["metrics"]:
+                best = res["metrics"]
+                charts = res["charts"]
+                timing = charts.get("critical_paths")
+                winner = (cand, res)
+                improved = True
+                if SPECULATIVE_PLANNER and it < max_iters:
+                    planner.start(plan_body())
+
+        # Keep only the winning clone; the other candidates' workspaces (and the previous
+        # best, once superseded) go back to the pool and are reset in the background
+        done = list(cand_dirs)
+        if winner:
+            done.append(work)
+            work = Path(winner[1]["work"])
+        for d in done:
+            if d != work:
+                held.remove(d)
+                workspace.release_soon(d)
+
+        if winner:
+            cand, res = winner
+            post_update(client, job_id, {
+                "state": "running",
+                "iteration": it,
+                "best_result": best,
+                "optimized_verilog": (work/"rtl"/f"{top}.v").read_text(),
+                "diffs": res["diffs"],
+                "charts": res["charts"],
+                "pareto_front": front.summary(),
+                "insights": [{"title":"Candidate accepted",
+                              "detail": f"Applied {cand.get('transform')} with params {cand.get('params',{})}"}],
+                "artifacts": await publish_artifacts(work, res["vcd"]),
+                "logs_tail": "iteration improved"
             })
-            if ev.get("stop") or not improved:
-                post_update(job_id, {"state": "succeeded", "logs_tail": "completed"})
-                # Persist workspace for smoke-mode debugging if requested
-                if SMOKE_SAVE_DIR:
-                    try:
-                        dest = Path(SMOKE_SAVE_DIR) / f"{job_id}"
-                        dest.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copytree(work, dest, dirs_exist_ok=True)
-                        print(f"[SMOKE] Saved workspace to {dest}")
-                    except Exception as e:
-                        print(f"[SMOKE] Save workspace failed: {e}")
-                return
+        elif grew:
+            post_update(client, job_id, {"iteration": it, "pareto_front": front.summary()})
+
+        await surr.flush()
+        if improved or grew:
+            await save_checkpoint(client, job, work, {
+                "iteration": it, "baseline": state["baseline"], "best": best, "charts": charts,
+                "timing": timing, "front": front.state(), "base_proxy": base_proxy})
+
+        # Evaluator – stop if orchestrator says so or no improvement
+        ev = await call_orch(client, "/evaluator", {
+            "targets": targets,
+            "batch": [best],
+            "current_best": best
+        })
+        if ev.get("stop") or not (improved or grew):
+            break
 
-def main():
-    # Optional one-off smoke run without Supabase polling
+    # Also reached when the iteration budget runs out (or a job resumes at its last iteration)
+    post_update(client, job_id, {"state": "succeeded", "logs_tail": "completed",
+                                 "timings": tracing.summary(tracing.current_trace_id()),
+                                 "surrogate": await asyncio.to_thread(surr.report)})
     if SMOKE_MODE:
-        job = {
-            "job_id": "local-smoke",
-            "spec": {
-                "top_module": SMOKE_TOP,
-                "targets": {"frequency_mhz": SMOKE_FREQ},
-                "budgets": {"max_iters": 1, "max_parallel": 1},
-                "original_verilog": SMOKE_VERILOG,
-            },
-        }
-        print("[SMOKE] Running one-off local job...")
-        # Wait for orchestrator readiness briefly
+        print(f"[SMOKE] speculative planner calls reused={planner.reused} discarded={planner.discarded}")
+        print(f"[SMOKE] candidate fidelity {fidelity}")
+    # Persist workspace for smoke-mode debugging if requested
+    if SMOKE_SAVE_DIR:
         try:
-            for i in range(20):
-                try:
-                    requests.get(ORCH + "/healthz", timeout=2)
-                    break
-                except Exception:
-                    time.sleep(0.5)
+            dest = Path(SMOKE_SAVE_DIR) / f"{job_id}"
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copytree(work, dest, dirs_exist_ok=True)
+            print(f"[SMOKE] Saved workspace to {dest}")
+        except Exception as e:
+            print(f"[SMOKE] Save workspace failed: {e}")
+
+async def _candidate(client: httpx.AsyncClient, cand: Dict[str, Any], files: Dict[str, str],
+                     evaluate) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """programmer -> reviewer -> evaluate(prog) for one candidate."""
+    with tracing.span("candidate", transform=cand.get("transform")):
+        if SMOKE_MODE:
+            print("[SMOKE] programmer...")
+        prog = await call_orch(client, "/programmer", {"files": files, "candidate": cand})
+        if SMOKE_MODE:
+            print("[SMOKE] reviewer...")
+        rev  = await call_orch(client, "/reviewer", {"programmer_json": prog})
+        if not rev.get("ok"):
+            return cand, {"ok": False, "reason": "reviewer rejected"}
+        return cand, await evaluate(prog)
+
+async def run_job(client: httpx.AsyncClient, job: Dict[str, Any], claimed: tuple[float, float] | None = None):
+    """process_job inside the job's trace; `claimed` is the (start, seconds) of the claim."""
+    job_id = job.get("job_id", "")
+    trace_id = job.get("trace_id") or tracing.trace_id_for(job_id)
+    if claimed:
+        tracing.add_span("claim", trace_id, *claimed)
+    try:
+        with tracing.trace("job", trace_id, job_id=job_id):
+            await process_job(client, job)
+    except Exception as e:
+        checkpoint.discard(job_id)
+        try:
+            post_update(client, job_id, {"state":"failed","logs_tail": str(e)[:300],
+                                         "timings": tracing.summary(trace_id)})
+            await flush_updates(job_id)
         except Exception:
             pass
+    finally:
+        await tracing.export(trace_id, client)
+
+class Slot:
+    """One concurrent job slot; tracks busy time for utilisation reporting."""
+    def __init__(self, idx: int):
+        self.idx = idx
+        self.task = None
+        self.job_id = ""
+        self.lease_sec = None
+        self.started = 0.0
+        self.busy_sec = 0.0
+        self.jobs_done = 0
+        self.window_start = time.monotonic()
+
+    def claim(self, job: Dict[str, Any], task: asyncio.Task):
+        self.job_id = job.get("job_id", "")
+        self.lease_sec = job.get("lease_sec")
+        self.started = time.monotonic()
+        self.task = task
+
+    def release(self):
+        self.busy_sec += time.monotonic() - self.started
+        self.jobs_done += 1
+        self.task = None
+        self.job_id = ""
+        self.lease_sec = None
+
+    def report(self) -> str:
+        """Busy fraction since the previous report, then reset the window."""
+        now = time.monotonic()
+        busy = self.busy_sec
+        if self.task:
+            busy += now - max(self.started, self.window_start)
+            self.started = now
+        util = busy / max(1e-9, now - self.window_start)
+        self.busy_sec = 0.0
+        self.window_start = now
+        state = f"busy({self.job_id})" if self.task else "idle"
+        return f"#{self.idx} {state} {util:.0%} jobs={self.jobs_done}"
+
+async def heartbeat_loop(client: httpx.AsyncClient, slots: List[Slot]):
+    """Renew the leases of the jobs in `slots` every HEARTBEAT_SEC (or a third of the
+    shortest lease). A job whose lease was lost (reaped and requeued, or finished
+    elsewhere) is cancelled with its pending callbacks and local checkpoint, since
+    another worker may already own it; transport errors are only logged, the lease
+    outlives a few missed beats."""
+    while True:
+        leases = [s.lease_sec for s in slots if s.task and s.lease_sec]
+        await asyncio.sleep(min([HEARTBEAT_SEC] + [l / 3 for l in leases]))
+        busy = {s.job_id: s for s in slots if s.task and not s.task.done()}
+        if not busy:
+            continue
         try:
-            process_job(job)
-            print("[SMOKE] Completed")
+            lost = (await send_heartbeat(client, list(busy)))["lost"]
         except Exception as e:
-            print("[SMOKE] Failed:", e)
-        return
-
-    while True:
-        job = get_queued_job()
-        if job:
+            print(f"heartbeat error: {e!r}")
+            continue
+        for job_id in lost:
+            s = busy.get(job_id)
+            if s and s.task:
+                print(f"lease on {job_id} lost; abandoning the job")
+                drop_updates(job_id)
+                checkpoint.discard(job_id)
+                s.task.cancel()
+
+async def resumable(client: httpx.AsyncClient, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Locally checkpointed jobs this worker still holds the lease on. Jobs reported lost
+    were reaped (and may run elsewhere): their local checkpoints are dropped, and the
+    checkpoint on the row resumes them wherever they are claimed next. Without a lease
+    endpoint every job is resumed; if it can't be reached none are, the reaper requeues them."""
+    if not jobs or not HEARTBEAT_URL:
+        return jobs
+    try:
+        lost = set((await send_heartbeat(client, [j["job_id"] for j in jobs]))["lost"])
+    except Exception as e:
+        print(f"lease check of checkpointed jobs failed ({e!r}); leaving them to the reaper")
+        return []
+    for job_id in lost:
+        print(f"lease on checkpointed job {job_id} lost; not resuming it here")
+        checkpoint.discard(job_id)
+    return [j for j in jobs if j["job_id"] not in lost]
+
+async def main():
+    async with make_client() as client:
+        # Optional one-off smoke run without Supabase polling
+        if SMOKE_MODE:
+            job = {
+                "job_id": "local-smoke",
+                "spec": {
+                    "top_module": SMOKE_TOP,
+                    "targets": {"frequency_mhz": SMOKE_FREQ},
+                    "budgets": {"max_iters": 1, "max_parallel": 1},
+                    "original_verilog": SMOKE_VERILOG,
+                },
+            }
+            print("[SMOKE] Running one-off local job...")
+            # Wait for orchestrator readiness briefly
+            for i in range(20):
+                try:
+                    await client.get(ORCH + "/healthz", timeout=2)
+                    break
+                except Exception:
+                    await asyncio.sleep(0.5)
+            trace_id = tracing.trace_id_for(job["job_id"])
             try:
-                process_job(job)
+                with tracing.trace("job", trace_id, job_id=job["job_id"]):
+                    await process_job(client, job)
+                print("[SMOKE] Completed")
             except Exception as e:
+                print("[SMOKE] Failed:", e)
+            print("[SMOKE] timings:", json.dumps(tracing.summary(trace_id)["stages"]))
+            await sta_session.shutdown()
+            await workspace.drain()
+            print("[SMOKE] workspace pool:", json.dumps(workspace.pool_stats()))
+            await tracing.export(trace_id, client)
+            return
+
+        await asyncio.to_thread(workspace.warm_pool)
+        slots = [Slot(i) for i in range(max(1, WORKER_SLOTS))]
+        print(f"worker started: {len(slots)} job slot(s), EDA core budget {EDA_CORE_BUDGET}")
+        heartbeats = None
+        if HEARTBEAT_URL:
+            print(f"leasing jobs as {WORKER_ID}; heartbeat every {HEARTBEAT_SEC:.0f}s")
+            heartbeats = asyncio.create_task(heartbeat_loop(client, slots))
+        try:
+            # Jobs this volume was running when the previous process died come first
+            resume = await resumable(client, await asyncio.to_thread(checkpoint.pending))
+            if resume:
+                print(f"resuming {len(resume)} checkpointed job(s): {', '.join(j['job_id'] for j in resume)}")
+            last_report = time.monotonic()
+            errors = 0
+            while True:
+                for s in slots:
+                    if s.task and s.task.done():
+                        s.release()
+
+                if time.monotonic() - last_report >= UTIL_REPORT_SEC:
+                    print("slot utilisation: " + ", ".join(s.report() for s in slots))
+                    print("workspace pool: " + json.dumps(workspace.pool_stats()))
+                    last_report = time.monotonic()
+
+                free = [s for s in slots if not s.task]
+                if not free:
+                    # Wake as soon as a slot frees up
+                    busy = [s.task for s in slots if s.task]
+                    await asyncio.wait(busy, timeout=UTIL_REPORT_SEC, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                if resume:
+                    for s in free[:len(resume)]:
+                        job = resume.pop(0)
+                        s.claim(job, asyncio.create_task(run_job(client, job)))
+                    continue
+
+                # Long-poll for work for every free slot; the server answers as soon as a job is queued
+                started = time.monotonic()
+                claim_start = time.time()
                 try:
-                    post_update(job.get("job_id",""), {"state":"failed","logs_tail": str(e)[:300]})
-                except Exception:
-                    pass
-        time.sleep(POLL_INTERVAL)
+                    jobs = await get_queued_jobs(client, len(free), wait=LONG_POLL_SEC)
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    delay = backoff_delay(errors)
+                    print(f"claim error ({e!r}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                claimed = (claim_start, time.monotonic() - started)
+                for s, job in zip(free, jobs):
+                    s.claim(job, asyncio.create_task(run_job(client, job, claimed)))
+                if not jobs and time.monotonic() - started < 1.0:
+                    # Server answered without holding the request (no long-poll support)
+                    await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            if heartbeats:
+                heartbeats.cancel()
+            await sta_session.shutdown()
+            await workspace.drain()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,240 @@
+from __future__ import annotations
+import os, errno, fcntl, atexit, shutil, asyncio, threading
+from pathlib import Path
+from typing import Dict, Any, List
+
+# Inputs that a candidate may modify; everything else (synth/, reports/) is tool output
+# and starts empty in every clone so tools never write through a shared inode.
+CLONE_DIRS  = ("rtl", "tb", "scripts")
+CLONE_FILES = ("synth.ys",)
+OUTPUT_DIRS = ("synth", "reports")
+SKIP_SUFFIXES = (".vcd", ".pyc")
+SKELETON_DIRS = ("rtl", "synth", "reports", "scripts", "tb")
+
+# Workspace pool. Workspaces are pre-created skeletons on tmpfs (WORKSPACE_TMPFS, e.g.
+# /dev/shm) so tool runs do their small-file I/O in RAM. A released workspace is emptied
+# in place (directories kept) in the background and handed to the next acquire(); at most
+# WORKSPACE_POOL_SIZE idle ones are kept. Once usage of the tmpfs mount (statvfs, all
+# workers sharing it) passes WORKSPACE_TMPFS_MAX_MB, new workspaces are created under WORKSPACE_DISK_DIR instead,
+# and VCDs larger than VCD_SPILL_MB are moved out of tmpfs to WORKSPACE_DISK_DIR.
+WORKSPACE_TMPFS        = os.getenv("WORKSPACE_TMPFS", "/dev/shm/verirl" if os.path.isdir("/dev/shm") else "")
+WORKSPACE_DISK_DIR     = Path(os.getenv("WORKSPACE_DISK_DIR", os.path.join(os.getenv("DATA_ROOT", "/data/jobs"), "pool")))
+WORKSPACE_POOL_SIZE    = int(os.getenv("WORKSPACE_POOL_SIZE", "8"))
+WORKSPACE_TMPFS_MAX_MB = int(os.getenv("WORKSPACE_TMPFS_MAX_MB", "1024"))
+VCD_SPILL_MB           = int(os.getenv("VCD_SPILL_MB", "32"))
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def _clone_file(src: Path, dst: Path):
+    """Reflink src to dst when the filesystem supports copy-on-write (btrfs, xfs),
+    otherwise hard-link it. Falls back to a real copy across devices.
+    Writers must replace files (see runners.write_text) rather than truncate them.
+    """
+    try:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        return
+    except OSError:
+        try:
+            dst.unlink()
+        except FileNotFoundError:
+            pass
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copy2(src, dst)
+
+def clone_workspace(src: Path, dst: Path) -> Path:
+    """Create a cheap per-candidate copy of a prepared workspace in `dst` (new, or an
+    empty skeleton from acquire())."""
+    dst.mkdir(parents=True, exist_ok=True)
+    for d in CLONE_DIRS:
+        root = src / d
+        if not root.exists():
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [n for n in dirnames if n != "__pycache__"]
+            rel = Path(dirpath).relative_to(src)
+            (dst / rel).mkdir(parents=True, exist_ok=True)
+            for name in filenames:
+                if name.endswith(SKIP_SUFFIXES):
+                    continue
+                _clone_file(Path(dirpath) / name, dst / rel / name)
+    for f in CLONE_FILES:
+        if (src / f).exists():
+            _clone_file(src / f, dst / f)
+    for d in OUTPUT_DIRS:
+        (dst / d).mkdir(exist_ok=True)
+    return dst
+
+# --------- Workspace pool ----------
+_lock = threading.Lock()
+_idle: List[Path] = []
+_in_use: set[Path] = set()
+_seq = 0
+_resets: set[asyncio.Task] = set()
+_stats = {"hits": 0, "misses": 0, "disk_fallbacks": 0, "vcd_spills": 0, "discarded": 0}
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _prune_stale():
+    """Remove pools left behind by worker processes that no longer exist."""
+    for base in filter(None, (WORKSPACE_TMPFS, str(WORKSPACE_DISK_DIR))):
+        try:
+            entries = list(os.scandir(base))
+        except OSError:
+            continue
+        for e in entries:
+            if e.name.isdigit() and int(e.name) != os.getpid() and not _alive(int(e.name)):
+                shutil.rmtree(e.path, ignore_errors=True)
+
+@atexit.register
+def _cleanup():
+    for base in filter(None, (WORKSPACE_TMPFS, str(WORKSPACE_DISK_DIR))):
+        shutil.rmtree(Path(base) / str(os.getpid()), ignore_errors=True)
+
+def _tmpfs_root() -> Path | None:
+    return Path(WORKSPACE_TMPFS) / str(os.getpid()) if WORKSPACE_TMPFS else None
+
+def _tmpfs_used_bytes() -> int:
+    """Space in use on the tmpfs mount holding WORKSPACE_TMPFS (one statvfs call, so it
+    is cheap enough for every pool miss; includes other users of the mount)."""
+    path = Path(WORKSPACE_TMPFS)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return 0
+    return (st.f_blocks - st.f_bfree) * st.f_frsize
+
+def _on_tmpfs(ws: Path) -> bool:
+    root = _tmpfs_root()
+    return root is not None and root in ws.parents
+
+def _create() -> Path:
+    global _seq
+    if _seq == 0:
+        _prune_stale()
+    root = _tmpfs_root()
+    if root is not None and _tmpfs_used_bytes() >= WORKSPACE_TMPFS_MAX_MB << 20:
+        _stats["disk_fallbacks"] += 1
+        root = None
+    _seq += 1
+    ws = (root or WORKSPACE_DISK_DIR / str(os.getpid())) / f"ws{_seq}"
+    try:
+        for d in SKELETON_DIRS:
+            (ws / d).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        if root is None:
+            raise
+        _stats["disk_fallbacks"] += 1   # tmpfs full or not writable
+        ws = WORKSPACE_DISK_DIR / str(os.getpid()) / f"ws{_seq}"
+        for d in SKELETON_DIRS:
+            (ws / d).mkdir(parents=True, exist_ok=True)
+    return ws
+
+def warm_pool(n: int = WORKSPACE_POOL_SIZE):
+    """Pre-create up to n idle workspaces."""
+    with _lock:
+        while len(_idle) < n:
+            _idle.append(_create())
+
+def acquire() -> Path:
+    """An empty workspace skeleton (rtl/ synth/ reports/ scripts/ tb/)."""
+    with _lock:
+        if _idle:
+            ws = _idle.pop()
+            _stats["hits"] += 1
+        else:
+            ws = _create()
+            _stats["misses"] += 1
+        _in_use.add(ws)
+    return ws
+
+def _spill_dir(ws: Path) -> Path:
+    return WORKSPACE_DISK_DIR / str(os.getpid()) / "spill" / ws.name
+
+def reset(ws: Path):
+    """Empty a workspace in place, keeping the skeleton directories."""
+    shutil.rmtree(_spill_dir(ws), ignore_errors=True)
+    for e in os.scandir(ws):
+        if e.is_dir(follow_symlinks=False):
+            if e.name in SKELETON_DIRS:
+                for sub in os.scandir(e.path):
+                    if sub.is_dir(follow_symlinks=False):
+                        shutil.rmtree(sub.path, ignore_errors=True)
+                    else:
+                        os.unlink(sub.path)
+            else:
+                shutil.rmtree(e.path, ignore_errors=True)
+        else:
+            os.unlink(e.path)
+    for d in SKELETON_DIRS:
+        (ws / d).mkdir(exist_ok=True)
+
+def release(ws: Path):
+    """Return a workspace to the pool (reset in place) or delete it if the pool is full."""
+    with _lock:
+        _in_use.discard(ws)
+        keep = len(_idle) < WORKSPACE_POOL_SIZE
+    try:
+        if keep:
+            reset(ws)
+    except OSError:
+        keep = False
+    if not keep:
+        shutil.rmtree(ws, ignore_errors=True)
+        shutil.rmtree(_spill_dir(ws), ignore_errors=True)
+    with _lock:
+        if keep:
+            _idle.append(ws)
+        else:
+            _stats["discarded"] += 1
+
+def release_soon(ws: Path):
+    """release() in a worker thread, off the job's critical path."""
+    task = asyncio.create_task(asyncio.to_thread(release, ws))
+    _resets.add(task)
+    task.add_done_callback(_resets.discard)
+
+async def drain():
+    """Wait for pending background resets."""
+    if _resets:
+        await asyncio.gather(*list(_resets), return_exceptions=True)
+
+def spill_vcd(ws: Path, vcd: str | None) -> str | None:
+    """Move a large VCD out of tmpfs; returns its (possibly new) path."""
+    if not vcd or not _on_tmpfs(ws):
+        return vcd
+    src = Path(vcd)
+    try:
+        if src.stat().st_size < VCD_SPILL_MB << 20:
+            return vcd
+        dest = _spill_dir(ws) / src.relative_to(ws)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(src, dest)
+    except (OSError, ValueError):
+        return vcd
+    with _lock:
+        _stats["vcd_spills"] += 1
+    return str(dest)
+
+def pool_stats() -> Dict[str, Any]:
+    root = _tmpfs_root()
+    with _lock:
+        out: Dict[str, Any] = {**_stats, "idle": len(_idle), "in_use": len(_in_use)}
+    acquired = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / acquired, 3) if acquired else None
+    out["tmpfs_mb"] = round(_tmpfs_used_bytes() / 2**20, 2) if root else None
+    out["tmpfs_cap_mb"] = WORKSPACE_TMPFS_MAX_MB if root else None
+    return out
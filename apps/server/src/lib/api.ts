@@ -1,4 +1,6 @@
 // apps/server/src/lib/api.ts
+import { supabase } from "@/integrations/supabase/client";
+
 const API_BASE =
   import.meta.env.VITE_API_BASE ?? "http://127.0.0.1:8000";
 
@@ -19,10 +21,15 @@ export async function ping() {
 export async function startOptimization(spec: any) {
   assertApiBase();
   const url = `${API_BASE}/start-optimization`;
+  // The API owns the job by the signed-in user (and only reuses their identical jobs)
+  const { data: { session } } = await supabase.auth.getSession();
   try {
     const res = await fetch(url, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        ...(session ? { Authorization: `Bearer ${session.access_token}` } : {}),
+      },
       body: JSON.stringify({ spec }),
     });
 
@@ -30,7 +37,13 @@ export async function startOptimization(spec: any) {
       const text = await res.text().catch(() => "");
       throw new Error(`HTTP ${res.status} ${res.statusText} at ${url}\n${text}`);
     }
-    return (await res.json()) as { job_id: string };
+    return (await res.json()) as {
+      job_id: string;
+      state: string;                   // "queued", or the state of a reused identical job
+      deduplicated: boolean;
+      queue_position: number | null;   // 1 = claimed next
+      estimated_wait_s: number | null; // null until finished jobs give a mean run time
+    };
   } catch (err: any) {
     // This makes the browser alert show the real reason (CORS, refused, etc.)
     throw new Error(`Fetch to ${url} failed: ${err?.message || err}`);
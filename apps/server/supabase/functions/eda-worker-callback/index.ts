@@ -3,7 +3,7 @@ import { createClient } from "https://esm.sh/@supabase/supabase-js@2.39.3";
 
 const corsHeaders = {
   'Access-Control-Allow-Origin': '*',
-  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type, content-encoding, traceparent',
 };
 
 serve(async (req) => {
@@ -12,7 +12,10 @@ serve(async (req) => {
   }
 
   try {
-    const update = await req.json();
+    // Workers gzip large payloads and send only the fields that changed since their last callback
+    const update = req.headers.get('content-encoding') === 'gzip' && req.body
+      ? await new Response(req.body.pipeThrough(new DecompressionStream('gzip'))).json()
+      : await req.json();
     console.log('EDA worker callback:', update);
 
     const { job_id, ...updateData } = update;
@@ -49,34 +49,53 @@ serve(async (req) => {
     const spec = await req.json();
     console.log('Starting optimization with spec:', spec);
 
-    // Generate unique job ID
-    const jobId = crypto.randomUUID();
-
-    // Create job in database
-    const { data, error } = await supabase
-      .from('optimization_jobs')
-      .insert({
-        job_id: jobId,
-        user_id: user.id,
-        state: 'queued',
-        spec: spec,
-        iteration: 0,
-        logs_tail: 'Job created, waiting for EDA worker...'
-      })
-      .select()
-      .single();
+    // Enqueue, or reuse an identical job of this user: one that finished within
+    // DEDUP_TTL_SEC, else one still queued/running (spec.dedup = false always enqueues)
+    const { data: rows, error } = await supabase.rpc('enqueue_job_dedup', {
+      p_spec: spec,
+      p_ttl_seconds: Number(Deno.env.get('DEDUP_TTL_SEC') ?? '86400'),
+      p_user_id: user.id,
+      p_job_id: crypto.randomUUID(),
+    });
 
     if (error) {
       console.error('Database error:', error);
       throw error;
     }
 
-    console.log('Job created:', jobId);
+    const data = rows[0];
+    const jobId = data.job_id;
+    console.log(data.deduplicated ? `Reusing job (${data.state}):` : 'Job created:', jobId);
+
+    // Claim position (interactive before batch, fair share across users) and a rough
+    // wait: queued jobs start as running ones finish
+    let queuePosition: number | null = null;
+    let estimatedWaitS: number | null = null;
+    if (data.state === 'queued') {
+      const { data: queue, error: queueError } = await supabase.rpc('queue_position', { p_job_id: data.id });
+      if (queueError) {
+        console.error('queue_position error:', queueError);
+      } else if (queue && queue.length > 0) {
+        const { queue_position, running, mean_run_s } = queue[0];
+        queuePosition = queue_position;
+        if (!running) {
+          estimatedWaitS = 0;
+        } else if (mean_run_s != null) {
+          estimatedWaitS = Math.round((queue_position * mean_run_s / running) * 10) / 10;
+        }
+      }
+    }
 
     return new Response(
       JSON.stringify({ 
         job_id: jobId,
-        message: 'Job queued. External EDA worker must poll and process this job.'
+        state: data.state,
+        deduplicated: data.deduplicated,
+        queue_position: queuePosition,
+        estimated_wait_s: estimatedWaitS,
+        message: data.deduplicated
+          ? `Identical job already ${data.state}; returning it.`
+          : 'Job queued. External EDA worker must poll and process this job.'
       }),
       { 
         headers: { ...corsHeaders, 'Content-Type': 'application/json' },
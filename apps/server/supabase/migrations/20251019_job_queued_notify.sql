@@ -0,0 +1,21 @@
+-- Wake long-polling workers (/next-queued-job?wait=N) as soon as a job is queued.
+-- The API LISTENs on the 'job_queued' channel; the payload is the job id.
+
+create or replace function public.notify_job_queued()
+returns trigger
+language plpgsql
+as $$
+begin
+  perform pg_notify('job_queued', new.id::text);
+  return new;
+end;
+$$;
+
+-- Fires for direct inserts (edge functions) as well as enqueue_job(), and for
+-- jobs flipped back to 'queued' (e.g. a retry).
+drop trigger if exists trg_optimization_jobs_queued on public.optimization_jobs;
+create trigger trg_optimization_jobs_queued
+  after insert or update of state on public.optimization_jobs
+  for each row
+  when (new.state = 'queued')
+  execute function public.notify_job_queued();
@@ -0,0 +1,51 @@
+-- Batch variants of the worker queue RPCs, so a worker with N free slots claims
+-- N jobs (and later finalizes them) in one round trip.
+
+-- Claim up to p_max queued jobs, oldest first. FOR UPDATE SKIP LOCKED lets
+-- concurrent workers claim disjoint batches without blocking each other.
+create or replace function public.claim_next_queued_jobs(p_max integer default 1)
+returns table (job_id uuid, spec jsonb)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with picked as (
+    select id
+      from optimization_jobs
+     where state = 'queued'
+     order by created_at
+     limit greatest(p_max, 0)
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = 'running',
+         updated_at = now()
+    from picked
+   where j.id = picked.id
+  returning j.id, j.spec;
+end;
+$$;
+
+-- Finalize many jobs with a single UPDATE.
+-- p_items: [{"job_id": "<uuid>", "status": "completed"|"failed", "result": {...}}, ...]
+create or replace function public.finish_jobs(p_items jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  n integer;
+begin
+  update optimization_jobs j
+     set state = i.status,
+         result = i.result,
+         updated_at = now()
+    from jsonb_to_recordset(p_items) as i(job_id uuid, status text, result jsonb)
+   where j.id = i.job_id;
+  get diagnostics n = row_count;
+  return n;
+end;
+$$;
@@ -0,0 +1,5 @@
+-- Per-stage timing summary of a job's trace (see apps/client/worker/tracing.py),
+-- sent by the worker with its final callback:
+--   {"trace_id": "...", "stages": {"synth": {"count": 3, "total_s": 4.2, "max_s": 1.9}, ...}}
+alter table public.optimization_jobs
+  add column if not exists timings jsonb;
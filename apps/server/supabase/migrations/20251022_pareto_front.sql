@@ -0,0 +1,8 @@
+-- Pareto front of a job's results (see apps/client/worker/pareto.py), refreshed by the
+-- worker whenever a candidate adds a trade-off point:
+--   {"objectives": {"fmax_mhz": "max", "area_ge": "min", ...}, "weights": {...},
+--    "points": [{"iteration": 2, "transform": "...", "fmax_mhz": 512.0, "area_ge": 2410,
+--                "meets_targets": true, "score": -0.31, "selected": true, ...}, ...],
+--    "offered": 9, "dominated": 5}
+alter table public.optimization_jobs
+  add column if not exists pareto_front jsonb;
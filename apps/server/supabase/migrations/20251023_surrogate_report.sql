@@ -0,0 +1,7 @@
+-- How the candidate surrogate (see apps/client/worker/surrogate.py) performed for a
+-- job, sent with the final callback:
+--   {"rows": 412, "trusted": true, "loo_mae": {"fmax": 0.012, ...}, "loo_r2": {...},
+--    "loo_fail_brier": 0.08, "online": {"rows": 96, "mae": {...}, "fail_brier": 0.11},
+--    "ranked": 9, "pruned": 2}
+alter table public.optimization_jobs
+  add column if not exists surrogate jsonb;
@@ -0,0 +1,60 @@
+-- Job checkpoints (see apps/client/worker/checkpoint.py). The worker stores one after
+-- the baseline and after every iteration that changed the result:
+--   {"version": 1, "iteration": 3, "workspace": "sha256:<bundle>", "best": {...},
+--    "baseline": {...}, "charts": {...}, "front": {...}, "saved_at": 1760000000.0}
+-- The claim functions return it, so a job handed to another worker resumes from its
+-- last checkpoint instead of re-running the baseline and earlier iterations.
+alter table public.optimization_jobs
+  add column if not exists checkpoint jsonb;
+
+drop function if exists public.claim_next_queued_job();
+create or replace function public.claim_next_queued_job()
+returns table (job_id uuid, spec jsonb, checkpoint jsonb)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with picked as (
+    select id
+      from optimization_jobs
+     where state = 'queued'
+     order by created_at
+     limit 1
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = 'running',
+         updated_at = now()
+    from picked
+   where j.id = picked.id
+  returning j.id, j.spec, j.checkpoint;
+end;
+$$;
+
+drop function if exists public.claim_next_queued_jobs(integer);
+create or replace function public.claim_next_queued_jobs(p_max integer default 1)
+returns table (job_id uuid, spec jsonb, checkpoint jsonb)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with picked as (
+    select id
+      from optimization_jobs
+     where state = 'queued'
+     order by created_at
+     limit greatest(p_max, 0)
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = 'running',
+         updated_at = now()
+    from picked
+   where j.id = picked.id
+  returning j.id, j.spec, j.checkpoint;
+end;
+$$;
@@ -0,0 +1,135 @@
+-- Job leases. A claim made with a worker id records the owner and a lease expiry and
+-- counts the attempt; the worker renews the lease with heartbeat_jobs() while it runs
+-- the job. reap_expired_jobs() (called periodically by apps/api) puts running jobs
+-- whose lease expired back in the queue, or fails them after p_max_attempts claims.
+-- A requeued job keeps its checkpoint, so the next claim resumes it. Claims without a
+-- worker id (e.g. the next-queued-job edge function) take no lease and are never reaped.
+alter table public.optimization_jobs
+  add column if not exists worker_id text,
+  add column if not exists lease_expires_at timestamptz,
+  add column if not exists attempts integer not null default 0;
+
+-- The reaper scans running jobs by lease expiry
+create index if not exists idx_optimization_jobs_lease
+  on public.optimization_jobs (lease_expires_at)
+  where state = 'running';
+
+drop function if exists public.claim_next_queued_job();
+drop function if exists public.claim_next_queued_job(text, integer);
+create or replace function public.claim_next_queued_job(p_worker_id text default null,
+                                                        p_lease_seconds integer default 120)
+returns table (job_id uuid, spec jsonb, checkpoint jsonb, attempts integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with picked as (
+    select id
+      from optimization_jobs
+     where state = 'queued'
+     order by created_at
+     limit 1
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = 'running',
+         worker_id = p_worker_id,
+         lease_expires_at = case when p_worker_id is null then null
+                                 else now() + make_interval(secs => p_lease_seconds) end,
+         attempts = j.attempts + 1,
+         updated_at = now()
+    from picked
+   where j.id = picked.id
+  returning j.id, j.spec, j.checkpoint, j.attempts;
+end;
+$$;
+
+drop function if exists public.claim_next_queued_jobs(integer);
+drop function if exists public.claim_next_queued_jobs(integer, text, integer);
+create or replace function public.claim_next_queued_jobs(p_max integer default 1,
+                                                         p_worker_id text default null,
+                                                         p_lease_seconds integer default 120)
+returns table (job_id uuid, spec jsonb, checkpoint jsonb, attempts integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with picked as (
+    select id
+      from optimization_jobs
+     where state = 'queued'
+     order by created_at
+     limit greatest(p_max, 0)
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = 'running',
+         worker_id = p_worker_id,
+         lease_expires_at = case when p_worker_id is null then null
+                                 else now() + make_interval(secs => p_lease_seconds) end,
+         attempts = j.attempts + 1,
+         updated_at = now()
+    from picked
+   where j.id = picked.id
+  returning j.id, j.spec, j.checkpoint, j.attempts;
+end;
+$$;
+
+-- Renew the leases p_worker_id holds on p_job_ids; returns the ids still held. A job
+-- that was reaped (and possibly claimed elsewhere) or finished is missing from the
+-- result, and the worker stops working on it. Running jobs without an owner (claimed
+-- before leases existed) are adopted.
+create or replace function public.heartbeat_jobs(p_worker_id text, p_job_ids uuid[],
+                                                 p_lease_seconds integer default 120)
+returns table (job_id uuid)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  update optimization_jobs j
+     set worker_id = p_worker_id,
+         lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+   where j.id = any(p_job_ids)
+     and j.state = 'running'
+     and coalesce(j.worker_id, p_worker_id) = p_worker_id
+  returning j.id;
+end;
+$$;
+
+-- Requeue running jobs whose lease expired, or fail them once they were claimed
+-- p_max_attempts times. Safe to run from several API instances at once.
+create or replace function public.reap_expired_jobs(p_max_attempts integer default 3)
+returns table (job_id uuid, state text, attempts integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  return query
+  with expired as (
+    select id
+      from optimization_jobs
+     where optimization_jobs.state = 'running'
+       and lease_expires_at < now()
+     for update skip locked
+  )
+  update optimization_jobs j
+     set state = case when j.attempts >= p_max_attempts then 'failed' else 'queued' end,
+         logs_tail = case when j.attempts >= p_max_attempts
+                          then format('Lease of %s expired; giving up after %s attempts', j.worker_id, j.attempts)
+                          else format('Lease of %s expired; requeued (attempt %s of %s)', j.worker_id, j.attempts, p_max_attempts)
+                     end,
+         worker_id = null,
+         lease_expires_at = null,
+         updated_at = now()
+    from expired
+   where j.id = expired.id
+  returning j.id, j.state, j.attempts;
+end;
+$$;
@@ -0,0 +1,178 @@
+-- Priority classes and per-owner fair share for the job queue.
+--   spec.priority: "interactive" (default) | "batch"
+-- Interactive jobs are always claimed before batch jobs. Within a class, the next job
+-- goes to the owner with the fewest jobs in flight: each queued job is ranked by its
+-- owner's running jobs plus its place in the owner's own queue, so owners are served
+-- round-robin and a 500-job submission only delays others by one job per round.
+-- The owner is the submitting user, else spec.owner (rows inserted without a user).
+alter table public.optimization_jobs
+  add column if not exists priority smallint
+    generated always as (case when spec->>'priority' = 'batch' then 1 else 0 end) stored,
+  add column if not exists owner_key text
+    generated always as (coalesce(user_id::text, spec->>'owner', '')) stored,
+  add column if not exists claimed_at timestamptz;
+
+create index if not exists idx_optimization_jobs_queue_order
+  on public.optimization_jobs (priority, owner_key, created_at)
+  where state = 'queued';
+create index if not exists idx_optimization_jobs_running_owner
+  on public.optimization_jobs (owner_key)
+  where state = 'running';
+
+-- Claim order of all queued jobs (position 1 is claimed next), for queue_position().
+-- It ranks the whole queue, so the claim functions don't use it: they make the same
+-- pick with pick_next_queued_job(). Not exposed to API clients.
+create or replace view public.job_queue_order as
+select q.id,
+       row_number() over (order by q.priority, q.turn, q.created_at)::integer as position
+  from (
+    select j.id, j.priority, j.created_at,
+           coalesce(r.running, 0)
+             + row_number() over (partition by j.priority, j.owner_key order by j.created_at) as turn
+      from optimization_jobs j
+      left join (select owner_key, count(*) as running
+                   from optimization_jobs
+                  where state = 'running'
+                  group by owner_key) r on r.owner_key = j.owner_key
+     where j.state = 'queued'
+  ) q;
+
+revoke all on public.job_queue_order from anon, authenticated;
+
+-- Lock and return the queued job that is position 1 of job_queue_order (null when none
+-- is free), without ranking the queue: walk the distinct (priority, owner) pairs with
+-- queued jobs through idx_optimization_jobs_queue_order, order them by priority, the
+-- owner's running jobs and the owner's oldest queued job, and take the first owner's
+-- oldest job that no other claim holds. Costs an index probe per owner in the queue
+-- plus a count of their running jobs, however many jobs are queued.
+create or replace function public.pick_next_queued_job()
+returns uuid
+language plpgsql
+set search_path = public
+as $$
+declare
+  o record;
+  v_id uuid;
+begin
+  for o in
+    with recursive owners as (
+      (select q.priority, q.owner_key
+         from optimization_jobs q
+        where q.state = 'queued'
+        order by q.priority, q.owner_key
+        limit 1)
+      union all
+      select n.priority, n.owner_key
+        from owners w
+        cross join lateral (
+          select q.priority, q.owner_key
+            from optimization_jobs q
+           where q.state = 'queued'
+             and (q.priority, q.owner_key) > (w.priority, w.owner_key)
+           order by q.priority, q.owner_key
+           limit 1) n
+    )
+    select w.priority, w.owner_key
+      from owners w
+     order by w.priority,
+              (select count(*) from optimization_jobs r
+                where r.state = 'running' and r.owner_key = w.owner_key),
+              (select min(q.created_at) from optimization_jobs q
+                where q.state = 'queued' and q.priority = w.priority and q.owner_key = w.owner_key)
+  loop
+    select q.id
+      into v_id
+      from optimization_jobs q
+     where q.state = 'queued' and q.priority = o.priority and q.owner_key = o.owner_key
+     order by q.created_at
+     limit 1
+     for update skip locked;
+    if found then
+      return v_id;
+    end if;
+  end loop;
+  return null;
+end;
+$$;
+
+revoke all on function public.pick_next_queued_job() from public, anon, authenticated;
+
+create or replace function public.claim_next_queued_job(p_worker_id text default null,
+                                                        p_lease_seconds integer default 120)
+returns table (job_id uuid, spec jsonb, checkpoint jsonb, attempts integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_id uuid := pick_next_queued_job();
+begin
+  if v_id is null then
+    return;
+  end if;
+  return query
+  update optimization_jobs j
+     set state = 'running',
+         worker_id = p_worker_id,
+         lease_expires_at = case when p_worker_id is null then null
+                                 else now() + make_interval(secs => p_lease_seconds) end,
+         attempts = j.attempts + 1,
+         claimed_at = now(),
+         updated_at = now()
+   where j.id = v_id
+  returning j.id, j.spec, j.checkpoint, j.attempts;
+end;
+$$;
+
+-- One pick per job: each claimed job counts as running for the owner when the next is
+-- picked, so a batch is spread over owners like successive single claims.
+create or replace function public.claim_next_queued_jobs(p_max integer default 1,
+                                                         p_worker_id text default null,
+                                                         p_lease_seconds integer default 120)
+returns table (job_id uuid, spec jsonb, checkpoint jsonb, attempts integer)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_id uuid;
+begin
+  for i in 1 .. greatest(p_max, 0) loop
+    v_id := pick_next_queued_job();
+    exit when v_id is null;
+    return query
+    update optimization_jobs j
+       set state = 'running',
+           worker_id = p_worker_id,
+           lease_expires_at = case when p_worker_id is null then null
+                                   else now() + make_interval(secs => p_lease_seconds) end,
+           attempts = j.attempts + 1,
+           claimed_at = now(),
+           updated_at = now()
+     where j.id = v_id
+    returning j.id, j.spec, j.checkpoint, j.attempts;
+  end loop;
+end;
+$$;
+
+-- Where a queued job stands: its claim position, how many jobs are running, and the
+-- mean run time of the last p_sample finished jobs (null without history), from which
+-- apps/api estimates the wait. No row when the job is not queued.
+create or replace function public.queue_position(p_job_id uuid, p_sample integer default 50)
+returns table (queue_position integer, running integer, mean_run_s double precision)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select o.position,
+         (select count(*)::integer from optimization_jobs where state = 'running'),
+         (select avg(extract(epoch from (f.updated_at - f.claimed_at)))::double precision
+            from (select updated_at, claimed_at
+                    from optimization_jobs
+                   where state in ('succeeded', 'completed') and claimed_at is not null
+                   order by updated_at desc
+                   limit p_sample) f)
+    from job_queue_order o
+   where o.id = p_job_id;
+$$;
@@ -0,0 +1,90 @@
+-- Deduplicate identical submissions. Every job gets a canonical hash of its spec: the
+-- Verilog ("original_verilog" / "source") with comments and whitespace runs collapsed
+-- as in the worker's cache.canonical_rtl(), everything else (targets, budgets,
+-- options, ...) as normalised jsonb; fields that do not change the result (priority,
+-- owner, dedup) are left out. enqueue_job_dedup() returns an identical job that
+-- finished within p_ttl_seconds, or one still queued/running, instead of enqueuing a
+-- new one. spec.dedup = false always enqueues.
+
+create or replace function public.canonical_verilog(p_src text)
+returns text
+language sql
+immutable
+as $$
+  select btrim(regexp_replace(
+           regexp_replace(
+             regexp_replace(coalesce(p_src, ''), '/\*.*?\*/', ' ', 'g'),
+             '//[^\n]*', ' ', 'g'),
+           '\s+', ' ', 'g'));
+$$;
+
+create or replace function public.job_spec_hash(p_spec jsonb)
+returns text
+language sql
+immutable
+as $$
+  select encode(sha256(convert_to((
+           (p_spec - 'priority' - 'owner' - 'dedup' - 'original_verilog' - 'source')
+           || jsonb_strip_nulls(jsonb_build_object(
+                'original_verilog', case when p_spec ? 'original_verilog'
+                                         then public.canonical_verilog(p_spec->>'original_verilog') end,
+                'source', case when p_spec ? 'source'
+                               then public.canonical_verilog(p_spec->>'source') end))
+         )::text, 'UTF8')), 'hex');
+$$;
+
+alter table public.optimization_jobs
+  add column if not exists spec_hash text
+    generated always as (public.job_spec_hash(spec)) stored;
+
+create index if not exists idx_optimization_jobs_spec_hash
+  on public.optimization_jobs (spec_hash, owner_key, updated_at desc)
+  where state in ('queued', 'running', 'succeeded', 'completed');
+
+-- Enqueue p_spec unless an identical job can be reused: a finished one updated within
+-- p_ttl_seconds (0 = never reuse results) is preferred, then one queued or running.
+-- The new job belongs to p_user_id (required: optimization_jobs.user_id is not null),
+-- and only that user's jobs are reused. Concurrent submissions of the same spec are
+-- serialised on an advisory lock, so they share one job.
+create or replace function public.enqueue_job_dedup(p_spec jsonb,
+                                                    p_ttl_seconds integer default 86400,
+                                                    p_user_id uuid default null,
+                                                    p_job_id text default null)
+returns table (id uuid, job_id text, state text, deduplicated boolean)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_hash text := job_spec_hash(p_spec);
+  r record;
+begin
+  if p_user_id is null then
+    raise exception 'enqueue_job_dedup: p_user_id is required' using errcode = 'null_value_not_allowed';
+  end if;
+
+  if coalesce(p_spec->>'dedup', 'true') <> 'false' then
+    perform pg_advisory_xact_lock(hashtextextended(v_hash, 0));
+    select j.id, j.job_id, j.state
+      into r
+      from optimization_jobs j
+     where j.spec_hash = v_hash
+       and j.owner_key = p_user_id::text
+       and (j.state in ('queued', 'running')
+            or (j.state in ('succeeded', 'completed') and p_ttl_seconds > 0
+                and j.updated_at > now() - make_interval(secs => p_ttl_seconds)))
+     order by j.state in ('succeeded', 'completed') desc, j.updated_at desc
+     limit 1;
+    if found then
+      return query select r.id, r.job_id, r.state, true;
+      return;
+    end if;
+  end if;
+
+  return query
+  insert into optimization_jobs (spec, state, user_id, job_id, logs_tail)
+  values (p_spec, 'queued', p_user_id, coalesce(p_job_id, gen_random_uuid()::text),
+          'Job created, waiting for EDA worker...')
+  returning optimization_jobs.id, optimization_jobs.job_id, optimization_jobs.state, false;
+end;
+$$;